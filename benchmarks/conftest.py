@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Shared fixtures for the pytest-benchmark suite.
+
+Run with for example:
+    python -m pytest benchmarks --benchmark-json=bench.json
+"""
+
+import pytest
+
+from cozify import cloud_api
+from cozify.test.emulator import Emulator, generate
+from cozify.test.fixtures import tmp_cloud, tmp_hub
+
+sizes = [10, 100, 1000, 10000]
+
+
+@pytest.fixture(scope='module')
+def emulator():
+    with Emulator(devices=generate(100)) as emu:
+        yield emu
+
+
+@pytest.fixture
+def remote_emulator(emulator, monkeypatch):
+    monkeypatch.setattr(cloud_api, 'cloudBase', emulator.cloud_base)
+    yield emulator
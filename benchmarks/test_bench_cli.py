@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+import subprocess, sys
+
+
+def test_bench_cli_startup(benchmark, tmp_path):
+    env = {'XDG_CONFIG_HOME': str(tmp_path), 'PATH': ''}
+    benchmark.pedantic(
+        subprocess.check_call,
+        args=([sys.executable, '-m', 'cozify.cli', '--help'], ),
+        kwargs={
+            'env': env,
+            'stdout': subprocess.DEVNULL
+        },
+        rounds=10)
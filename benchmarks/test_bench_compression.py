@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import os, pytest, tempfile
+
+from cozify import compression
+from cozify.test.emulator import readings
+
+points = readings(50000)
+
+
+def test_bench_compression_encode(benchmark):
+
+    def encode():
+        encoder = compression.Encoder()
+        for timestamp, value in points:
+            encoder.append(timestamp, value)
+        return encoder.finish()
+
+    data = benchmark(encode)
+    benchmark.extra_info['bytes_per_point'] = len(data) / len(points)
+    benchmark.extra_info['ratio'] = len(points) * 16 / len(data)
+
+
+def test_bench_compression_decode(benchmark):
+    encoder = compression.Encoder()
+    for timestamp, value in points:
+        encoder.append(timestamp, value)
+    data = encoder.finish()
+    out = benchmark(lambda: sum(1 for point in compression.decode(data, len(points))))
+    assert out == len(points)
+    benchmark.extra_info['points'] = len(points)
+
+
+@pytest.mark.parametrize('chunk_size', [256, 4096])
+def test_bench_compression_range(benchmark, chunk_size):
+    fd, path = tempfile.mkstemp(suffix='.czts')
+    os.close(fd)
+    compression.write(points, path, chunk_size=chunk_size)
+    start, end = points[40000][0], points[40100][0]
+    with compression.Reader(path) as reader:
+        out = benchmark(lambda: list(reader.read(start, end)))
+    os.remove(path)
+    assert len(out) == 100
@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+from cozify import config
+
+
+def test_bench_state_write(benchmark, tmp_hub):
+    benchmark(config.stateWrite)
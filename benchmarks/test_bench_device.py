@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+import gc, json, tracemalloc
+
+from cozify import codec, device
+from cozify.test.emulator import generate
+
+
+def _retained(build, payload):
+    gc.collect()
+    tracemalloc.start()
+    kept = build(payload)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def test_bench_device_memory(benchmark):
+    payload = json.dumps(generate(1000)).encode('utf-8')
+    raw = _retained(codec.loads, payload)
+    typed = _retained(lambda p: device.from_devices(codec.loads(p)), payload)
+    benchmark.extra_info['raw_bytes_per_1k'] = raw
+    benchmark.extra_info['typed_bytes_per_1k'] = typed
+    benchmark.extra_info['reduction'] = 1 - typed / raw
+    assert typed < raw
+    benchmark(lambda: device.from_devices(codec.loads(payload)))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import hub
+from cozify.test.emulator import generate
+from benchmarks.conftest import sizes
+
+
+@pytest.mark.parametrize('count', sizes)
+def test_bench_devices_filter_single(benchmark, tmp_hub, count):
+    devs = generate(count)
+    out = benchmark(
+        hub.devices, hub_id=tmp_hub.id, capabilities=hub.capability.COLOR_HS, mock_devices=devs)
+    assert out
+
+
+@pytest.mark.parametrize('count', sizes)
+def test_bench_devices_filter_or(benchmark, tmp_hub, count):
+    devs = generate(count)
+    out = benchmark(
+        hub.devices,
+        hub_id=tmp_hub.id,
+        capabilities=[hub.capability.TWILIGHT, hub.capability.COLOR_HS],
+        mock_devices=devs)
+    assert out
+
+
+@pytest.mark.parametrize('count', sizes)
+def test_bench_devices_filter_and(benchmark, tmp_hub, count):
+    devs = generate(count)
+    out = benchmark(
+        hub.devices,
+        hub_id=tmp_hub.id,
+        and_filter=True,
+        capabilities=[hub.capability.COLOR_HS, hub.capability.COLOR_TEMP],
+        mock_devices=devs)
+    assert out
+
+
+def test_bench_clean_state(benchmark, tmp_hub):
+    states = tmp_hub.states()
+    assert benchmark(hub._clean_state, states['dirty']) == states['clean']
+
+
+def test_bench_fill_kwargs(benchmark, tmp_hub):
+
+    def fill():
+        kwargs = {}
+        hub._fill_kwargs(kwargs)
+        return kwargs
+
+    assert benchmark(fill)['hub_id'] == tmp_hub.id
+
+
+def test_bench_state_delta(benchmark, tmp_hub):
+    states = tmp_hub.states()
+    assert benchmark(hub._state_delta, states['dirty'], {'brightness': 0.5}, transition=0)
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import hub_api
+
+
+@pytest.mark.parametrize('count', [1, 100])
+def test_bench_devices_command_json(benchmark, monkeypatch, count):
+    sent = []
+    monkeypatch.setattr(hub_api, 'put', lambda call, payload, **kwargs: sent.append(payload))
+    command = [{
+        'id': 'device-{0}'.format(i),
+        'type': 'CMD_DEVICE',
+        'state': {
+            'type': 'STATE_LIGHT',
+            'brightness': 0.5
+        }
+    } for i in range(count)]
+    benchmark(hub_api.devices_command, command)
+    assert sent
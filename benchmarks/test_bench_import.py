@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+import subprocess, sys
+
+
+def test_bench_import_hub(benchmark, tmp_path):
+    env = {'XDG_CONFIG_HOME': str(tmp_path), 'PATH': ''}
+    benchmark.pedantic(
+        subprocess.check_call,
+        args=([sys.executable, '-c', 'import cozify.hub'],),
+        kwargs={'env': env},
+        rounds=10)
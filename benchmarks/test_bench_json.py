@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+import json, pytest
+
+from cozify import codec
+from cozify.test.emulator import generate
+
+
+@pytest.fixture(scope='module')
+def payload():
+    return json.dumps(generate(5000)).encode('utf-8')
+
+
+def test_bench_json_stdlib_text(benchmark, payload):
+    # what requests' response.json() effectively does: decode to str, then parse
+    benchmark(lambda: json.loads(payload.decode('utf-8')))
+
+
+def test_bench_json_codec(benchmark, payload):
+    benchmark(codec.loads, payload)
+
+
+def test_bench_json_codec_fields(benchmark, payload):
+    benchmark(lambda: codec.project(codec.loads(payload), ['name', 'state']))
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import hub, index, query
+from cozify.test.emulator import generate
+from benchmarks.conftest import sizes
+
+reachable_lights = query.room('room-3') & query.capability(hub.capability.BRIGHTNESS) & query.state(
+    'reachable')
+
+
+@pytest.mark.parametrize('count', sizes)
+def test_bench_query_scan(benchmark, count):
+    devs = generate(count)
+    out = benchmark(lambda: list(query.select(reachable_lights, devs)))
+    assert out
+
+
+@pytest.mark.parametrize('count', sizes)
+def test_bench_query_index(benchmark, count):
+    devs = generate(count)
+    idx = index.DeviceIndex(devs)
+    out = benchmark(lambda: list(query.select(reachable_lights, devs, index=idx)))
+    assert out
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Benchmarks replaying recorded traffic. Set COZIFY_TRAFFIC to a recording made with
+cozify.traffic.record() to benchmark against real device payloads, otherwise a recording of the
+emulator is used.
+"""
+
+import os, pytest
+
+from cozify import hub, hub_api, traffic
+from cozify.test.emulator import Emulator, generate
+
+
+@pytest.fixture(scope='module')
+def recording(tmp_path_factory):
+    if 'COZIFY_TRAFFIC' in os.environ:
+        return os.environ['COZIFY_TRAFFIC']
+    path = str(tmp_path_factory.mktemp('traffic') / 'emulated.traffic.gz')
+    with Emulator(devices=generate(1000)) as emu, traffic.record(path):
+        hub_api.devices(**emu.kwargs())
+    return path
+
+
+def test_bench_replay_devices_filter(benchmark, recording):
+    payloads = [
+        e for e in traffic.entries(recording)
+        if e['method'] == 'GET' and e['path'].endswith('/devices')
+    ]
+
+    def replay_and_filter():
+        with traffic.replay(recording):
+            for i in payloads:
+                devs = hub_api.devices(host='replayed', remote=False, hub_token='x')
+                hub.devices(
+                    capabilities=hub.capability.ON_OFF, hub_id='replayed', mock_devices=devs,
+                    remote=False, hub_token='x', cloud_token='x', host='replayed')
+
+    benchmark(replay_and_filter)
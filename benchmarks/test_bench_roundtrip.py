@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+from cozify import hub_api
+
+
+def test_bench_roundtrip_devices_local(benchmark, emulator):
+    devs = benchmark(hub_api.devices, **emulator.kwargs())
+    assert len(devs) == len(emulator.devices)
+
+
+def test_bench_roundtrip_devices_remote(benchmark, remote_emulator):
+    devs = benchmark(hub_api.devices, **remote_emulator.kwargs(remote=True))
+    assert len(devs) == len(remote_emulator.devices)
+
+
+def test_bench_roundtrip_command_local(benchmark, emulator):
+    device_id = next(iter(emulator.devices))
+    benchmark(hub_api.devices_command_on, device_id, **emulator.kwargs())
+    assert emulator.devices[device_id]['state']['isOn']
+
+
+def test_bench_roundtrip_command_remote(benchmark, remote_emulator):
+    device_id = next(iter(remote_emulator.devices))
+    benchmark(hub_api.devices_command_off, device_id, **remote_emulator.kwargs(remote=True))
+    assert not remote_emulator.devices[device_id]['state']['isOn']
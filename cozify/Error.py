@@ -33,3 +33,20 @@ class AuthenticationError(Exception):
 
     def __str__(self):
         return 'Authentication error: %s' % self.message
+
+
+class DeadlineError(Exception):
+    """Error raised for scheduled commands dropped because their deadline passed before they could be sent.
+
+    Args:
+        message(str): Human readable error description
+
+    Attributes:
+        message(str): Human readable error description
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return 'Deadline error: %s' % self.message
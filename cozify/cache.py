@@ -0,0 +1,247 @@
+"""Module for keeping the last known devices snapshot of each hub on disk.
+
+Snapshots are stored in a small SQLite database per hub next to the state file, so a fresh process can
+start from the last known devices immediately instead of waiting for the hub or the cloud relay. Use
+through hub.devices(cached=True), which serves the stored snapshot and refreshes it in the background.
+
+The same snapshots keep reads available when the hub is not. With max_staleness or latency_budget set,
+hub.devices() serves a recent enough snapshot without a call at all and falls back to the last good
+snapshot, marked stale, when the live call fails or takes too long:
+    devs = hub.devices(max_staleness=5, latency_budget=0.5)
+    if devs.stale:
+        print('showing data from {0:.0f}s ago'.format(devs.age))
+
+Attributes:
+    schema_version(int): Version of the on-disk format. Files of other versions are discarded and rebuilt.
+"""
+
+import contextlib, os, sqlite3, threading, time
+from concurrent.futures import Future, TimeoutError
+from absl import logging
+from requests.exceptions import RequestException
+
+from . import codec, config, hub_api
+from .Error import APIError
+
+schema_version = 1
+
+_latest = {}
+_pending = {}
+_lock = threading.Lock()
+
+
+class Snapshot(dict):
+    """Devices dict tagged with the time it was fetched from the hub.
+
+    Args:
+        devs(dict): Devices dict.
+        timestamp(float): Epoch time of the fetch in seconds.
+
+        stale(bool): True if served in place of a live call that failed or was too slow.
+
+    Attributes:
+        timestamp(float): Epoch time of the fetch in seconds.
+        stale(bool): True if served in place of a live call that failed or was too slow.
+    """
+
+    def __init__(self, devs, timestamp, stale=False):
+        super().__init__(devs)
+        self.timestamp = timestamp
+        self.stale = stale
+
+    @property
+    def age(self):
+        """float: Seconds since the snapshot was fetched.
+        """
+        return time.time() - self.timestamp
+
+    def derive(self, devs):
+        """Tag a dict derived from this snapshot, e.g. a filtered one, with the same fetch time.
+
+        Returns:
+            Snapshot: New snapshot of devs.
+        """
+        return Snapshot(devs, self.timestamp, self.stale)
+
+
+def path(hub_id):
+    """File path of a hub's snapshot cache, derived from the state file path.
+
+    Args:
+        hub_id(str): Id of the hub.
+    """
+    return '{0}-{1}.cache'.format(os.path.splitext(config.state_file)[0], hub_id)
+
+
+def load(hub_id):
+    """Read the stored snapshot of a hub.
+
+    Args:
+        hub_id(str): Id of the hub.
+
+    Returns:
+        Snapshot: Last stored snapshot or None if there is none. Every call decodes a copy of its own.
+    """
+    try:
+        mtime = os.stat(path(hub_id)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    # skip the database unless the file was written since, e.g. by another process
+    latest = _latest.get(path(hub_id))
+    if latest is not None and latest[0] == mtime:
+        row = latest[1:]
+    else:
+        try:
+            with _connect(hub_id) as db:
+                row = db.execute('SELECT timestamp, data FROM snapshot WHERE id = 1').fetchone()
+        except sqlite3.Error as e:
+            logging.warning('Unable to read snapshot cache of {0}: {1}'.format(hub_id, e))
+            return None
+        if row is None:
+            return None
+        _remember(hub_id, row[0], row[1])
+    return Snapshot(codec.loads(row[1]), row[0])
+
+
+def store(hub_id, devs, timestamp=None):
+    """Replace the stored snapshot of a hub.
+
+    Args:
+        hub_id(str): Id of the hub.
+        devs(dict): Full devices dict.
+        timestamp(float): Epoch time of the fetch. Defaults to now.
+
+    Returns:
+        Snapshot: The stored snapshot.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    data = codec.dumps(devs)
+    try:
+        with _connect(hub_id) as db:
+            db.execute('INSERT OR REPLACE INTO snapshot (id, timestamp, data) VALUES (1, ?, ?)',
+                       (timestamp, data))
+    except sqlite3.Error as e:
+        logging.warning('Unable to store snapshot cache of {0}: {1}'.format(hub_id, e))
+    _remember(hub_id, timestamp, data)
+    return Snapshot(devs, timestamp)
+
+
+def clear(hub_id):
+    """Remove the snapshot cache of a hub.
+    """
+    _latest.pop(path(hub_id), None)
+    try:
+        os.remove(path(hub_id))
+    except FileNotFoundError:
+        pass
+
+
+def fetch(**kwargs):
+    """Fetch live devices from the hub and store them as the new snapshot.
+
+    Args:
+        **kwargs: Hub call arguments including hub_id, see cozify.hub_api.get()
+
+    Returns:
+        Snapshot: Freshly fetched snapshot.
+    """
+    devs = hub_api.devices(**kwargs)
+    return store(kwargs['hub_id'], devs)
+
+
+def refresh(**kwargs):
+    """Fetch and store a new snapshot in a background thread. A refresh of the hub already running is shared.
+
+    Args:
+        **kwargs: Hub call arguments including hub_id, see cozify.hub_api.get()
+
+    Returns:
+        concurrent.futures.Future: Resolves to the fresh Snapshot or fails with the error of the fetch.
+    """
+    hub_id = kwargs['hub_id']
+    with _lock:
+        future = _pending.get(hub_id)
+        if future is not None:
+            return future
+        future = _pending[hub_id] = Future()
+
+    def run():
+        result = error = None
+        try:
+            result = fetch(**kwargs)
+        except Exception as e:
+            logging.warning('Background refresh of {0} failed: {1}'.format(hub_id, e))
+            error = e
+        with _lock:
+            del _pending[hub_id]
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    threading.Thread(target=run, name='cozify-cache-refresh', daemon=True).start()
+    return future
+
+
+def read(cached=False, max_staleness=None, latency_budget=None, max_age=None, **kwargs):
+    """Get a devices snapshot, trading freshness for speed and availability as asked.
+
+    Args:
+        cached(bool): Serve any stored snapshot and refresh it in the background.
+        max_staleness(float): Serve a stored snapshot younger than this many seconds without calling the hub.
+        latency_budget(float): Seconds to wait for the live call before serving the stored snapshot instead. The call carries on in the background and updates the snapshot.
+        max_age(float): Oldest snapshot in seconds acceptable as a fallback. Defaults to any age.
+        **kwargs: Hub call arguments including hub_id, see cozify.hub_api.get()
+
+    Returns:
+        Snapshot: Live or stored devices, stale set if the live call was due but couldn't be used.
+    """
+    snapshot = load(kwargs['hub_id'])
+    if snapshot is not None:
+        if cached:
+            refresh(**kwargs)
+            return snapshot
+        if max_staleness is not None and snapshot.age <= max_staleness:
+            return snapshot
+    try:
+        if snapshot is None or latency_budget is None:
+            return fetch(**kwargs)
+        return refresh(**kwargs).result(timeout=latency_budget)
+    except (APIError, RequestException, OSError, TimeoutError) as e:
+        if snapshot is None or (max_age is not None and snapshot.age > max_age):
+            raise
+        logging.warning('Serving devices of {0} from {1:.1f}s ago: {2!r}'.format(
+            kwargs['hub_id'], snapshot.age, e))
+        return Snapshot(snapshot, snapshot.timestamp, stale=True)
+
+
+def _remember(hub_id, timestamp, data):
+    try:
+        _latest[path(hub_id)] = (os.stat(path(hub_id)).st_mtime_ns, timestamp, data)
+    except FileNotFoundError:
+        pass
+
+
+@contextlib.contextmanager
+def _connect(hub_id):
+    """Open the cache database of a hub, (re)creating the schema if the version doesn't match.
+    """
+    db = sqlite3.connect(path(hub_id), timeout=5)
+    try:
+        _migrate(db)
+        with db:  # commits, or rolls back on error
+            yield db
+    finally:
+        db.close()
+
+
+def _migrate(db):
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    if version != schema_version:
+        if version:
+            logging.info('Discarding snapshot cache of format version {0}'.format(version))
+        db.execute('DROP TABLE IF EXISTS snapshot')
+        db.execute('CREATE TABLE snapshot (id INTEGER PRIMARY KEY, timestamp REAL, data BLOB)')
+        db.execute('PRAGMA user_version = {0}'.format(schema_version))
+        db.commit()
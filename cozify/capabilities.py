@@ -0,0 +1,178 @@
+"""Module for keeping track of every capability name hubs report, known to this library or not.
+
+cozify.hub.capability only lists the capabilities known when the library was released, hubs keep adding
+new ones. The registry starts from that enum and learns every other name seen in devices data, so
+filtering on a new capability works by name right away, e.g. hub.devices(capabilities='NEW_THING').
+
+Every name seen on a device gets a bit position for fast mask filtering, see
+cozify.device.capability_mask(). Looking up a name that was never seen doesn't assign it one, so typos
+match nothing and never end up in state. Once something is learned the whole assignment is stored in
+state, so positions stay the same across processes and library versions that add capabilities to the
+enum.
+
+Example:
+    hub.devices()  # observes the capabilities of every device
+    print(capabilities.registry().unknown())
+"""
+
+import threading
+from absl import logging
+
+from . import config
+
+_section = 'Capabilities'
+_registry = None
+_registry_state = None
+_registry_lock = threading.Lock()
+
+
+class Registry():
+    """Capability names mapped to stable bit positions. Use the shared one from registry().
+
+    Args:
+        stored(dict): Previously stored bit positions mapped to names. Defaults to none.
+    """
+
+    def __init__(self, stored=None):
+        self._bits = {}
+        self._seen = set()
+        self._learned = set()
+        self._lock = threading.Lock()
+        for bit, name in sorted((stored or {}).items()):
+            self._bits[name] = bit
+        self._next = max(self._bits.values()) + 1 if self._bits else 0
+        from .hub import capability
+        self._builtin = frozenset(c.name for c in capability)
+        for c in capability:  # on a fresh registry this matches the enum values
+            self._assign(c.name)
+        self._learned.update(name for name in self._bits if name not in self._builtin)
+
+    def __contains__(self, name):
+        return name in self._bits
+
+    def __len__(self):
+        return len(self._bits)
+
+    def bit(self, name):
+        """Get the bit position of a capability.
+
+        Args:
+            name(str): Capability name, or a cozify.hub.capability member.
+
+        Returns:
+            int: Bit position, or None if the name is neither built in nor observed.
+        """
+        return self._bits.get(getattr(name, 'name', name))
+
+    def mask(self, names):
+        """Turn capabilities into a bitmask.
+
+        Args:
+            names(list): Capability names or cozify.hub.capability members.
+
+        Returns:
+            int: Bitmask with the bit of every given capability set. Names without a bit are left out, so they match no device.
+        """
+        mask = 0
+        for name in names:
+            bit = self.bit(name)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def observe(self, devs):
+        """Learn the capabilities reported in a devices snapshot. Newly learned unknown capabilities are stored in state.
+
+        Args:
+            devs(dict): Devices dict, raw dicts or cozify.device.Device objects.
+
+        Returns:
+            set: Names not seen before by this registry.
+        """
+        seen = self._seen
+        new = set()
+        for device in devs.values():
+            if isinstance(device, dict):
+                values = (device.get('capabilities') or {}).get('values', ())
+            else:
+                values = device.capabilities
+            if not seen.issuperset(values):
+                new.update(name for name in values if name not in seen)
+        if not new:
+            return new
+        seen.update(new)
+        learned = set(name for name in new if name not in self._builtin and name not in self._learned)
+        for name in sorted(new):
+            self._assign(name)
+        if learned:
+            self._learned.update(learned)
+            logging.info('Learned capabilities unknown to this version: {0}'.format(
+                ', '.join(sorted(learned))))
+            self.save()
+        return new
+
+    def seen(self):
+        """Names of all capabilities observed in this process.
+
+        Returns:
+            list: Sorted names.
+        """
+        return sorted(self._seen)
+
+    def unknown(self):
+        """Capabilities seen on devices, now or in an earlier process, but missing from cozify.hub.capability.
+
+        Returns:
+            list: Sorted names.
+        """
+        return sorted(self._learned)
+
+    def save(self):
+        """Store the bit assignment in state.
+        """
+        with self._lock:
+            config.state[_section] = {str(bit): name for name, bit in self._bits.items()}
+        config.stateWrite()
+
+    def _assign(self, name):
+        """Give a name the next free bit position unless it has one already.
+        """
+        with self._lock:
+            bit = self._bits.get(name)
+            if bit is None:
+                bit = self._bits[name] = self._next
+                self._next += 1
+        return bit
+
+
+def registry():
+    """Get the shared registry of this process, loaded from state on first use and again after config.setStatePath() loads another state.
+
+    Returns:
+        Registry: Shared registry.
+    """
+    global _registry, _registry_state
+    if _registry is None or _registry_state is not config.state:
+        with _registry_lock:
+            if _registry is None or _registry_state is not config.state:
+                stored = {}
+                if _section in config.state:
+                    for bit, name in config.state[_section].items():
+                        try:
+                            stored[int(bit)] = name
+                        except ValueError:
+                            logging.warning('Ignoring malformed capability entry {0}'.format(bit))
+                _registry = Registry(stored)
+                _registry_state = config.state
+                from . import device
+                device._masks.clear()  # bit positions may differ from the previous registry
+    return _registry
+
+
+def reset():
+    """Drop the shared registry, the next registry() call loads it from state again.
+    """
+    global _registry, _registry_state
+    with _registry_lock:
+        _registry = None
+        _registry_state = None
@@ -0,0 +1,181 @@
+"""Command line interface to common hub operations, installed as the 'cozify' command.
+
+Subcommands only import what they use, so asking for --help or talking to a running cozify.daemon
+doesn't pay for importing the whole library. Device commands accept any amount of devices and send them
+as one batch. Examples:
+    cozify list --capability TEMPERATURE
+    cozify --max-staleness 30 show <device_id>
+    cozify off <device_id> <device_id> ...
+    cozify brightness 0.4 <device_id> <device_id> ...
+
+When a daemon is listening on its default socket, or the one given with --socket, calls are forwarded to
+it and each device command is sent before the daemon replies, so failures are reported. Otherwise the
+hub is called directly and device commands go out as one batch.
+
+Exit status is 1 for bad arguments or devices and 2 when calling the hub fails. Anything else is a bug
+and shows its traceback.
+"""
+
+import argparse, sys
+
+
+def main(argv=None, **kwargs):
+    """Run the command line interface.
+
+    Args:
+        argv(list): Arguments without the program name. Defaults to sys.argv[1:]
+        **kwargs: Extra hub call arguments, e.g. host, passed to every call.
+
+    Returns:
+        int: Exit status.
+    """
+    from .Error import APIError, AuthenticationError, DeadlineError
+    args = _parser().parse_args(argv)
+    if args.hub is not None:
+        kwargs['hub_name'] = args.hub
+    if args.remote:
+        kwargs['remote'] = True
+    if args.max_staleness is not None:
+        kwargs['max_staleness'] = args.max_staleness
+    try:
+        return args.run(args, kwargs) or 0
+    except (ValueError, KeyError) as e:
+        print('cozify: {0}'.format(e), file=sys.stderr)
+        return 1
+    except (APIError, AuthenticationError, DeadlineError, OSError, RuntimeError) as e:
+        print('cozify: {0}: {1}'.format(type(e).__name__, e), file=sys.stderr)
+        return 2
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='cozify', description='Operate Cozify hub devices.')
+    parser.add_argument('--hub', metavar='NAME', help='hub to operate on, defaults to the default hub')
+    parser.add_argument('--remote', action='store_true', help='call the hub via the cloud relay')
+    parser.add_argument(
+        '--max-staleness',
+        type=float,
+        metavar='SECONDS',
+        help='serve devices from a snapshot cached up to this many seconds ago')
+    parser.add_argument('--socket', help='socket of the daemon, defaults to its standard path')
+    parser.add_argument('--no-daemon', action='store_true', help='always call the hub directly')
+    commands = parser.add_subparsers(metavar='command')
+    commands.required = True
+
+    sub = commands.add_parser('list', help='list devices')
+    sub.add_argument(
+        '--capability',
+        action='append',
+        default=[],
+        metavar='CAPABILITY',
+        help='only devices with this capability, known to the library or not, can be repeated to match any of them')
+    sub.set_defaults(run=_list)
+
+    sub = commands.add_parser('show', help='print the full data of devices')
+    sub.add_argument('devices', nargs='+', metavar='device')
+    sub.set_defaults(run=_show)
+
+    for name, text in (('on', 'turn devices on'), ('off', 'turn devices off'),
+                       ('toggle', 'toggle devices on or off')):
+        sub = commands.add_parser(name, help=text)
+        sub.add_argument('devices', nargs='+', metavar='device')
+        sub.set_defaults(run=_command, call='device_' + name, values=())
+
+    sub = commands.add_parser('brightness', help='set the brightness of lights')
+    sub.add_argument('brightness', type=float, help='brightness in the range of [0, 1]')
+    sub.add_argument('devices', nargs='+', metavar='device')
+    sub.set_defaults(run=_command, call='light_brightness', values=('brightness', ))
+
+    sub = commands.add_parser('capabilities', help='compare live capabilities to the known ones')
+    sub.set_defaults(run=_capabilities)
+
+    sub = commands.add_parser('daemon', help='serve hub calls to other processes')
+    sub.set_defaults(run=_daemon)
+    return parser
+
+
+def _client(args):
+    """Connect to the daemon unless asked not to.
+
+    Returns:
+        cozify.daemon.Client: Connected client, or None to call the hub directly.
+    """
+    if args.no_daemon:
+        return None
+    from . import daemon
+    return daemon.connect(args.socket)
+
+
+def _devices(args, kwargs):
+    client = _client(args)
+    if client is not None:
+        return client.devices(**kwargs)
+    from . import hub
+    return hub.devices(**kwargs)
+
+
+def _list(args, kwargs):
+    if args.capability:
+        kwargs['capabilities'] = [name.upper() for name in args.capability]
+    for device_id, device in sorted(_devices(args, kwargs).items()):
+        print('{0}: {1}'.format(device_id, device['name']))
+
+
+def _show(args, kwargs):
+    import pprint
+    devs = _devices(args, kwargs)
+    for device_id in args.devices:
+        if device_id not in devs:
+            raise ValueError('Device not found: {0}'.format(device_id))
+        pprint.pprint(devs[device_id])
+
+
+def _command(args, kwargs):
+    """Send the same command to every given device.
+    """
+    values = [getattr(args, name) for name in args.values]
+    client = _client(args)
+    if client is not None:
+        # every call replies once its command was sent and the daemon's pooled connection keeps the calls
+        # cheap. Eligibility checks fetch live, a cached snapshot wouldn't show the previous commands yet.
+        for device_id in args.devices:
+            client.call(args.call, device_id, *values, **kwargs)
+        return
+    from . import hub
+    # one fetch for all eligibility checks and one call for all commands
+    devs = hub.devices(**kwargs)
+    queue = hub.command_queue(**kwargs)
+    failed = queue.counters['failed']
+    for device_id in args.devices:
+        getattr(hub, args.call)(device_id, *values, devs=devs, queued=True, **kwargs)
+    if not queue.flush(timeout=30):
+        raise TimeoutError('Commands were not sent within 30s')
+    if queue.counters['failed'] > failed:
+        raise RuntimeError('{0} commands failed'.format(queue.counters['failed'] - failed))
+
+
+def _capabilities(args, kwargs):
+    devs = _devices(args, kwargs)
+    from . import hub, __version__
+    from .capabilities import registry
+    gathered = set()
+    for device in devs.values():
+        gathered.update(device['capabilities']['values'])
+    implemented = set(c.name for c in hub.capability)
+    unknown = gathered - implemented
+    print('Capabilities in python-cozify version {0}'.format(__version__))
+    print('implemented ({0}): {1}'.format(len(implemented), sorted(implemented)))
+    print('gathered ({0}): {1}'.format(len(gathered), sorted(gathered)))
+    print('Not currently implemented ({0}): {1}'.format(len(unknown), sorted(unknown)))
+    learned = set(registry().unknown()) - unknown
+    if learned:
+        print('Seen earlier but not currently implemented ({0}): {1}'.format(
+            len(learned), sorted(learned)))
+
+
+def _daemon(args, kwargs):
+    from . import daemon
+    daemon.serve(args.socket)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,7 @@ Attributes:
 
 import json, requests
 
+from . import metrics, transport
 from .Error import APIError, AuthenticationError
 
 cloudBase = 'https://cloud2.cozify.fi/ui/0.2/'
@@ -20,7 +21,7 @@ def requestlogin(email):  # pragma: no cover
     """
 
     payload = {'email': email}
-    response = requests.post(cloudBase + 'user/requestlogin', params=payload, timeout=5)
+    response = _request(transport.session.post, 'user/requestlogin', params=payload)
     if response.status_code is not 200:
         raise APIError(response.status_code, response.text)
 
@@ -38,7 +39,7 @@ def emaillogin(email, otp):  # pragma: no cover
 
     payload = {'email': email, 'password': otp}
 
-    response = requests.post(cloudBase + 'user/emaillogin', params=payload, timeout=5)
+    response = _request(transport.session.post, 'user/emaillogin', params=payload)
     if response.status_code == 200:
         return response.text
     else:
@@ -54,7 +55,7 @@ def lan_ip():  # pragma: no cover
     Returns:
         list: List of Hub ip addresses.
     """
-    response = requests.get(cloudBase + 'hub/lan_ip', timeout=5)
+    response = _request(transport.session.get, 'hub/lan_ip')
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -71,7 +72,7 @@ def hubkeys(cloud_token):  # pragma: no cover
         dict: Map of hub_id: hub_token pairs.
     """
     headers = {'Authorization': cloud_token}
-    response = requests.get(cloudBase + 'user/hubkeys', headers=headers, timeout=5)
+    response = _request(transport.session.get, 'user/hubkeys', headers=headers)
     if response.status_code == 200:
         return json.loads(response.text)
     else:
@@ -88,7 +89,7 @@ def refreshsession(cloud_token):  # pragma: no cover
         str: New cloud remote authentication token. Not automatically stored into state.
     """
     headers = {'Authorization': cloud_token}
-    response = requests.get(cloudBase + 'user/refreshsession', headers=headers, timeout=5)
+    response = _request(transport.session.get, 'user/refreshsession', headers=headers)
     if response.status_code == 200:
         return response.text
     else:
@@ -110,9 +111,45 @@ def remote(cloud_token, hub_token, apicall, payload=None, **kwargs):  # pragma:
 
     headers = {'Authorization': cloud_token, 'X-Hub-Key': hub_token}
     if payload:
-        response = requests.put(
-            cloudBase + 'hub/remote' + apicall, headers=headers, data=payload, timeout=5)
+        response = _request(
+            transport.session.put,
+            'hub/remote' + apicall,
+            endpoint='hub/remote',
+            hub_id=kwargs.get('hub_id'),
+            headers=headers,
+            data=payload)
     else:
-        response = requests.get(cloudBase + 'hub/remote' + apicall, headers=headers, timeout=5)
+        response = _request(
+            transport.session.get,
+            'hub/remote' + apicall,
+            endpoint='hub/remote',
+            hub_id=kwargs.get('hub_id'),
+            headers=headers)
 
     return response
+
+
+def _request(method, call, endpoint=None, hub_id=None, **kwargs):
+    """Backend for all cloud calls, performs the request and feeds cozify.metrics when active.
+
+    Args:
+        method(function): transport.session.get|put|post function to use for call.
+        call(str): API path to call after cloudBase.
+        endpoint(str): Name of the endpoint for instrumentation. Defaults to call.
+        hub_id(str): Id of the hub the call concerns, if any.
+        **kwargs: Passed on to method.
+
+    Returns:
+        requests.response: Requests response object.
+    """
+    if not metrics.active:
+        return method(cloudBase + call, timeout=5, **kwargs)
+
+    instrumented = metrics.begin(endpoint or call, hub_id=hub_id, path='cloud')
+    try:
+        response = method(cloudBase + call, timeout=5, **kwargs)
+    except requests.exceptions.RequestException:
+        metrics.end(instrumented, status_code='connection failure')
+        raise
+    metrics.end(instrumented, status_code=response.status_code, nbytes=len(response.content))
+    return response
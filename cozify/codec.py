@@ -0,0 +1,65 @@
+"""Module for JSON decoding & encoding using the fastest implementation available.
+
+orjson is preferred, then ujson and finally the standard library json module. Install the 'fast'
+extra (pip install cozify[fast]) to get orjson.
+
+Attributes:
+    backend(str): Name of the JSON implementation in use: 'orjson', 'ujson' or 'json'.
+"""
+
+import sys
+
+try:
+    import orjson as _impl
+    backend = 'orjson'
+except ImportError:  # pragma: no cover
+    try:
+        import ujson as _impl
+        backend = 'ujson'
+    except ImportError:
+        import json as _impl
+        backend = 'json'
+
+
+def loads(data):
+    """Decode JSON, preferably straight from bytes without an intermediate str copy.
+
+    Args:
+        data(bytes): Raw JSON document, str is also accepted.
+
+    Returns:
+        Decoded object.
+    """
+    if backend == 'json' and isinstance(data, bytes) and sys.version_info < (3, 6):  # pragma: no cover
+        data = data.decode('utf-8')
+    return _impl.loads(data)
+
+
+def dumps(obj):
+    """Encode an object as compact JSON.
+
+    Returns:
+        bytes: utf-8 encoded JSON document.
+    """
+    out = _impl.dumps(obj)
+    if isinstance(out, str):
+        out = out.encode('utf-8')
+    return out
+
+
+def project(devs, fields):
+    """Reduce each device in a devices dict to only the wanted top level fields, dropping references to the rest right after decoding.
+
+    Args:
+        devs(dict): devices dict as returned by the API.
+        fields(list): Top level device keys to keep, for example ['name', 'state']. 'id' is always kept.
+
+    Returns:
+        dict: New devices dict with reduced device dicts.
+    """
+    keep = set(fields)
+    keep.add('id')
+    return {
+        device_id: {k: device[k] for k in keep if k in device}
+        for device_id, device in devs.items()
+    }
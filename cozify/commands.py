@@ -0,0 +1,215 @@
+"""Module for coalescing and rate limiting outgoing device commands.
+
+Commands submitted to a hub's CommandQueue are held for a short window. Commands for the same device
+within the window are merged with last-write-wins semantics and everything pending is flushed as a
+single batched /devices/command call, within a commands-per-second budget per hub.
+
+The high-level helpers in cozify.hub use the queue when called with queued=True, for example:
+    hub.light_brightness(device_id, 0.4, queued=True)
+"""
+
+import collections, threading, time
+from absl import logging
+
+from . import hub_api
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class CommandQueue():
+    """Outgoing command queue for a single hub.
+
+    Args:
+        window(float): Seconds to hold commands for merging before flushing. Defaults to 0.1.
+        rate(float): Maximum amount of device commands sent per second. Defaults to 10.
+        max_pending(int): Maximum amount of devices with pending commands. Further commands for new devices are dropped. Defaults to 1000.
+        send(function): Callable taking a list of commands and **kwargs. Defaults to cozify.hub_api.devices_command.
+        **kwargs: Hub call arguments passed on to send, see cozify.hub_api.put()
+
+    Attributes:
+        counters(dict): Amount of commands 'submitted', 'merged' into a pending command, 'dropped', 'sent' and 'failed', plus sent 'batches'.
+    """
+
+    def __init__(self, window=0.1, rate=10.0, max_pending=1000, send=None, **kwargs):
+        self.window = window
+        self.rate = rate
+        self.max_pending = max_pending
+        self.kwargs = kwargs
+        self.counters = collections.Counter(
+            submitted=0, merged=0, dropped=0, sent=0, failed=0, batches=0)
+        self._send = send or hub_api.devices_command
+        self._pending = collections.OrderedDict()
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._tokens = max(1.0, rate)
+        self._refilled = time.monotonic()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, command):
+        """Queue a command, merging it with any pending command for the same device.
+
+        CMD_DEVICE states are merged key by key. CMD_DEVICE_ON and CMD_DEVICE_OFF merge into a CMD_DEVICE as its isOn value, so e.g. a pending brightness isn't lost. Any other combination replaces what was pending for the device.
+
+        Args:
+            command(dict): Single device command, e.g. {'id': device_id, 'type': 'CMD_DEVICE', 'state': {...}}
+
+        Returns:
+            bool: False if the command was dropped.
+        """
+        with self._cond:
+            self.counters['submitted'] += 1
+            if self._closed:
+                self.counters['dropped'] += 1
+                return False
+            device_id = command['id']
+            pending = self._pending.get(device_id)
+            if pending is not None:
+                self.counters['merged'] += 1
+                self._pending[device_id] = _merge(pending, command)
+            elif len(self._pending) >= self.max_pending:
+                self.counters['dropped'] += 1
+                return False
+            else:
+                self._pending[device_id] = _copy(command)
+            self._start()
+            self._cond.notify()
+            return True
+
+    def pending(self):
+        """Amount of devices with commands waiting to be sent.
+        """
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """Block until all pending commands have been sent or have failed.
+
+        Args:
+            timeout(float): Maximum time to wait in seconds. Defaults to waiting indefinitely.
+
+        Returns:
+            bool: True if the queue was emptied.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, flush=True):
+        """Stop accepting commands. Pending commands are sent first unless flush is False.
+        """
+        if flush:
+            self.flush()
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cozify-commands', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            time.sleep(self.window)  # let more updates arrive and merge
+            with self._cond:
+                batch = self._take()
+            if batch:
+                self._dispatch(batch)
+            with self._cond:
+                self._cond.notify_all()
+
+    def _take(self):
+        """Pop as many pending commands as the rate budget allows, waiting for budget if there is none.
+        """
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                max(1.0, self.rate), self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens >= 1 or self._closed:
+                break
+            self._cond.wait((1 - self._tokens) / self.rate)
+        batch = []
+        while self._pending and len(batch) < int(self._tokens):
+            batch.append(self._pending.popitem(last=False)[1])
+        self._tokens -= len(batch)
+        self._inflight += len(batch)
+        return batch
+
+    def _dispatch(self, batch):
+        try:
+            self._send(batch, **self.kwargs)
+        except Exception as e:
+            logging.error('Sending {0} queued commands failed: {1}'.format(len(batch), e))
+            with self._cond:
+                self.counters['failed'] += len(batch)
+                self._inflight -= len(batch)
+        else:
+            with self._cond:
+                self.counters['sent'] += len(batch)
+                self.counters['batches'] += 1
+                self._inflight -= len(batch)
+
+
+def queue(hub_id, window=None, rate=None, **kwargs):
+    """Get the command queue of a hub, creating it on first use or after it was closed.
+
+    Args:
+        hub_id(str): Id of the hub the queue sends to.
+        window(float): Merge window in seconds, updates an existing queue if given.
+        rate(float): Commands per second budget, updates an existing queue if given.
+        **kwargs: Hub call arguments, see cozify.hub_api.put(). If given they replace those of an existing queue, so the next batch goes out with current tokens and host.
+
+    Returns:
+        CommandQueue: The hub's queue.
+    """
+    with _queues_lock:
+        q = _queues.get(hub_id)
+        if q is None or q._closed:
+            q = _queues[hub_id] = CommandQueue(hub_id=hub_id, **kwargs)
+        elif kwargs:
+            q.kwargs = dict(kwargs, hub_id=hub_id)
+    if window is not None:
+        q.window = window
+    if rate is not None:
+        q.rate = rate
+    return q
+
+
+_switches = {'CMD_DEVICE_ON': True, 'CMD_DEVICE_OFF': False}
+
+
+def _merge(pending, command):
+    """Merge a command into the pending one of the same device, later values win.
+    """
+    if pending['type'] == 'CMD_DEVICE' and command['type'] == 'CMD_DEVICE':
+        pending['state'].update(command['state'])
+        return pending
+    if pending['type'] == 'CMD_DEVICE' and command['type'] in _switches:
+        pending['state']['isOn'] = _switches[command['type']]
+        return pending
+    if pending['type'] in _switches and command['type'] == 'CMD_DEVICE':
+        merged = _copy(command)
+        merged['state'] = dict({'isOn': _switches[pending['type']]}, **command['state'])
+        return merged
+    return _copy(command)
+
+
+def _copy(command):
+    out = dict(command)
+    if 'state' in out:
+        out['state'] = dict(out['state'])
+    return out
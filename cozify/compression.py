@@ -0,0 +1,330 @@
+"""Module for compact storage of long sensor series.
+
+Series are split into chunks of a bounded amount of points. Inside a chunk timestamps are stored as
+delta-of-deltas, which is mostly a single bit for a sensor reporting on a regular interval, and values are
+XORed with the previous value so an unchanged reading is also a single bit and a slowly changing one only
+stores its differing middle bits. Encoding and decoding both stream one point at a time.
+
+Chunks are written to a file each behind a small header holding their time range, so a reader can jump to
+the chunks covering a time range without decoding anything else. Files are read through mmap.
+
+Example:
+    compression.write(recorder.query(device_id, 'temperature'), 'temperature.czts')
+    with compression.Reader('temperature.czts') as reader:
+        for timestamp, value in reader.read(start, end):
+            ...
+
+Attributes:
+    magic(bytes): File signature including the format version.
+"""
+
+import mmap, os, struct
+
+magic = b'CZTS\x01'
+
+_header = struct.Struct('<IIqq')  # payload bytes, points, first time, last time
+_double = struct.Struct('>d')
+_uint64 = struct.Struct('>Q')
+
+# delta-of-delta buckets: (prefix, prefix length, value bits), zigzag encoded values below 2**bits
+_buckets = ((0b10, 2, 7), (0b110, 3, 12), (0b1110, 4, 20), (0b1111, 4, 64))
+
+
+class Encoder():
+    """Streaming encoder of a single chunk.
+
+    Attributes:
+        count(int): Amount of points appended.
+        first(int): Timestamp of the first point.
+        last(int): Timestamp of the last point.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.first = None
+        self.last = None
+        self._bits = _BitWriter()
+        self._delta = 0
+        self._value = 0
+        self._leading = None
+        self._trailing = None
+
+    def append(self, timestamp, value):
+        """Add a point. Timestamps are integers, e.g. epoch milliseconds, and must not decrease.
+
+        Args:
+            timestamp(int): Time of the point.
+            value(float): Value of the point.
+        """
+        timestamp = int(timestamp)
+        value = _uint64.unpack(_double.pack(value))[0]
+        bits = self._bits
+        if self.count == 0:
+            bits.write(timestamp & 0xFFFFFFFFFFFFFFFF, 64)
+            bits.write(value, 64)
+            self.first = timestamp
+        else:
+            delta = timestamp - self.last
+            self._write_dod(delta - self._delta)
+            self._delta = delta
+            self._write_xor(value ^ self._value)
+        self._value = value
+        self.last = timestamp
+        self.count += 1
+
+    def finish(self):
+        """bytes: Encoded chunk payload.
+        """
+        return self._bits.getvalue()
+
+    def _write_dod(self, dod):
+        bits = self._bits
+        if dod == 0:
+            bits.write(0, 1)
+            return
+        zigzag = (dod << 1) ^ (dod >> 63) if -2**63 <= dod < 2**63 else None
+        for prefix, length, size in _buckets:
+            if zigzag is not None and zigzag < 1 << size:
+                bits.write(prefix, length)
+                bits.write(zigzag & 0xFFFFFFFFFFFFFFFF, size)
+                return
+        raise ValueError('Timestamp step out of range: {0}'.format(dod))
+
+    def _write_xor(self, xor):
+        bits = self._bits
+        if xor == 0:
+            bits.write(0, 1)
+            return
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if self._leading is not None and leading >= self._leading and trailing >= self._trailing:
+            # fits into the previous window of meaningful bits
+            bits.write(0b10, 2)
+            bits.write(xor >> self._trailing, 64 - self._leading - self._trailing)
+            return
+        length = 64 - leading - trailing
+        bits.write(0b11, 2)
+        bits.write(leading, 5)
+        bits.write(length & 0x3F, 6)  # 64 meaningful bits is stored as 0
+        bits.write(xor >> trailing, length)
+        self._leading = leading
+        self._trailing = trailing
+
+
+def decode(data, count):
+    """Stream the points of a chunk.
+
+    Args:
+        data(bytes): Chunk payload, any buffer such as a memoryview into an mmap works.
+        count(int): Amount of points in the chunk.
+
+    Yields:
+        tuple: (timestamp, value) pairs.
+    """
+    if count == 0:
+        return
+    bits = _BitReader(data)
+    timestamp = bits.read(64)
+    if timestamp >= 1 << 63:
+        timestamp -= 1 << 64
+    value = bits.read(64)
+    yield timestamp, _double.unpack(_uint64.pack(value))[0]
+    delta = 0
+    leading = trailing = 0
+    for i in range(count - 1):
+        if bits.read(1):
+            size = _buckets[-1][2]
+            for prefix, length, bucket_size in _buckets[:-1]:
+                if not bits.read(1):
+                    size = bucket_size
+                    break
+            zigzag = bits.read(size)
+            delta += (zigzag >> 1) ^ -(zigzag & 1)
+        timestamp += delta
+        if bits.read(1):
+            if bits.read(1):
+                leading = bits.read(5)
+                length = bits.read(6) or 64
+                trailing = 64 - leading - length
+            value ^= bits.read(64 - leading - trailing) << trailing
+        yield timestamp, _double.unpack(_uint64.pack(value))[0]
+
+
+class Writer():
+    """Writes a series into a chunked file.
+
+    Args:
+        path(str): File to write, replaced if it exists.
+        chunk_size(int): Points per chunk, the unit of random access. Defaults to 1024.
+    """
+
+    def __init__(self, path, chunk_size=1024):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._file = open(path, 'wb')
+        self._file.write(magic)
+        self._chunk = Encoder()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, timestamp, value):
+        """Add a point, see Encoder.append().
+        """
+        self._chunk.append(timestamp, value)
+        if self._chunk.count >= self.chunk_size:
+            self._flush()
+
+    def close(self):
+        """Write the last partial chunk and close the file.
+        """
+        self._flush()
+        self._file.close()
+
+    def _flush(self):
+        chunk = self._chunk
+        if not chunk.count:
+            return
+        payload = chunk.finish()
+        self._file.write(_header.pack(len(payload), chunk.count, chunk.first, chunk.last))
+        self._file.write(payload)
+        self._chunk = Encoder()
+
+
+def write(points, path, chunk_size=1024):
+    """Write (timestamp, value) pairs into a chunked file.
+
+    Args:
+        points(iterable): Time ordered (timestamp, value) pairs, e.g. from cozify.timeseries.Recorder.query()
+        path(str): File to write.
+        chunk_size(int): Points per chunk. Defaults to 1024.
+
+    Returns:
+        int: Amount of points written.
+    """
+    count = 0
+    with Writer(path, chunk_size=chunk_size) as writer:
+        for timestamp, value in points:
+            writer.append(timestamp, value)
+            count += 1
+    return count
+
+
+class Reader():
+    """Memory-mapped reader of a chunked file.
+
+    Args:
+        path(str): File to read.
+
+    Attributes:
+        chunks(list): (first time, last time, points, payload offset, payload bytes) of every chunk, in file order.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if bytes(self._map[:len(magic)]) != magic:
+            self.close()
+            raise ValueError('Not a compressed series file or unsupported version: {0}'.format(path))
+        self.chunks = []
+        offset = len(magic)
+        while offset < size:
+            length, count, first, last = _header.unpack_from(self._map, offset)
+            offset += _header.size
+            self.chunks.append((first, last, count, offset, length))
+            offset += length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return sum(chunk[2] for chunk in self.chunks)
+
+    def chunk(self, index):
+        """Stream the points of a single chunk.
+
+        Args:
+            index(int): Position of the chunk in chunks.
+
+        Yields:
+            tuple: (timestamp, value) pairs.
+        """
+        first, last, count, offset, length = self.chunks[index]
+        # a copy of the payload, a view into the map would keep close() from unmapping it
+        return decode(self._map[offset:offset + length], count)
+
+    def read(self, start=None, end=None):
+        """Stream points in a time range, decoding only the chunks that overlap it.
+
+        Args:
+            start(int): Earliest timestamp, inclusive. Defaults to the beginning.
+            end(int): Latest timestamp, exclusive. Defaults to the end.
+
+        Yields:
+            tuple: (timestamp, value) pairs.
+        """
+        for index, (first, last, count, offset, length) in enumerate(self.chunks):
+            if start is not None and last < start:
+                continue
+            if end is not None and first >= end:
+                break
+            for timestamp, value in self.chunk(index):
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    return
+                yield timestamp, value
+
+    def close(self):
+        """Unmap and close the file. Iterations in progress can finish their current chunk, reading further raises ValueError.
+        """
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+class _BitWriter():
+
+    def __init__(self):
+        self._out = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value, bits):
+        self._acc = (self._acc << bits) | value
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self._out.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self):
+        if self._bits:
+            return bytes(self._out) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self._out)
+
+
+class _BitReader():
+
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+        self._acc = 0
+        self._bits = 0
+
+    def read(self, bits):
+        while self._bits < bits:
+            self._acc = (self._acc << 8) | self._data[self._pos]
+            self._pos += 1
+            self._bits += 8
+        self._bits -= bits
+        value = self._acc >> self._bits
+        self._acc &= (1 << self._bits) - 1
+        return value
@@ -0,0 +1,188 @@
+"""Module for tracking when devices actually reach a commanded state.
+
+A Tracker runs one shared poller per hub. Every watched device is checked against its expected state from
+the same /devices fetch, and polling backs off while nothing changes. Each watch resolves a
+concurrent.futures.Future with the command-to-state latency, and latency statistics are kept per device
+and per device model.
+
+The high-level helpers in cozify.hub watch the device when called with ack=True, for example:
+    hub.light_brightness(device_id, 0.5, ack=True).result()
+"""
+
+import threading, time
+from concurrent.futures import Future
+from absl import logging
+
+from . import hub_api
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+_options = ('interval', 'max_interval', 'backoff', 'tolerance', 'fetch')
+
+
+class Tracker():
+    """Shared poller resolving watches when devices converge.
+
+    Args:
+        interval(float): Initial polling interval in seconds. Defaults to 0.2.
+        max_interval(float): Upper bound for the backed off polling interval. Defaults to 2.0.
+        backoff(float): Interval multiplier for each poll where no watch resolved. Defaults to 1.5.
+        tolerance(float): Allowed absolute difference for numeric values, hubs round e.g. brightness. Defaults to 0.01.
+        fetch(function): Callable returning a devices dict. Defaults to cozify.hub_api.devices(**kwargs).
+        **kwargs: Hub call arguments for the default fetch, see cozify.hub_api.get()
+    """
+
+    def __init__(self,
+                 interval=0.2,
+                 max_interval=2.0,
+                 backoff=1.5,
+                 tolerance=0.01,
+                 fetch=None,
+                 **kwargs):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.kwargs = kwargs
+        self._fetch = fetch or (lambda: hub_api.devices(**self.kwargs))
+        self._watches = []
+        self._stats = {'devices': {}, 'models': {}}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._wakeup = False
+
+    def watch(self, device_id, expected, timeout=10.0):
+        """Watch a device until its reported state contains the expected values.
+
+        Args:
+            device_id(str): Device to watch.
+            expected(dict): State values to wait for. 'type' and 'transitionMsec' are ignored.
+            timeout(float): Seconds to wait before failing the future with a TimeoutError. Defaults to 10.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the convergence latency in seconds.
+        """
+        expected = {k: v for k, v in expected.items() if k not in ('type', 'transitionMsec')}
+        future = Future()
+        now = time.monotonic()
+        with self._cond:
+            self._watches.append((device_id, expected, future, now, now + timeout))
+            self._wakeup = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='cozify-convergence', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def stats(self):
+        """Get convergence latency statistics.
+
+        Returns:
+            dict: {'devices': {device_id: stats}, 'models': {model: stats}} where stats is a dict of 'count', 'sum', 'min', 'max' & 'mean' latency in seconds plus the amount of 'timeouts'.
+        """
+        with self._cond:
+            return {
+                kind: {
+                    key: dict(value, mean=value['sum'] / value['count'] if value['count'] else None)
+                    for key, value in entries.items()
+                } for kind, entries in self._stats.items()
+            }
+
+    def _run(self):
+        interval = self.interval
+        while True:
+            with self._cond:
+                if not self._watches:
+                    self._thread = None
+                    return
+                self._wakeup = False
+            try:
+                devs = self._fetch()
+            except Exception as e:
+                logging.warning('Convergence poll failed: {0}'.format(e))
+                devs = {}
+            now = time.monotonic()
+            resolved = self._check(devs, now)
+            interval = self.interval if resolved else min(self.max_interval,
+                                                          interval * self.backoff)
+            with self._cond:
+                if not self._wakeup:
+                    self._cond.wait(interval)
+                if self._wakeup:
+                    interval = self.interval
+
+    def _check(self, devs, now):
+        """Resolve converged and expired watches against a snapshot.
+
+        Returns:
+            int: Amount of watches resolved as converged.
+        """
+        converged = 0
+        remaining = []
+        with self._cond:
+            watches, self._watches = self._watches, []
+        for watch in watches:
+            device_id, expected, future, start, expires = watch
+            if future.done():  # cancelled by the caller
+                continue
+            device = devs.get(device_id)
+            model = device.get('model') if device else None
+            if device and self._matches(device['state'], expected):
+                latency = now - start
+                self._record(device_id, model, latency)
+                future.set_result(latency)
+                converged += 1
+            elif now > expires:
+                self._record(device_id, model, None)
+                future.set_exception(
+                    TimeoutError('Device {0} did not reach {1}'.format(device_id, expected)))
+            else:
+                remaining.append(watch)
+        with self._cond:
+            self._watches.extend(remaining)
+        return converged
+
+    def _matches(self, state, expected):
+        for key, value in expected.items():
+            current = state.get(key)
+            if isinstance(value, float) or isinstance(current, float):
+                if current is None or abs(current - value) > self.tolerance:
+                    return False
+            elif current != value:
+                return False
+        return True
+
+    def _record(self, device_id, model, latency):
+        with self._cond:
+            for kind, key in (('devices', device_id), ('models', model)):
+                entry = self._stats[kind].setdefault(
+                    key, {'count': 0, 'sum': 0.0, 'min': None, 'max': None, 'timeouts': 0})
+                if latency is None:
+                    entry['timeouts'] += 1
+                    continue
+                entry['count'] += 1
+                entry['sum'] += latency
+                entry['min'] = latency if entry['min'] is None else min(entry['min'], latency)
+                entry['max'] = latency if entry['max'] is None else max(entry['max'], latency)
+
+
+def tracker(hub_id, **kwargs):
+    """Get the convergence tracker of a hub, creating it on first use.
+
+    Args:
+        hub_id(str): Id of the hub to poll.
+        **kwargs: Tracker options, only used when the tracker is created, and hub call arguments. Given call arguments replace those of an existing tracker, so the next poll goes out with current tokens and host.
+
+    Returns:
+        Tracker: The hub's tracker.
+    """
+    with _trackers_lock:
+        t = _trackers.get(hub_id)
+        if t is None:
+            t = _trackers[hub_id] = Tracker(hub_id=hub_id, **kwargs)
+        else:
+            call = {k: v for k, v in kwargs.items() if k not in _options}
+            if call:
+                t.kwargs = dict(call, hub_id=hub_id)
+    return t
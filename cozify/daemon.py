@@ -0,0 +1,356 @@
+"""Module for a local daemon that serves hub calls to other processes over a Unix socket.
+
+Short lived scripts spend most of their time importing, reading the state file and opening connections
+before sending a single command. The daemon does that once and keeps a pooled requests.Session, the
+in-memory snapshot cache and the per-hub command queues alive, so every process on the host shares them.
+Run it with:
+    python -m cozify.daemon
+
+Clients forward calls of the cozify.hub functions listed in exposed:
+    client = daemon.connect()
+    if client is not None:
+        client.device_on(device_id)
+        devs = client.devices(cached=True)
+
+The protocol is a 4 byte big-endian length followed by a JSON document, in both directions. A request is
+{'call': name, 'args': [...], 'kwargs': {...}} and a reply is {'result': ...} or {'error': {'type': ..., 'args': [...]}}.
+Enum arguments such as hub.capability members are sent by name. A call returning a Future, e.g. one made
+with ack=True, replies once the future resolves. ping is always served with autorefresh=False, the daemon
+has no terminal to ask for a login code on. JSON only has string keys, so stats replies are keyed by
+'endpoint|path' and their status code counts by the code as a string.
+
+Attributes:
+    exposed(frozenset): Names of the cozify.hub functions the daemon serves.
+    max_message(int): Largest accepted message in bytes.
+"""
+
+import enum, functools, os, socket, socketserver, struct, tempfile, threading
+
+from . import codec
+from .Error import APIError, AuthenticationError, DeadlineError
+
+exposed = frozenset([
+    'devices', 'device_exists', 'device_reachable', 'device_toggle', 'device_state_replace',
+    'device_on', 'device_off', 'light_temperature', 'light_color', 'light_brightness', 'room_on',
+    'room_off', 'room_brightness', 'group_on', 'group_off', 'group_brightness', 'zone_on', 'zone_off',
+    'tz', 'stats', 'ping', 'name', 'hub_id', 'default', 'exists'
+])
+
+max_message = 64 * 1024 * 1024
+
+_length = struct.Struct('>I')
+
+# errors re-raised as themselves by the client, anything else becomes a RuntimeError
+_errors = {
+    e.__name__: e
+    for e in (APIError, AuthenticationError, DeadlineError, AttributeError, KeyError, TypeError,
+              ValueError, TimeoutError)
+}
+
+
+def path():
+    """Default socket path, in $XDG_RUNTIME_DIR if set and otherwise in the temporary directory.
+    """
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'python-cozify.sock')
+    return os.path.join(tempfile.gettempdir(), 'python-cozify-{0}.sock'.format(os.getuid()))
+
+
+def connect(socket_path=None, timeout=30.0):
+    """Connect to a running daemon.
+
+    Args:
+        socket_path(str): Socket of the daemon. Defaults to path()
+        timeout(float): Seconds to wait for a reply before giving up on a call. Defaults to 30.
+
+    Returns:
+        Client: Connected client, or None if no daemon is listening.
+    """
+    client = Client(socket_path, timeout=timeout)
+    try:
+        client.open()
+    except OSError:
+        return None
+    return client
+
+
+class Client():
+    """Forwards hub calls to a daemon. Any function in exposed is available as a method taking the same arguments as in cozify.hub, e.g. client.light_brightness(device_id, 0.5, queued=True). Safe to share between threads, calls are serialized over one connection.
+
+    Args:
+        socket_path(str): Socket of the daemon. Defaults to path()
+        timeout(float): Seconds to wait for a reply before giving up on a call. Defaults to 30.
+    """
+
+    def __init__(self, socket_path=None, timeout=30.0):
+        self.path = socket_path or path()
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getattr__(self, name):
+        if name not in exposed:
+            raise AttributeError('Daemon does not serve {0}'.format(name))
+        return functools.partial(self.call, name)
+
+    def open(self):
+        """Connect to the daemon unless already connected.
+        """
+        if self._sock is not None:
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+
+    def call(self, name, *args, **kwargs):
+        """Call a hub function in the daemon.
+
+        Args:
+            name(str): Name of the function, one of exposed.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            Return value of the function. Devices snapshots come back as plain dicts unless the daemon served a cozify.cache.Snapshot.
+        """
+        if name not in exposed:
+            raise AttributeError('Daemon does not serve {0}'.format(name))
+        data = codec.dumps({'call': name, 'args': _encode(args), 'kwargs': _encode(kwargs)})
+        request = _length.pack(len(data)) + data
+        with self._lock:
+            reply = self._roundtrip(request)
+        if 'error' in reply:
+            error = reply['error']
+            raise _errors.get(error['type'], RuntimeError)(*error['args'])
+        if 'snapshot' in reply:
+            from .cache import Snapshot
+            return Snapshot(reply['result'], *reply['snapshot'])
+        return reply['result']
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _roundtrip(self, request):
+        fresh = self._sock is None
+        self.open()
+        try:
+            self._sock.sendall(request)
+        except OSError:
+            # a pooled connection may have been closed by a restarted daemon, nothing was sent yet
+            self.close()
+            if fresh:
+                raise
+            self.open()
+            self._sock.sendall(request)
+        try:
+            reply = _recv(self._sock)
+        except Exception:
+            self.close()
+            raise
+        if reply is None:
+            self.close()
+            raise ConnectionError('Daemon closed the connection.')
+        return reply
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Daemon serving hub calls on a Unix socket, one thread per connected client.
+
+    Args:
+        socket_path(str): Socket to listen on. A stale socket left by a dead daemon is replaced. Defaults to path()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=None):
+        socket_path = socket_path or path()
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)
+            else:
+                raise RuntimeError('A daemon is already listening on {0}'.format(socket_path))
+            finally:
+                probe.close()
+        # the socket is created owner only, no other user can connect in between bind and a chmod
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                request = _recv(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                reply = _serve(request)
+                data = codec.dumps(reply)
+            except Exception as e:
+                data = codec.dumps({'error': {'type': type(e).__name__, 'args': _error_args(e)}})
+            try:
+                self.request.sendall(_length.pack(len(data)) + data)
+            except OSError:
+                return
+
+
+def _serve(request):
+    """Run a single request against cozify.hub.
+
+    Returns:
+        dict: Reply document.
+    """
+    from . import hub
+    from .cache import Snapshot
+    from concurrent.futures import Future
+    name = request.get('call')
+    if name not in exposed:
+        raise AttributeError('Daemon does not serve {0}'.format(name))
+    kwargs = _decode(request.get('kwargs', {}))
+    if name == 'ping':
+        kwargs['autorefresh'] = False  # renewing may prompt for input the daemon can't give
+    result = getattr(hub, name)(*_decode(request.get('args', [])), **kwargs)
+    if isinstance(result, Future):
+        result = result.result()
+    if name == 'stats':
+        result = _stats(result)
+    if isinstance(result, Snapshot):
+        return {'result': result, 'snapshot': [result.timestamp, result.stale]}
+    return {'result': result}
+
+
+def _stats(stats):
+    """Give the histograms of hub.stats() string keys that survive JSON.
+    """
+    return {
+        '|'.join(key): dict(hist, status={str(k): v for k, v in hist['status'].items()})
+        for key, hist in stats.items()
+    }
+
+
+def _error_args(error):
+    if isinstance(error, APIError):
+        return [error.status_code, error.message]
+    if isinstance(error, (AuthenticationError, DeadlineError)):
+        return [error.message]
+    return [str(arg) if not isinstance(arg, (int, float, str)) else arg for arg in error.args]
+
+
+def _encode(value):
+    """Replace enum members with a JSON friendly reference, recursively.
+    """
+    if isinstance(value, enum.Enum):
+        return {'__enum__': type(value).__name__, 'name': value.name}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    """Resolve enum references made by _encode() back to the members.
+    """
+    if isinstance(value, dict):
+        if '__enum__' in value:
+            from . import hub, scheduler
+            enums = {'capability': hub.capability, 'priority': scheduler.priority}
+            return enums[value['__enum__']][value['name']]
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _recv(sock):
+    """Read one length prefixed message.
+
+    Returns:
+        Decoded document or None if the peer closed the connection between messages.
+    """
+    header = _recv_exactly(sock, _length.size)
+    if header is None:
+        return None
+    length = _length.unpack(header)[0]
+    if length > max_message:
+        raise ValueError('Message of {0} bytes exceeds the limit of {1}'.format(
+            length, max_message))
+    data = _recv_exactly(sock, length)
+    if data is None:
+        raise ConnectionError('Connection closed mid-message.')
+    return codec.loads(data)
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            if buf:
+                raise ConnectionError('Connection closed mid-message.')
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def serve(socket_path=None):
+    """Run the daemon until interrupted, with a pooled HTTP session for all hub and cloud calls.
+
+    Args:
+        socket_path(str): Socket to listen on. Defaults to path()
+    """
+    import requests
+    from absl import logging
+    from . import transport
+    transport.session = requests.Session()
+    server = Server(socket_path)
+    logging.info('Serving hub calls on {0}'.format(server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m cozify.daemon', description='Serve hub calls to local processes.')
+    parser.add_argument('--socket', help='socket path, defaults to {0}'.format(path()))
+    args = parser.parse_args(argv)
+    serve(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Module for a compact, typed representation of devices.
+
+Device objects hold the same data as the raw device dicts returned by hub.devices() but in a fraction
+of the memory: strings are interned, identical lists (capabilities, rooms, state keys) are shared
+between devices and state is kept as a flat tuple that is only turned into a dict when accessed.
+Dict style access (device['state']['isOn']) keeps working for code written against raw dicts.
+"""
+
+import sys
+
+_special = ('id', 'name', 'capabilities', 'state', 'room', 'groups', 'zones')
+_shared = {}
+_schemas = {}
+_masks = {}
+
+
+class Device():
+    """Compact device record. Create with Device(raw_dict) or device.from_devices().
+
+    Args:
+        data(dict): Single raw device dict as returned by the API.
+
+    Attributes:
+        id(str): Device id, interned.
+        name(str): Device name.
+        mask(int): Bitmask of the device's known capabilities, see capability_mask().
+        room(tuple): Room ids the device belongs to.
+        groups(tuple): Group ids the device belongs to.
+        zones(tuple): Zone ids the device belongs to.
+    """
+
+    __slots__ = ('id', 'name', 'mask', 'room', 'groups', 'zones', '_capabilities', '_state_schema',
+                 '_state_values', '_rest_schema', '_rest_values')
+
+    def __init__(self, data):
+        self.id = sys.intern(data['id'])
+        self.name = data.get('name')
+        caps = data.get('capabilities') or {}
+        self._capabilities = (_intern(caps.get('type')), _share(caps.get('values', ())))
+        self.mask = _masks.get(self._capabilities[1])
+        if self.mask is None:
+            from .capabilities import registry
+            registry().observe({self.id: self})  # names the registry hasn't seen get their bits here
+            self.mask = _masks.setdefault(self._capabilities[1],
+                                          capability_mask(self._capabilities[1]))
+        self.room = _share(data.get('room') or ())
+        self.groups = _share(data.get('groups') or ())
+        self.zones = _share(data.get('zones') or ())
+        state = data.get('state') or {}
+        self._state_schema = _schema(state.keys())
+        self._state_values = tuple(_intern(v) for v in state.values())
+        rest = [k for k in data.keys() if k not in _special]
+        self._rest_schema = _schema(rest)
+        self._rest_values = tuple(_intern(data[k]) for k in rest)
+
+    @property
+    def capabilities(self):
+        """tuple: Names of all capabilities the device reports, known or not.
+        """
+        return self._capabilities[1]
+
+    @property
+    def state(self):
+        """dict: Device state, built on access. Modifying it does not modify the Device.
+        """
+        return dict(zip(self._state_schema[0], self._state_values))
+
+    @property
+    def raw(self):
+        """dict: Full device dict equal to what the API returned.
+        """
+        out = dict(zip(self._rest_schema[0], self._rest_values))
+        out['id'] = self.id
+        out['name'] = self.name
+        out['capabilities'] = {
+            'type': self._capabilities[0],
+            'values': list(self._capabilities[1])
+        }
+        out['state'] = self.state
+        out['room'] = list(self.room)
+        out['groups'] = list(self.groups)
+        out['zones'] = list(self.zones)
+        return out
+
+    def get_state(self, key, default=None):
+        """Get a single state value without building the whole state dict.
+
+        Args:
+            key(str): State key, e.g. 'isOn'.
+            default: Returned when the device has no such state key.
+        """
+        i = self._state_schema[1].get(key)
+        if i is None:
+            return default
+        return self._state_values[i]
+
+    def has(self, capability):
+        """Check for a single capability.
+
+        Args:
+            capability(cozify.hub.capability): Capability or capability name to check for.
+        """
+        return bool(self.mask & capability_mask([capability]))
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        if key == 'name':
+            return self.name
+        if key == 'state':
+            return self.state
+        if key in _special:
+            return self.raw[key]
+        i = self._rest_schema[1].get(key)
+        if i is None:
+            raise KeyError(key)
+        return self._rest_values[i]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return _special + self._rest_schema[0]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __contains__(self, key):
+        return key in _special or key in self._rest_schema[1]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(_special) + len(self._rest_values)
+
+    def __eq__(self, other):
+        if isinstance(other, Device):
+            other = other.raw
+        return self.raw == other
+
+    def __repr__(self):
+        return 'Device({0!r}, {1!r})'.format(self.id, self.name)
+
+
+def from_devices(devs):
+    """Convert a raw devices dict into a dict of Device objects.
+
+    Args:
+        devs(dict): devices dict as returned by hub.devices()
+
+    Returns:
+        dict: Map of device id to Device.
+    """
+    return {sys.intern(device_id): Device(data) for device_id, data in devs.items()}
+
+
+def capability_mask(capabilities):
+    """Turn capabilities into a bitmask for fast filtering. Bit positions come from the shared cozify.capabilities registry, names it hasn't seen on any device are left out.
+
+    Args:
+        capabilities(list): cozify.hub.capability members or capability names.
+
+    Returns:
+        int: Bitmask with one bit per capability.
+    """
+    from .capabilities import registry
+    return registry().mask(capabilities)
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _share(values):
+    """Return a shared tuple equal to values so identical lists across devices only exist once.
+    """
+    values = tuple(_intern(v) for v in values)
+    return _shared.setdefault(values, values)
+
+
+def _schema(keys):
+    """Return a shared (keys, index) pair for a set of dict keys.
+    """
+    keys = tuple(sys.intern(k) for k in keys)
+    schema = _schemas.get(keys)
+    if schema is None:
+        schema = (keys, {k: i for i, k in enumerate(keys)})
+        _schemas[keys] = schema
+    return schema
@@ -0,0 +1,159 @@
+"""Module for monitoring reachability and staleness of all devices of a hub from device snapshots.
+
+A Monitor goes through each snapshot once, remembering per device whether it is reachable, when it was
+last seen and a short history of outages. Health questions about any amount of devices are then answered
+from memory instead of a fetch per device, for example:
+    monitor = hub.health_monitor()
+    monitor.stale(2 * 3600, capability=hub.capability.BATTERY_U)
+"""
+
+import collections, time
+
+
+class _Health():
+    __slots__ = ('reachable', 'last_seen', 'capabilities', 'outages')
+
+    def __init__(self, capabilities):
+        self.reachable = None
+        self.last_seen = None
+        self.capabilities = capabilities
+        self.outages = None
+
+
+class Monitor():
+    """Reachability and staleness tracker for the devices of a hub.
+
+    Args:
+        history(int): Amount of past outages to remember per device. Defaults to 16.
+    """
+
+    def __init__(self, history=16):
+        self.history = history
+        self._devices = {}
+        self._capabilities = {}
+
+    def update(self, devs, now=None):
+        """Process a devices snapshot.
+
+        Args:
+            devs(dict): Full devices dict, devices missing from it are forgotten.
+            now(float): Epoch time of the snapshot in seconds. Defaults to the current time.
+
+        Returns:
+            list: Ids of devices whose reachability changed, new devices excluded.
+        """
+        if now is None:
+            now = time.time()
+        changed = []
+        for device_id in [i for i in self._devices if i not in devs]:
+            del self._devices[device_id]
+        for device_id, device in devs.items():
+            state = device['state']
+            health = self._devices.get(device_id)
+            if health is None:
+                health = _Health(self._intern(device))
+                self._devices[device_id] = health
+            last_seen = state.get('lastSeen')
+            if last_seen is not None:
+                health.last_seen = last_seen / 1000.0
+            reachable = state.get('reachable')
+            if reachable is None or reachable == health.reachable:
+                continue
+            if health.reachable is not None:
+                changed.append(device_id)
+                if reachable:
+                    self._close_outage(health, now)
+                else:
+                    self._open_outage(health, now)
+            elif not reachable:
+                self._open_outage(health, now)
+            health.reachable = reachable
+        return changed
+
+    def reachable(self, device_id):
+        """bool: Last known reachability of a device, None if the snapshot didn't report it.
+        """
+        return self._get(device_id).reachable
+
+    def staleness(self, device_id, now=None):
+        """Seconds since a device was last seen.
+
+        Args:
+            device_id(str): Device to check.
+            now(float): Epoch time to compare to. Defaults to the current time.
+
+        Returns:
+            float: Staleness in seconds or None if the device doesn't report lastSeen.
+        """
+        last_seen = self._get(device_id).last_seen
+        if last_seen is None:
+            return None
+        return (time.time() if now is None else now) - last_seen
+
+    def stale(self, max_age, capability=None, now=None):
+        """Find devices that haven't been seen in a while.
+
+        Args:
+            max_age(float): Seconds since lastSeen after which a device is considered stale.
+            capability(cozify.hub.capability): Optional capability the devices need to have, e.g. BATTERY_U.
+            now(float): Epoch time to compare to. Defaults to the current time.
+
+        Returns:
+            list: Sorted ids of stale devices.
+        """
+        limit = (time.time() if now is None else now) - max_age
+        name = getattr(capability, 'name', capability)
+        return sorted(
+            device_id for device_id, health in self._devices.items()
+            if health.last_seen is not None and health.last_seen < limit and
+            (name is None or name in health.capabilities))
+
+    def unreachable(self, capability=None):
+        """Find devices the hub reports as unreachable.
+
+        Args:
+            capability(cozify.hub.capability): Optional capability the devices need to have.
+
+        Returns:
+            list: Sorted ids of unreachable devices.
+        """
+        name = getattr(capability, 'name', capability)
+        return sorted(device_id for device_id, health in self._devices.items()
+                      if health.reachable is False and
+                      (name is None or name in health.capabilities))
+
+    def outages(self, device_id):
+        """Past and ongoing outages of a device, oldest first.
+
+        Returns:
+            list: (start, end) tuples of epoch seconds, end is None for an ongoing outage.
+        """
+        return list(self._get(device_id).outages or ())
+
+    def __contains__(self, device_id):
+        return device_id in self._devices
+
+    def __len__(self):
+        return len(self._devices)
+
+    def _get(self, device_id):
+        health = self._devices.get(device_id)
+        if health is None:
+            raise ValueError('Device not found: {}'.format(device_id))
+        return health
+
+    def _intern(self, device):
+        # most devices share one of a handful of capability sets
+        capabilities = frozenset((device.get('capabilities') or {}).get('values', ()))
+        return self._capabilities.setdefault(capabilities, capabilities)
+
+    def _open_outage(self, health, now):
+        if health.outages is None:
+            health.outages = collections.deque(maxlen=self.history)
+        # the device went away around when it was last heard from, not when we noticed
+        start = health.last_seen if health.last_seen is not None else now
+        health.outages.append((min(start, now), None))
+
+    def _close_outage(self, health, now):
+        if health.outages and health.outages[-1][1] is None:
+            health.outages[-1] = (health.outages[-1][0], now)
@@ -1,18 +1,35 @@
 """Module for handling highlevel Cozify Hub operations.
 
 Attributes:
-    capability(capability): Enum of known device capabilities. Alphabetically sorted, numeric value not guaranteed to stay constant between versions if new capabilities are added.
+    capability(capability): Enum of known device capabilities. Alphabetically sorted, numeric value not guaranteed to stay constant between versions if new capabilities are added. Filters also accept capability names, including ones missing from the enum, see cozify.capabilities.
 
 """
 
 from absl import logging
-import math
+import math, threading
 from . import config
 from . import hub_api
+from . import metrics
 from enum import Enum
+from concurrent.futures import Future
 
 from .Error import APIError
 
+# State fields that can be commanded per device state type.
+# Types not listed, sensors for example, have nothing that can be commanded.
+_controllable = {
+    'STATE_LIGHT':
+        frozenset([
+            'isOn', 'brightness', 'colorMode', 'hue', 'saturation', 'temperature', 'transitionMsec'
+        ]),
+    'STATE_PLUG': frozenset(['isOn'])
+}
+_read_only = frozenset(['lastSeen', 'reachable', 'maxTemperature', 'minTemperature'])
+
+_indexes = {}
+_monitors = {}
+_negotiating = {}
+
 capability = Enum(
     'capability',
     'ALERT BASS BATTERY_U BRIGHTNESS COLOR_HS COLOR_LOOP COLOR_TEMP CONTACT CONTROL_LIGHT CONTROL_POWER DEVICE DIMMER_CONTROL GENERATE_ALERT HUE_SWITCH HUMIDITY IDENTIFY IKEA_RC LOUDNESS LUX MOISTURE MOTION MUTE NEXT ON_OFF PAUSE PLAY PREVIOUS PUSH_NOTIFICATION REMOTE_CONTROL SEEK SMOKE STOP TEMPERATURE TRANSITION TREBLE TWILIGHT UPGRADE USER_PRESENCE VOLUME'
@@ -21,12 +38,19 @@ capability = Enum(
 ### Device data ###
 
 
-def devices(*, capabilities=None, and_filter=False, **kwargs):
+def devices(*, capabilities=None, and_filter=False, typed=False, **kwargs):
     """Get up to date full devices data set as a dict. Optionally can be filtered to only include certain devices.
+    To go through devices without building a new dict see iter_devices().
 
     Args:
-        capabilities(cozify.hub.capability): Single or list of cozify.hub.capability types to filter by, for example: [ cozify.hub.capability.TEMPERATURE, cozify.hub.capability.HUMIDITY ]. Defaults to no filtering.
+        capabilities(cozify.hub.capability): Single or list of cozify.hub.capability types or capability names to filter by, for example: [ cozify.hub.capability.TEMPERATURE, 'HUMIDITY' ]. Defaults to no filtering.
         and_filter(bool): Multi-filter by AND instead of default OR. Defaults to False.
+        typed(bool): Return compact cozify.device.Device objects instead of raw dicts. Defaults to False.
+        **fields(list): Optional list of top level device keys to keep, for example ['name', 'state']. 'capabilities' is also kept when filtering by it. Defaults to keeping everything.
+        **cached(bool): Serve the last snapshot stored on disk right away and refresh it in the background, see cozify.cache. The first call without a stored snapshot fetches live. Defaults to False.
+        **max_staleness(float): Serve a stored snapshot younger than this many seconds without calling the hub. When the call fails the last good snapshot is returned with stale set. Defaults to always calling.
+        **latency_budget(float): Seconds to wait for the hub before returning the last good snapshot with stale set. The call finishes in the background. Defaults to waiting.
+        **max_age(float): With the above, oldest snapshot in seconds acceptable in place of a failed call. Defaults to any age.
         **hub_name(str): optional name of hub to query. Will get converted to hubId for use.
         **hub_id(str): optional id of hub to query. A specified hub_id takes presedence over a hub_name or default Hub. Providing incorrect hub_id's will create cruft in your state but it won't hurt anything beyond failing the current operation.
         **remote(bool): Remote or local query.
@@ -34,39 +58,77 @@ def devices(*, capabilities=None, and_filter=False, **kwargs):
         **hubName(str): Deprecated. Compatibility keyword for hub_name, to be removed in v0.3
 
     Returns:
-        dict: full live device state as returned by the API
+        dict: full live device state as returned by the API. A cozify.cache.Snapshot when cached.
 
     """
     _fill_kwargs(kwargs)
-    devs = hub_api.devices(**kwargs)
+    devs = _fetch_devices(kwargs, capabilities)
     if capabilities:
-        if isinstance(capabilities, capability):  # single capability given
-            return {
-                key: value
-                for key, value in devs.items()
-                if capabilities.name in value['capabilities']['values']
-            }
-        else:  # multi-filter
-            if and_filter:
-                return {
-                    key: value
-                    for key, value in devs.items()
-                    if all(c.name in value['capabilities']['values'] for c in capabilities)
-                }
-            else:  # or_filter
-                return {
-                    key: value
-                    for key, value in devs.items()
-                    if any(c.name in value['capabilities']['values'] for c in capabilities)
-                }
-    else:  # no filtering
-        return devs
+        devs = _derive(devs, dict(iter_devices(
+            capabilities=capabilities, and_filter=and_filter, devs=devs)))
+    if typed:
+        from . import device
+        return device.from_devices(devs)
+    return devs
+
+
+def iter_devices(*, capabilities=None, and_filter=False, devs=None, **kwargs):
+    """Lazily go through devices, optionally filtered the same way as devices(). Nothing is copied.
+
+    Args:
+        capabilities(cozify.hub.capability): Single or list of cozify.hub.capability types or capability names to filter by. Defaults to no filtering.
+        and_filter(bool): Multi-filter by AND instead of default OR. Defaults to False.
+        devs(dict): Optional devices dictionary to go through. If not defined, will be retrieved live.
+        **fields(list): Optional list of top level device keys to keep, see devices().
+        **cached(bool): Go through the stored snapshot, see devices().
+        **hub_name(str): optional name of hub to query. Will get converted to hubId for use.
+        **hub_id(str): optional id of hub to query. A specified hub_id takes presedence over a hub_name or default Hub.
+        **remote(bool): Remote or local query.
+
+    Yields:
+        tuple: (id, device) pairs of matching devices.
+    """
+    if devs is None:
+        _fill_kwargs(kwargs)
+        devs = _fetch_devices(kwargs, capabilities)
+    match = _capability_test(capabilities, and_filter)
+    for key, value in devs.items():
+        if match is None or match(value):
+            yield key, value
+
+
+def find(predicate, devs=None, **kwargs):
+    """Lazily find devices matching a query predicate, using the hub's device index to skip devices that can't match.
+
+    Args:
+        predicate(cozify.query.Predicate): Compiled query, e.g. query.capability(capability.BRIGHTNESS) & (query.state('brightness') > 0.5)
+        devs(dict): Optional devices dictionary to search. If not defined, will be retrieved live.
+
+    Returns:
+        generator: (id, device) pairs of matching devices.
+    """
+    _fill_kwargs(kwargs)
+    from . import query
+    if devs is not None:
+        return query.select(predicate, devs, index=device_index(devs=devs, **kwargs))
+    devs = devices(**kwargs)
+    if kwargs.get('capabilities') or kwargs.get('fields'):
+        return query.select(predicate, devs, index=device_index(devs=devs, **kwargs))
+    return query.select(predicate, devs, index=_shared_index(devs, **kwargs))
+
 
+def device_reachable(device_id, devs=None, **kwargs):
+    """Check if the hub can currently reach a device. To check the health of many devices see health_monitor().
 
-def device_reachable(device_id, **kwargs):
+    Args:
+        device_id(str): ID of the device to check.
+        devs(dict): Optional devices dictionary to use. If not defined, will be retrieved live.
+    Returns:
+        bool: Reachability as reported by the hub.
+    """
     _fill_kwargs(kwargs)
     state = {}
-    if device_exists(device_id, state=state, **kwargs):
+    if device_exists(device_id, devs=devs, state=state, **kwargs):
         return state['reachable']
     else:
         raise ValueError('Device not found: {}'.format(device_id))
@@ -82,15 +144,7 @@ def device_exists(device_id, devs=None, state=None, **kwargs):
     Returns:
         bool: True if filter matches.
     """
-    if devs is None:  # only retrieve if we didn't get them
-        devs = devices(**kwargs)
-    if device_id in devs:
-        if state is not None:
-            state.update(devs[device_id]['state'])
-            logging.debug('Implicitly returning state: {0}'.format(state))
-        return True
-    else:
-        return False
+    return device_eligible(device_id, None, devs=devs, state=state, **kwargs)
 
 
 def device_eligible(device_id, capability_filter, devs=None, state=None, **kwargs):
@@ -98,21 +152,25 @@ def device_eligible(device_id, capability_filter, devs=None, state=None, **kwarg
 
     Args:
         device_id(str): ID of the device to check.
-        capability_filter(hub.capability): Single hub.capability or a list of them to match against.
+        capability_filter(hub.capability): Single hub.capability or capability name, or a list of them to match against.
         devs(dict): Optional devices dictionary to use. If not defined, will be retrieved live.
         state(dict): Optional state dictionary, will be updated with state of checked device if device is eligible. Previous data in the dict is preserved unless it's overwritten by new values.
     Returns:
         bool: True if filter matches.
     """
     if devs is None:  # only retrieve if we didn't get them
-        devs = devices(capabilities=capability_filter, **kwargs)
-    if device_id in devs:
-        if state is not None:
-            state.update(devs[device_id]['state'])
-            logging.debug('Implicitly returning state: {0}'.format(state))
-        return True
-    else:
+        devs = devices(**kwargs)
+    device = devs.get(device_id)
+    if device is None:
         return False
+    match = _capability_test(capability_filter, and_filter=True)
+    # pre-filtered or projected snapshots may come without capabilities, trust the caller on those
+    if match is not None and 'capabilities' in device and not match(device):
+        return False
+    if state is not None:
+        state.update(device['state'])
+        logging.debug('Implicitly returning state: {0}'.format(state))
+    return True
 
 
 ### Device control ###
@@ -126,20 +184,24 @@ def device_toggle(device_id, **kwargs):
         **hub_id(str): optional id of hub to operate on. A specified hub_id takes presedence over a hub_name or default Hub.
         **hub_name(str): optional name of hub to operate on.
         **remote(bool): Remote or local query.
+        **queued(bool): Send through the hub's command queue where updates get merged and rate limited, see cozify.commands. Defaults to False.
+        **priority(cozify.scheduler.priority): Send through the hub's scheduler with this priority and return a concurrent.futures.Future. Defaults to sending directly.
+        **deadline(float): With priority, seconds after which the command is dropped if it couldn't be sent yet.
+        **ack(bool): Return a concurrent.futures.Future resolving once the device reports the new state, see cozify.convergence. Defaults to False.
+        **ack_timeout(float): With ack, seconds to wait for the device before failing with a TimeoutError. Defaults to 10.
     """
     _fill_kwargs(kwargs)
 
-    # Get list of devices known to support toggle and find the device and it's state.
-    devs = devices(capabilities=capability.ON_OFF, **kwargs)
-    dev_state = devs[device_id]['state']
-    current_power = dev_state['isOn']
-    new_state = _clean_state(dev_state)
-    new_state['isOn'] = not current_power  # reverse power state
-    hub_api.devices_command_state(device_id=device_id, state=new_state, **kwargs)
+    dev_state = {}  # will be populated by device_eligible
+    if device_eligible(device_id, capability.ON_OFF, state=dev_state, **kwargs):
+        return _command_state(device_id, dev_state, {'isOn': not dev_state['isOn']}, **kwargs)
+    else:
+        raise ValueError('Device not found or not eligible for action.')
 
 
 def device_state_replace(device_id, state, **kwargs):
     """Replace the entire state of a device with the provided state. Useful for example for returning to a stored state.
+    To restore many devices at once see cozify.scene.
 
     Args:
         device_id(str): ID of the device to toggle.
@@ -151,10 +213,9 @@ def device_state_replace(device_id, state, **kwargs):
     _fill_kwargs(kwargs)
 
     if device_exists(device_id, **kwargs):
-        # blank out fields that don't make sense to set
-        for key in ['lastSeen', 'reachable', 'maxTemperature', 'minTemperature']:
-            state.pop(key, None)
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
+        # leave out fields that don't make sense to set, without modifying the caller's dict
+        state = {k: v for k, v in state.items() if k not in _read_only}
+        hub_api.devices_command_state(device_id=device_id, state=state, **_call_kwargs(kwargs))
     else:
         raise AttributeError('device {0} does not exist.'.format(device_id))
 
@@ -164,10 +225,15 @@ def device_on(device_id, **kwargs):
 
     Args:
         device_id(str): ID of the device to operate on.
+        **queued(bool): Send through the hub's command queue where updates get merged and rate limited, see cozify.commands. Defaults to False.
+        **priority(cozify.scheduler.priority): Send through the hub's scheduler with this priority and return a concurrent.futures.Future. Defaults to sending directly.
+        **deadline(float): With priority, seconds after which the command is dropped if it couldn't be sent yet.
+        **ack(bool): Return a concurrent.futures.Future resolving once the device reports the new state, see cozify.convergence. Defaults to False.
+        **ack_timeout(float): With ack, seconds to wait for the device before failing with a TimeoutError. Defaults to 10.
     """
     _fill_kwargs(kwargs)
     if device_eligible(device_id, capability.ON_OFF, **kwargs):
-        hub_api.devices_command_on(device_id, **kwargs)
+        return _dispatch({'id': device_id, 'type': 'CMD_DEVICE_ON'}, **kwargs)
     else:
         raise ValueError('Device not found or not eligible for action.')
 
@@ -177,10 +243,15 @@ def device_off(device_id, **kwargs):
 
     Args:
         device_id(str): ID of the device to operate on.
+        **queued(bool): Send through the hub's command queue where updates get merged and rate limited, see cozify.commands. Defaults to False.
+        **priority(cozify.scheduler.priority): Send through the hub's scheduler with this priority and return a concurrent.futures.Future. Defaults to sending directly.
+        **deadline(float): With priority, seconds after which the command is dropped if it couldn't be sent yet.
+        **ack(bool): Return a concurrent.futures.Future resolving once the device reports the new state, see cozify.convergence. Defaults to False.
+        **ack_timeout(float): With ack, seconds to wait for the device before failing with a TimeoutError. Defaults to 10.
     """
     _fill_kwargs(kwargs)
     if device_eligible(device_id, capability.ON_OFF, **kwargs):
-        hub_api.devices_command_off(device_id, **kwargs)
+        return _dispatch({'id': device_id, 'type': 'CMD_DEVICE_OFF'}, **kwargs)
     else:
         raise ValueError('Device not found or not eligible for action.')
 
@@ -192,6 +263,11 @@ def light_temperature(device_id, temperature=2700, transition=0, **kwargs):
         device_id(str): ID of the device to operate on.
         temperature(float): Temperature in Kelvins. If outside the operating range of the device the extreme value is used. Defaults to 2700K.
         transition(int): Transition length in milliseconds. Defaults to instant.
+        **queued(bool): Send through the hub's command queue where updates get merged and rate limited, see cozify.commands. Defaults to False.
+        **priority(cozify.scheduler.priority): Send through the hub's scheduler with this priority and return a concurrent.futures.Future. Defaults to sending directly.
+        **deadline(float): With priority, seconds after which the command is dropped if it couldn't be sent yet.
+        **ack(bool): Return a concurrent.futures.Future resolving once the device reports the new state, see cozify.convergence. Defaults to False.
+        **ack_timeout(float): With ack, seconds to wait for the device before failing with a TimeoutError. Defaults to 10.
     """
     _fill_kwargs(kwargs)
     state = {}  # will be populated by device_eligible
@@ -202,11 +278,11 @@ def light_temperature(device_id, temperature=2700, transition=0, **kwargs):
                 high=state['maxTemperature'],
                 description='Temperature'):
 
-        state = _clean_state(state)
-        state['colorMode'] = 'ct'
-        state['temperature'] = temperature
-        state['transitionMsec'] = transition
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
+        return _command_state(
+            device_id,
+            state, {'colorMode': 'ct', 'temperature': temperature},
+            transition=transition,
+            **kwargs)
     else:
         raise ValueError('Device not found or not eligible for action.')
 
@@ -219,6 +295,11 @@ def light_color(device_id, hue, saturation=1.0, transition=0, **kwargs):
         hue(float): Hue in the range of [0, Pi*2]. If outside the range a ValueError is raised.
         saturation(float): Saturation in the range of [0, 1]. If outside the range a ValueError is raised. Defaults to 1.0 (full saturation.)
         transition(int): Transition length in milliseconds. Defaults to instant.
+        **queued(bool): Send through the hub's command queue where updates get merged and rate limited, see cozify.commands. Defaults to False.
+        **priority(cozify.scheduler.priority): Send through the hub's scheduler with this priority and return a concurrent.futures.Future. Defaults to sending directly.
+        **deadline(float): With priority, seconds after which the command is dropped if it couldn't be sent yet.
+        **ack(bool): Return a concurrent.futures.Future resolving once the device reports the new state, see cozify.convergence. Defaults to False.
+        **ack_timeout(float): With ack, seconds to wait for the device before failing with a TimeoutError. Defaults to 10.
     """
     _fill_kwargs(kwargs)
     state = {}  # will be populated by device_eligible
@@ -227,11 +308,11 @@ def light_color(device_id, hue, saturation=1.0, transition=0, **kwargs):
                 hue, low=0.0, high=math.pi * 2, description='Hue') and _in_range(
                     saturation, low=0.0, high=1.0, description='Saturation'):
 
-        state = _clean_state(state)
-        state['colorMode'] = 'hs'
-        state['hue'] = hue
-        state['saturation'] = saturation
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
+        return _command_state(
+            device_id,
+            state, {'colorMode': 'hs', 'hue': hue, 'saturation': saturation},
+            transition=transition,
+            **kwargs)
     else:
         raise ValueError('Device not found or not eligible for action.')
 
@@ -243,6 +324,11 @@ def light_brightness(device_id, brightness, transition=0, **kwargs):
         device_id(str): ID of the device to operate on.
         brightness(float): Brightness in the range of [0, 1]. If outside the range a ValueError is raised.
         transition(int): Transition length in milliseconds. Defaults to instant.
+        **queued(bool): Send through the hub's command queue where updates get merged and rate limited, see cozify.commands. Defaults to False.
+        **priority(cozify.scheduler.priority): Send through the hub's scheduler with this priority and return a concurrent.futures.Future. Defaults to sending directly.
+        **deadline(float): With priority, seconds after which the command is dropped if it couldn't be sent yet.
+        **ack(bool): Return a concurrent.futures.Future resolving once the device reports the new state, see cozify.convergence. Defaults to False.
+        **ack_timeout(float): With ack, seconds to wait for the device before failing with a TimeoutError. Defaults to 10.
     """
     _fill_kwargs(kwargs)
     state = {}  # will be populated by device_eligible
@@ -250,13 +336,194 @@ def light_brightness(device_id, brightness, transition=0, **kwargs):
             device_id, capability.BRIGHTNESS, state=state, **kwargs) and _in_range(
                 brightness, low=0.0, high=1.0, description='Brightness'):
 
-        state = _clean_state(state)
-        state['brightness'] = brightness
-        hub_api.devices_command_state(device_id=device_id, state=state, **kwargs)
+        return _command_state(
+            device_id, state, {'brightness': brightness}, transition=transition, **kwargs)
     else:
         raise ValueError('Device not found or not eligible for action.')
 
 
+def command_queue(window=None, rate=None, **kwargs):
+    """Get the outgoing command queue of a hub, created on first use.
+
+    Args:
+        window(float): Seconds to hold commands for merging before sending them as one batch. Only changed if given.
+        rate(float): Maximum device commands per second sent to the hub. Only changed if given.
+        **hub_id(str): optional id of hub to operate on. A specified hub_id takes presedence over a hub_name or default Hub.
+        **hub_name(str): optional name of hub to operate on.
+        **remote(bool): Remote or local query.
+
+    Returns:
+        cozify.commands.CommandQueue: Queue of the hub.
+    """
+    _fill_kwargs(kwargs)
+    from . import commands
+    return commands.queue(window=window, rate=rate, **_call_kwargs(kwargs))
+
+
+def command_scheduler(concurrency=None, **kwargs):
+    """Get the prioritised command scheduler of a hub, created on first use.
+
+    Args:
+        concurrency(int): Maximum amount of command calls in flight to the hub at once. Only changed if given.
+        **hub_id(str): optional id of hub to operate on. A specified hub_id takes presedence over a hub_name or default Hub.
+        **hub_name(str): optional name of hub to operate on.
+        **remote(bool): Remote or local query.
+
+    Returns:
+        cozify.scheduler.Scheduler: Scheduler of the hub.
+    """
+    _fill_kwargs(kwargs)
+    from . import scheduler
+    return scheduler.scheduler(concurrency=concurrency, **_call_kwargs(kwargs))
+
+
+def convergence_tracker(**kwargs):
+    """Get the state convergence tracker of a hub, created on first use.
+
+    Args:
+        **hub_id(str): optional id of hub to operate on. A specified hub_id takes presedence over a hub_name or default Hub.
+        **hub_name(str): optional name of hub to operate on.
+        **remote(bool): Remote or local query.
+
+    Returns:
+        cozify.convergence.Tracker: Tracker of the hub, also holding its command-to-state latency stats.
+    """
+    _fill_kwargs(kwargs)
+    from . import convergence
+    return convergence.tracker(**_call_kwargs(kwargs))
+
+
+### Bulk control ###
+
+
+def device_index(devs=None, **kwargs):
+    """Get the room, group, zone & capability index of a hub, brought up to date with a freshly fetched snapshot.
+
+    Args:
+        devs(dict): Optional devices dictionary to build a separate index from instead. The shared index of the hub is only updated from full snapshots fetched here, since there's no telling whether the given dictionary was filtered. If not defined, will be retrieved live.
+
+    Returns:
+        cozify.index.DeviceIndex: Shared index of the hub updated incrementally, or a new index of the given devices.
+    """
+    _fill_kwargs(kwargs)
+    from . import index
+    if devs is None:
+        return _shared_index(devices(**_unfiltered(kwargs)), **kwargs)
+    if not index.complete(devs):
+        raise ValueError('The device index needs full device data, not a fields projection.')
+    own_index = index.DeviceIndex()
+    own_index.update(devs)
+    return own_index
+
+
+def health_monitor(devs=None, **kwargs):
+    """Get the reachability & staleness monitor of a hub, brought up to date with the given or a freshly fetched snapshot.
+
+    Args:
+        devs(dict): Optional devices dictionary to update the monitor with. If not defined, will be retrieved live.
+
+    Returns:
+        cozify.health.Monitor: Monitor of the hub.
+    """
+    _fill_kwargs(kwargs)
+    from . import health
+    if devs is None:
+        devs = devices(**kwargs)
+    monitor = _monitors.get(kwargs['hub_id'])
+    if monitor is None:
+        monitor = _monitors.setdefault(kwargs['hub_id'], health.Monitor())
+    monitor.update(devs)
+    return monitor
+
+
+def room_on(room_id, **kwargs):
+    """Turn on all devices in a room that are capable of it, as one batched command. For kwargs see device_on()
+
+    Args:
+        room_id(str): Id of the room, as found in the 'room' list of devices.
+    """
+    return _bulk('room', room_id, capability.ON_OFF, {'isOn': True}, **kwargs)
+
+
+def room_off(room_id, **kwargs):
+    """Turn off all devices in a room that are capable of it, as one batched command. For kwargs see device_off()
+
+    Args:
+        room_id(str): Id of the room, as found in the 'room' list of devices.
+    """
+    return _bulk('room', room_id, capability.ON_OFF, {'isOn': False}, **kwargs)
+
+
+def room_brightness(room_id, brightness, transition=0, **kwargs):
+    """Set brightness of all lights in a room as one batched command. For kwargs see light_brightness()
+
+    Args:
+        room_id(str): Id of the room, as found in the 'room' list of devices.
+        brightness(float): Brightness in the range of [0, 1]. If outside the range a ValueError is raised.
+        transition(int): Transition length in milliseconds. Defaults to instant.
+    """
+    _in_range(brightness, low=0.0, high=1.0, description='Brightness')
+    return _bulk(
+        'room',
+        room_id,
+        capability.BRIGHTNESS, {'brightness': brightness},
+        transition=transition,
+        **kwargs)
+
+
+def group_on(group_id, **kwargs):
+    """Turn on all devices in a group that are capable of it, as one batched command. For kwargs see device_on()
+
+    Args:
+        group_id(str): Id of the group, as found in the 'groups' list of devices.
+    """
+    return _bulk('groups', group_id, capability.ON_OFF, {'isOn': True}, **kwargs)
+
+
+def group_off(group_id, **kwargs):
+    """Turn off all devices in a group that are capable of it, as one batched command. For kwargs see device_off()
+
+    Args:
+        group_id(str): Id of the group, as found in the 'groups' list of devices.
+    """
+    return _bulk('groups', group_id, capability.ON_OFF, {'isOn': False}, **kwargs)
+
+
+def group_brightness(group_id, brightness, transition=0, **kwargs):
+    """Set brightness of all lights in a group as one batched command. For kwargs see light_brightness()
+
+    Args:
+        group_id(str): Id of the group, as found in the 'groups' list of devices.
+        brightness(float): Brightness in the range of [0, 1]. If outside the range a ValueError is raised.
+        transition(int): Transition length in milliseconds. Defaults to instant.
+    """
+    _in_range(brightness, low=0.0, high=1.0, description='Brightness')
+    return _bulk(
+        'groups',
+        group_id,
+        capability.BRIGHTNESS, {'brightness': brightness},
+        transition=transition,
+        **kwargs)
+
+
+def zone_on(zone_id, **kwargs):
+    """Turn on all devices in a zone that are capable of it, as one batched command. For kwargs see device_on()
+
+    Args:
+        zone_id(str): Id of the zone, as found in the 'zones' list of devices.
+    """
+    return _bulk('zones', zone_id, capability.ON_OFF, {'isOn': True}, **kwargs)
+
+
+def zone_off(zone_id, **kwargs):
+    """Turn off all devices in a zone that are capable of it, as one batched command. For kwargs see device_off()
+
+    Args:
+        zone_id(str): Id of the zone, as found in the 'zones' list of devices.
+    """
+    return _bulk('zones', zone_id, capability.ON_OFF, {'isOn': False}, **kwargs)
+
+
 ### Hub modifiers ###
 
 
@@ -290,6 +557,51 @@ def autoremote(hub_id, new_state=None):
     return _getAttr(hub_id, 'autoremote', default=True, boolean=True)
 
 
+def api_path(hub_id, new_path=None):
+    """Get the API path used for matching hub_id or set a new value for it. Always returns current state at the end.
+
+    Args:
+        hub_id(str): Id of hub to query. The id is a string of hexadecimal sections used internally to represent a hub.
+        new_path(str): New versioned API path to use, e.g. '/cc/1.14'. Defaults to None when only the current value will be returned.
+
+    Returns:
+        str: API path of the hub, cozify.hub_api.apiPath unless one was negotiated or set.
+    """
+    if new_path is not None:
+        _setAttr(hub_id, 'apipath', new_path)
+    try:
+        return _getAttr(hub_id, 'apipath')
+    except AttributeError:  # never negotiated
+        return hub_api.apiPath
+
+
+def negotiate(failed=None, **kwargs):
+    """Find the API version a hub accepts and remember it in state. Called automatically when a call gets a 410 Gone.
+    Concurrent negotiations for the same hub are done once.
+
+    Args:
+        failed(str): API path that just got a 410, the search starts from it. If the stored path already differs from it, another call has negotiated meanwhile and the stored path is returned as is.
+        **hub_id(str): optional id of hub to operate on. A specified hub_id takes presedence over a hub_name or default Hub.
+        **hub_name(str): optional name of hub to operate on.
+        **remote(bool): Remote or local query.
+
+    Returns:
+        str: Working API path, or None if no candidate version was accepted.
+    """
+    _fill_kwargs(kwargs)
+    hub_id = kwargs['hub_id']
+    known = exists(hub_id)
+    with _negotiating.setdefault(hub_id, threading.Lock()):
+        current = api_path(hub_id) if known else kwargs['apipath']
+        if failed is not None and current != failed:
+            return current
+        path = hub_api.negotiate(current=failed or current, **_call_kwargs(kwargs))
+        if path is not None and known and path != current:
+            logging.info('Hub {0} now uses API path {1}'.format(hub_id, path))
+            api_path(hub_id, path)
+    return path
+
+
 ### Hub info ###
 def tz(**kwargs):
     """Get timezone of given hub or default hub if no id is specified. For more optional kwargs see cozify.hub_api.get()
@@ -305,6 +617,19 @@ def tz(**kwargs):
     return hub_api.tz(**kwargs)
 
 
+def stats(**kwargs):
+    """Get latency histograms of API calls made to a hub. Collection needs to be enabled first with cozify.metrics.enable().
+
+    Args:
+        **hub_id(str): Hub to get statistics for, by default the default hub is used.
+        **hub_name(str): Hub to get statistics for by name.
+
+    Returns:
+        dict: Map of (endpoint, path) to histogram dicts. For the histogram format see cozify.metrics.stats()
+    """
+    return metrics.stats(hub_id=_get_id(**kwargs))
+
+
 def ping(autorefresh=True, **kwargs):
     """Perform a cheap API call to trigger any potential APIError and return boolean for success/failure. For optional kwargs see cozify.hub_api.get()
 
@@ -521,6 +846,298 @@ def _fill_kwargs(kwargs):
     if 'host' not in kwargs:
         # This may end up being None if we're remote
         kwargs['host'] = host(kwargs['hub_id'])
+    if 'apipath' not in kwargs:
+        kwargs['apipath'] = api_path(kwargs['hub_id'])
+
+
+def _bulk(kind, member_id, capability_filter, changes, transition=None, **kwargs):
+    """Apply the same state changes to every capable member of a room, group or zone with one fetch and one command.
+
+    Args:
+        kind(str): 'room', 'groups' or 'zones'.
+        member_id(str): Id of the room, group or zone.
+        capability_filter(hub.capability): Capability devices need for the changes to apply.
+        changes(dict): Wanted state values. Only isOn is sent as CMD_DEVICE_ON or CMD_DEVICE_OFF, which every ON_OFF device understands whatever its state type.
+        transition(int): Optional transition length in milliseconds.
+    """
+    _fill_kwargs(kwargs)
+    devs = devices(**_unfiltered(kwargs))  # the shared index is only updated from full snapshots
+    hub_index = _shared_index(devs, **kwargs)
+    members = {'room': hub_index.room, 'groups': hub_index.group, 'zones': hub_index.zone}[kind]
+    targets = members(member_id) & hub_index.capability(capability_filter)
+    commands = []
+    switch = changes.get('isOn') if list(changes) == ['isOn'] else None
+    for device_id in sorted(targets):
+        if switch is not None:
+            command = _switch_command(device_id, devs[device_id]['state'], switch, **kwargs)
+        else:
+            command = _state_command(
+                device_id, devs[device_id]['state'], changes, transition=transition, **kwargs)
+        if command is not None:
+            commands.append(command)
+    logging.debug('Bulk {0} {1}: {2} of {3} devices need a command.'.format(
+        kind, member_id, len(commands), len(targets)))
+    return _dispatch(commands, **kwargs)
+
+
+def _state_delta(state, changes, transition=None):
+    """Build a minimal CMD_DEVICE state holding only the fields that differ from the current state plus the required type.
+
+    Args:
+        state(dict): Current device state.
+        changes(dict): Wanted state values. Fields that aren't controllable for the state type are dropped.
+        transition(int): Optional transition length in milliseconds, added as transitionMsec when something changes.
+
+    Returns:
+        dict: Delta state to send or None if the current state already matches.
+    """
+    allowed = _controllable.get(state.get('type'), frozenset())
+    delta = {}
+    for key, value in changes.items():
+        if key in allowed:
+            if key not in state or state[key] != value:
+                delta[key] = value
+        else:
+            logging.debug('Dropping non-controllable state field {0} for {1}'.format(
+                key, state.get('type')))
+    if not delta:
+        return None
+    if transition is not None:
+        delta['transitionMsec'] = transition
+    delta['type'] = state['type']
+    return delta
+
+
+def _command_state(device_id, state, changes, transition=None, **kwargs):
+    """Send only the changed state fields to a device, skipping the call altogether if nothing would change.
+
+    Args:
+        device_id(str): ID of the device to operate on.
+        state(dict): Current device state.
+        changes(dict): Wanted state values.
+        transition(int): Optional transition length in milliseconds.
+
+    Returns:
+        concurrent.futures.Future: When scheduled with a priority, otherwise None. See _dispatch()
+    """
+    command = _state_command(device_id, state, changes, transition=transition, **kwargs)
+    if command is None:
+        logging.debug('Device {0} already in wanted state, not sending command.'.format(device_id))
+        return _dispatch([], **kwargs)
+    return _dispatch(command, **kwargs)
+
+
+def _state_command(device_id, state, changes, transition=None, **kwargs):
+    """Build a CMD_DEVICE command holding only changed state fields.
+
+    Returns:
+        dict: Device command or None if nothing would change.
+    """
+    if kwargs.get('queued'):
+        # pending commands may not be reflected in the fetched state yet so nothing can be skipped
+        state = {'type': state['type']}
+    delta = _state_delta(state, changes, transition=transition)
+    if delta is None:
+        return None
+    return {'id': device_id, 'type': 'CMD_DEVICE', 'state': delta}
+
+
+def _switch_command(device_id, state, on, **kwargs):
+    """Build a CMD_DEVICE_ON or CMD_DEVICE_OFF command unless the device already is in that state.
+
+    Returns:
+        dict: Device command or None if nothing would change.
+    """
+    if not kwargs.get('queued') and state.get('isOn') is on:
+        return None
+    return {'id': device_id, 'type': 'CMD_DEVICE_ON' if on else 'CMD_DEVICE_OFF'}
+
+
+def _dispatch(commands, **kwargs):
+    """Send device commands directly as one call, via the hub's command queue or via its scheduler.
+
+    Args:
+        commands(dict): Single device command or a list of them. An empty list sends nothing.
+        **priority(cozify.scheduler.priority): If set, the commands are sent by the hub's scheduler.
+        **deadline(float): Seconds the scheduler may take to send the commands before dropping them.
+        **queued(bool): If True, the commands are sent through the hub's command queue.
+        **ack(bool): If True, watch the devices until they report the commanded state.
+        **ack_timeout(float): Seconds to wait for the devices to converge. Defaults to 10.
+
+    Returns:
+        concurrent.futures.Future: With ack, resolves to the slowest convergence latency in seconds. Otherwise the future of the scheduled commands when a priority was given, else None.
+    """
+    if isinstance(commands, dict):
+        commands = [commands]
+    watch = _ack(commands, **kwargs) if kwargs.get('ack') else None
+    try:
+        sent = _send(commands, **kwargs)
+    except Exception:
+        if watch is not None:
+            watch.cancel()
+        raise
+    if watch is None:
+        return sent
+    if sent is not None:
+        # a scheduled command may still be dropped or fail, which fails the acknowledgement as well
+        sent.add_done_callback(lambda f: f.exception() and _settle(watch, exception=f.exception()))
+    return watch
+
+
+def _send(commands, **kwargs):
+    if kwargs.get('priority') is not None:
+        if not commands:
+            future = Future()
+            future.set_result(None)
+            return future
+        return command_scheduler(**kwargs).submit(
+            commands, priority=kwargs['priority'], deadline=kwargs.get('deadline'))
+    if not commands:
+        return None
+    if kwargs.get('queued'):
+        queue = command_queue(**kwargs)
+        for command in commands:
+            queue.submit(command)
+        return None
+    hub_api.devices_command(commands, **_call_kwargs(kwargs))
+    return None
+
+
+def _ack(commands, **kwargs):
+    """Watch every commanded device for convergence and combine the watches into one future.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the slowest latency, or fails with the first failure.
+    """
+    combined = Future()
+    if not commands:
+        combined.set_result(0.0)
+        return combined
+    tracker = convergence_tracker(**kwargs)
+    timeout = kwargs.get('ack_timeout', 10.0)
+    watches = []
+    for command in commands:
+        if command['type'] == 'CMD_DEVICE_ON':
+            expected = {'isOn': True}
+        elif command['type'] == 'CMD_DEVICE_OFF':
+            expected = {'isOn': False}
+        else:
+            expected = command['state']
+        watches.append(tracker.watch(command['id'], expected, timeout=timeout))
+    remaining = [len(watches)]
+
+    def done(future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            _settle(combined, exception=future.exception())
+            return
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            _settle(combined, result=max(w.result() for w in watches))
+
+    def cancel(future):
+        if future.cancelled():
+            for w in watches:
+                w.cancel()
+
+    for w in watches:
+        w.add_done_callback(done)
+    combined.add_done_callback(cancel)
+    return combined
+
+
+def _settle(future, result=None, exception=None):
+    """Resolve a future unless something else already did.
+    """
+    if future.done():
+        return
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except Exception:  # lost a race against another callback
+        pass
+
+
+def _call_kwargs(kwargs):
+    """Return kwargs without the options only meant for choosing how commands are dispatched.
+    """
+    return {
+        k: v
+        for k, v in kwargs.items()
+        if k not in ('priority', 'deadline', 'queued', 'ack', 'ack_timeout')
+    }
+
+
+def _fetch_devices(kwargs, capabilities=None):
+    """Get the devices of a hub live, or through the snapshot cache when kwargs asks for cached or degraded reads.
+
+    Args:
+        kwargs(dict): Filled hub call arguments.
+        capabilities(cozify.hub.capability): Capability filter about to be applied, so 'capabilities' stays in any fields projection.
+    """
+    fields = kwargs.get('fields')
+    if capabilities and fields is not None and 'capabilities' not in fields:
+        fields = kwargs['fields'] = list(fields) + ['capabilities']  # needed for filtering
+    from .capabilities import registry
+    if not any(kwargs.get(k) for k in ('cached', 'max_staleness', 'latency_budget')):
+        devs = hub_api.devices(**kwargs)
+        registry().observe(devs)
+        return devs
+    from . import cache, codec
+    full = {k: v for k, v in kwargs.items() if k != 'fields'}  # only whole snapshots are stored
+    snapshot = cache.read(**full)
+    registry().observe(snapshot)
+    if fields is not None:
+        return snapshot.derive(codec.project(snapshot, fields))
+    return snapshot
+
+
+def _unfiltered(kwargs):
+    """Copy of kwargs without the filtering and projection arguments of devices().
+    """
+    return {k: v for k, v in kwargs.items() if k not in ('capabilities', 'and_filter', 'fields')}
+
+
+def _shared_index(devs, **kwargs):
+    """Update the shared index of a hub. Only for unfiltered snapshots fetched within this module.
+    """
+    from . import index
+    hub_index = _indexes.get(kwargs['hub_id'])
+    if hub_index is None:
+        hub_index = _indexes.setdefault(kwargs['hub_id'], index.DeviceIndex())
+    hub_index.update(devs)
+    return hub_index
+
+
+def _derive(source, devs):
+    """Carry the snapshot tagging of source over to devs derived from it.
+    """
+    derive = getattr(source, 'derive', None)
+    return devs if derive is None else derive(devs)
+
+
+def _capability_test(capabilities, and_filter=False):
+    """Compile a capability filter into a test for a single device.
+
+    Args:
+        capabilities(cozify.hub.capability): Single capability or name, a list of them or None.
+        and_filter(bool): Require all instead of any of the capabilities.
+
+    Returns:
+        function: Test taking a device dict, or None if there is nothing to filter by.
+    """
+    if not capabilities:
+        return None
+    if isinstance(capabilities, (capability, str)):  # single capability given
+        name = getattr(capabilities, 'name', capabilities)
+        return lambda device: name in device['capabilities']['values']
+    names = frozenset(getattr(c, 'name', c) for c in capabilities)
+    if and_filter:
+        return lambda device: names.issubset(device['capabilities']['values'])
+    return lambda device: not names.isdisjoint(device['capabilities']['values'])
 
 
 def _clean_state(state):
@@ -1,12 +1,17 @@
 """Module for all Cozify Hub API 1:1 calls
 
+Hubs drop support for older API versions when they update and answer calls to them with 410 Gone. A call
+that gets a 410 finds the version the hub accepts now with negotiate() and is retried once. Calls made
+through cozify.hub remember the negotiated path per hub in state, see cozify.hub.api_path()
+
 Attributes:
-    apiPath(str): Hub API endpoint path including version. Things may suddenly stop working if a software update increases the API version on the Hub. Incrementing this value until things work will get you by until a new version is published.
+    apiPath(str): Hub API endpoint path including version, used for hubs without a negotiated path.
 """
 
-import requests, json, logging
+import re, requests, json, logging
+from concurrent.futures import ThreadPoolExecutor
 
-from cozify import cloud_api
+from cozify import cloud_api, codec, metrics, transport
 
 from .Error import APIError
 from requests.exceptions import RequestException
@@ -18,48 +23,148 @@ def _getBase(host, port=8893):
     return 'http://{0}:{1}'.format(host, port)
 
 
-def get(call, hub_token_header=True, base=apiPath, **kwargs):
+def get(call, hub_token_header=True, base=None, **kwargs):
     """GET method for calling hub API.
 
     Args:
         call(str): API path to call after apiPath, needs to include leading /.
         hub_token_header(bool): Set to False to omit hub_token usage in call headers.
-        base(str): Base path to call from API instead of global apiPath. Defaults to apiPath.
+        base(str): Base path to call from API instead of the versioned API path. A call with a base set is never renegotiated.
+        **apipath(str): Versioned API path of the hub, e.g. '/cc/1.14'. Defaults to apiPath.
         **host(str): ip address or hostname of hub.
+        **port(int): Port of the hub API when calling locally. Defaults to 8893.
         **hub_token(str): Hub authentication token.
         **remote(bool): If call is to be local or remote (bounced via cloud).
         **cloud_token(str): Cloud authentication token. Only needed if remote = True.
     """
-    return _call(
-        method=requests.get,
-        call='{0}{1}'.format(base, call),
+    return _versioned(
+        method=transport.session.get,
+        call=call,
+        base=base,
         hub_token_header=hub_token_header,
         **kwargs)
 
 
-def put(call, payload, hub_token_header=True, base=apiPath, **kwargs):
+def put(call, payload, hub_token_header=True, base=None, **kwargs):
     """PUT method for calling hub API. For rest of kwargs parameters see get()
 
     Args:
         call(str): API path to call after apiPath, needs to include leading /.
         payload(str): json string to push out as the payload.
         hub_token_header(bool): Set to False to omit hub_token usage in call headers.
-        base(str): Base path to call from API instead of global apiPath. Defaults to apiPath.
+        base(str): Base path to call from API instead of the versioned API path. A call with a base set is never renegotiated.
     """
-    return _call(
-        method=requests.put,
-        call='{0}{1}'.format(base, call),
+    return _versioned(
+        method=transport.session.put,
+        call=call,
+        base=base,
         hub_token_header=hub_token_header,
         payload=payload,
         **kwargs)
 
 
-def _call(*, call, method, hub_token_header, payload=None, **kwargs):
+def negotiate(current=None, span=10, **kwargs):
+    """Find the API path a hub accepts by probing candidate versions concurrently.
+
+    The version the hub reports in /hub is tried first, then versions near the current one, newer first.
+
+    Args:
+        current(str): API path to search around, e.g. one that just got a 410. Defaults to apiPath.
+        span(int): Amount of minor versions to try on each side of current. Defaults to 10.
+        **kwargs: Hub call arguments, see get()
+
+    Returns:
+        str: Working API path, or None if no candidate was accepted.
+    """
+    kwargs.pop('apipath', None)
+    reported = None
+    try:
+        reported = hub(**kwargs).get('version')
+    except (APIError, RequestException) as e:
+        logging.debug('Hub did not report its version: {0}'.format(e))
+    candidates = _candidates(current or apiPath, reported, span)
+
+    def accepted(path):
+        try:
+            get('/hub/tz', base=path, **kwargs)
+        except (APIError, RequestException) as e:
+            # only a working call proves the version, a failed probe says nothing about the others
+            logging.debug('Probe of {0} failed: {1}'.format(path, e))
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=min(8, len(candidates))) as pool:
+        results = pool.map(accepted, candidates)
+        for path, ok in zip(candidates, results):
+            if ok:
+                return path
+    return None
+
+
+def _candidates(current, reported=None, span=10):
+    """List API paths to probe in order of preference.
+    """
+    match = re.match(r'^(.*/)(\d+)\.(\d+)$', current)
+    if match is None:
+        raise ValueError('Unrecognized API path: {0}'.format(current))
+    prefix, major, minor = match.group(1), int(match.group(2)), int(match.group(3))
+    out = []
+    if reported:
+        parts = str(reported).split('.')
+        if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
+            out.append('{0}{1}.{2}'.format(prefix, int(parts[0]), int(parts[1])))
+    out.append(current)
+    out.extend('{0}{1}.{2}'.format(prefix, major, minor + i) for i in range(1, span + 1))
+    out.append('{0}{1}.0'.format(prefix, major + 1))
+    out.extend(
+        '{0}{1}.{2}'.format(prefix, major, minor - i) for i in range(1, min(span, minor) + 1))
+    return [path for i, path in enumerate(out) if path not in out[:i]]
+
+
+def _versioned(*, call, base, method, hub_token_header, payload=None, **kwargs):
+    """Call a versioned API path, renegotiating the version and retrying once on 410 Gone.
+
+    Args:
+        call(str): API path after the version prefix.
+        base(str): Fixed base path, disables negotiation.
+    """
+
+    def send(path):
+        return _call(
+            call='{0}{1}'.format(path, call),
+            endpoint=call,
+            method=method,
+            hub_token_header=hub_token_header,
+            payload=payload,
+            **kwargs)
+
+    if base is not None:
+        return send(base)
+    base = kwargs.get('apipath') or apiPath
+    try:
+        return send(base)
+    except APIError as e:
+        if e.status_code != 410:
+            raise
+        failed = e
+    if kwargs.get('hub_id'):
+        from cozify import hub  # hub imports this module
+        path = hub.negotiate(failed=base, **kwargs)
+    else:
+        path = negotiate(current=base, **kwargs)
+    if path is None or path == base:
+        raise failed
+    logging.info('Hub API moved from {0} to {1}'.format(base, path))
+    return send(path)
+
+
+def _call(*, call, method, hub_token_header, payload=None, endpoint=None, **kwargs):
     """Backend for get & put
 
     Args:
         call(str): Full API path to call.
-        method(function): requests.get|put function to use for call.
+        method(function): transport.session.get|put function to use for call.
+        endpoint(str): API path without version prefix, used to label instrumentation. Defaults to call.
     """
     response = None
     headers = {}
@@ -69,29 +174,50 @@ def _call(*, call, method, hub_token_header, payload=None, **kwargs):
         headers['Authorization'] = kwargs['hub_token']
     if payload is not None:
         headers['content-type'] = 'application/json'
-
-    if kwargs['remote']:  # remote call
+    if kwargs['remote']:
         if 'cloud_token' not in kwargs:
             raise AttributeError('Asked to do remote call but no cloud_token provided.')
-        response = cloud_api.remote(apicall=call, payload=payload, **kwargs)
+    elif not kwargs['host']:
+        raise AttributeError(
+            'Local call but no hostname was provided. Either set keyword remote or host.')
+
+    # only calls that are sent get instrumented, every begin() needs a matching end()
+    instrumented = None
+    if metrics.active:
+        instrumented = metrics.begin(
+            endpoint or call,
+            hub_id=kwargs.get('hub_id'),
+            path='remote' if kwargs['remote'] else 'local')
+
+    if kwargs['remote']:  # remote call
+        try:
+            response = cloud_api.remote(apicall=call, payload=payload, **kwargs)
+        except RequestException:  # pragma: no cover
+            if instrumented is not None:
+                metrics.end(instrumented, status_code='connection failure')
+            raise
     else:  # local call
-        if not kwargs['host']:
-            raise AttributeError(
-                'Local call but no hostname was provided. Either set keyword remote or host.')
         try:
             response = method(
-                _getBase(host=kwargs['host']) + call, headers=headers, data=payload, timeout=5)
+                _getBase(host=kwargs['host'], port=kwargs.get('port', 8893)) + call,
+                headers=headers,
+                data=payload,
+                timeout=5)
         except RequestException as e:  # pragma: no cover
+            if instrumented is not None:
+                metrics.end(instrumented, status_code='connection failure')
             raise APIError('connection failure',
                            'issues connection to \'{0}\': {1}'.format(kwargs['host'], e))
 
+    if instrumented is not None:
+        metrics.end(instrumented, status_code=response.status_code, nbytes=len(response.content))
+
     # evaluate response, wether it was remote or local
     if response.status_code == 200:
-        return response.json()
+        return codec.loads(response.content)
     elif response.status_code == 410:
-        raise APIError(response.status_code,
-                       'API version outdated. Update python-cozify. %s - %s - %s' %
-                       (response.reason, response.url, response.text))  # pragma: no cover
+        raise APIError(response.status_code, 'API version outdated. %s - %s - %s' %
+                       (response.reason, response.url, response.text))
     else:
         raise APIError(response.status_code,
                        '%s - %s - %s' % (response.reason, response.url, response.text))
@@ -120,6 +246,7 @@ def devices(**kwargs):
 
     Args:
         **mock_devices(dict): If defined, returned as-is as if that were the result we received.
+        **fields(list): Optional list of top level device keys to keep, for example ['name', 'state']. Everything else is dropped right after decoding. Defaults to keeping everything.
 
     Returns:
         dict: Full live device state as returned by the API
@@ -127,7 +254,10 @@ def devices(**kwargs):
     if 'mock_devices' in kwargs:
         return kwargs['mock_devices']
 
-    return get('/devices', **kwargs)
+    devs = get('/devices', **kwargs)
+    if kwargs.get('fields') is not None:
+        devs = codec.project(devs, kwargs['fields'])
+    return devs
 
 
 def devices_command(command, **kwargs):
@@ -0,0 +1,146 @@
+"""Module for indexing devices by room, group, zone and capability.
+
+A DeviceIndex is built from a devices snapshot and kept up to date incrementally: only devices whose
+memberships changed between snapshots are re-indexed. Updates and lookups take a lock, so one index
+can be shared between threads.
+"""
+
+import collections, threading
+
+_kinds = ('room', 'groups', 'zones', 'capabilities')
+
+
+class DeviceIndex():
+    """Map of room, group, zone and capability ids to the ids of their member devices.
+
+    Args:
+        devs(dict): Optional devices dict to build the index from, raw dicts or cozify.device.Device objects.
+    """
+
+    def __init__(self, devs=None):
+        self._by = {
+            'room': collections.defaultdict(set),
+            'groups': collections.defaultdict(set),
+            'zones': collections.defaultdict(set),
+            'capabilities': collections.defaultdict(set)
+        }
+        self._members = {}
+        self._lock = threading.Lock()
+        if devs is not None:
+            self.update(devs)
+
+    def update(self, devs):
+        """Bring the index up to date with a new snapshot.
+
+        Args:
+            devs(dict): Full devices dict, devices missing from it are removed from the index.
+
+        Returns:
+            int: Amount of devices whose index entries changed.
+        """
+        memberships = [(device_id, _membership(device)) for device_id, device in devs.items()]
+        changed = 0
+        with self._lock:
+            for device_id in [i for i in self._members if i not in devs]:
+                self._remove(device_id)
+                changed += 1
+            for device_id, membership in memberships:
+                if self._members.get(device_id) != membership:
+                    self._remove(device_id)
+                    self._add(device_id, membership)
+                    changed += 1
+        return changed
+
+    def room(self, room_id):
+        """frozenset: Ids of devices in a room.
+        """
+        return self._get('room', room_id)
+
+    def group(self, group_id):
+        """frozenset: Ids of devices in a group.
+        """
+        return self._get('groups', group_id)
+
+    def zone(self, zone_id):
+        """frozenset: Ids of devices in a zone.
+        """
+        return self._get('zones', zone_id)
+
+    def capability(self, capability):
+        """Ids of devices reporting a capability.
+
+        Args:
+            capability(cozify.hub.capability): Capability or capability name.
+
+        Returns:
+            frozenset: Matching device ids.
+        """
+        return self._get('capabilities', getattr(capability, 'name', capability))
+
+    def rooms(self):
+        """list: All known room ids.
+        """
+        with self._lock:
+            return list(self._by['room'].keys())
+
+    def groups(self):
+        """list: All known group ids.
+        """
+        with self._lock:
+            return list(self._by['groups'].keys())
+
+    def zones(self):
+        """list: All known zone ids.
+        """
+        with self._lock:
+            return list(self._by['zones'].keys())
+
+    def __contains__(self, device_id):
+        return device_id in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def _get(self, kind, key):
+        with self._lock:
+            return frozenset(self._by[kind].get(key, ()))
+
+    def _add(self, device_id, membership):
+        self._members[device_id] = membership
+        for kind, ids in zip(_kinds, membership):
+            for i in ids:
+                self._by[kind][i].add(device_id)
+
+    def _remove(self, device_id):
+        membership = self._members.pop(device_id, None)
+        if membership is None:
+            return
+        for kind, ids in zip(_kinds, membership):
+            for i in ids:
+                members = self._by[kind][i]
+                members.discard(device_id)
+                if not members:
+                    del self._by[kind][i]
+
+
+def complete(devs):
+    """Check that a devices dict carries everything the index is built from.
+
+    Args:
+        devs(dict): Devices dict, raw dicts or cozify.device.Device objects.
+
+    Returns:
+        bool: False if any raw device lacks room, groups, zones or capabilities, e.g. after a fields projection.
+    """
+    return all(not isinstance(device, dict) or all(kind in device for kind in _kinds)
+               for device in devs.values())
+
+
+def _membership(device):
+    """Get (room, groups, zones, capabilities) id tuples of a raw device dict or a Device.
+    """
+    if isinstance(device, dict):
+        return (tuple(device.get('room') or ()), tuple(device.get('groups') or ()),
+                tuple(device.get('zones') or ()),
+                tuple((device.get('capabilities') or {}).get('values', ())))
+    return (device.room, device.groups, device.zones, device.capabilities)
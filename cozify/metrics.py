@@ -0,0 +1,180 @@
+"""Module for instrumenting hub and cloud API calls.
+
+Every call made through cozify.hub_api and cozify.cloud_api can be observed with start & end hooks
+and summarized into per endpoint latency histograms. Instrumentation is off by default and costs a
+single attribute check per call while off.
+
+Attributes:
+    active(bool): True when any hooks are registered or histogram collection is enabled. Read-only, use enable() and add_hook() to change.
+    buckets(tuple): Upper bounds in seconds of the latency histogram buckets.
+"""
+
+import threading, time
+
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+active = False
+_collect = False
+_start_hooks = []
+_end_hooks = []
+_histograms = {}
+_lock = threading.Lock()
+
+
+def enable(collect=True):
+    """Enable or disable collection of latency histograms.
+
+    Args:
+        collect(bool): True to collect histograms, False to stop collecting. Already collected data is kept. Defaults to True.
+    """
+    global _collect
+    _collect = collect
+    _update_active()
+
+
+def add_hook(start=None, end=None):
+    """Register callables to be called at the start and/or end of every API call.
+
+    Both receive the same call dict. At start it contains 'endpoint', 'hub_id', 'path' (local, remote or cloud) and 'start'.
+    At end 'status_code', 'bytes' and 'duration' (seconds) have been added. Hooks are called synchronously in the calling thread.
+
+    Args:
+        start(function): Callable taking the call dict, called before the request is sent.
+        end(function): Callable taking the call dict, called after the response is received or the call failed.
+    """
+    if start is not None:
+        _start_hooks.append(start)
+    if end is not None:
+        _end_hooks.append(end)
+    _update_active()
+
+
+def remove_hook(start=None, end=None):
+    """Unregister hooks previously registered with add_hook().
+    """
+    if start is not None:
+        _start_hooks.remove(start)
+    if end is not None:
+        _end_hooks.remove(end)
+    _update_active()
+
+
+def begin(endpoint, hub_id=None, path='local'):
+    """Mark the start of an API call. Only meant to be called by the API modules when active is True.
+
+    Args:
+        endpoint(str): API endpoint without version prefix, e.g. '/devices' or 'user/hubkeys'.
+        hub_id(str): Id of the hub the call concerns, None for pure cloud calls.
+        path(str): 'local', 'remote' or 'cloud'.
+
+    Returns:
+        dict: Call dict to pass to end().
+    """
+    call = {'endpoint': endpoint, 'hub_id': hub_id, 'path': path, 'start': time.perf_counter()}
+    for hook in _start_hooks:
+        hook(call)
+    return call
+
+
+def end(call, status_code=None, nbytes=0):
+    """Mark the end of an API call started with begin().
+
+    Args:
+        call(dict): Call dict returned by begin().
+        status_code(int): HTTP status code or None if no response was received.
+        nbytes(int): Size of the response body in bytes.
+    """
+    call['duration'] = time.perf_counter() - call['start']
+    call['status_code'] = status_code
+    call['bytes'] = nbytes
+    if _collect:
+        _observe(call)
+    for hook in _end_hooks:
+        hook(call)
+
+
+def stats(hub_id=None):
+    """Get a copy of collected latency histograms.
+
+    Args:
+        hub_id(str): Only return histograms of calls concerning this hub. Defaults to returning all calls.
+
+    Returns:
+        dict: Map of (hub_id, endpoint, path) to histogram dicts with keys 'count', 'sum', 'min', 'max', 'bytes', 'status' (map of status code to count) and 'buckets' (list of (upper bound, cumulative count) pairs). When hub_id is given the keys are (endpoint, path) instead.
+    """
+    out = {}
+    with _lock:
+        for key, hist in _histograms.items():
+            if hub_id is not None and key[0] != hub_id:
+                continue
+            cumulative = []
+            total = 0
+            for bound, count in zip(buckets, hist['buckets']):
+                total += count
+                cumulative.append((bound, total))
+            value = dict(hist, status=dict(hist['status']), buckets=cumulative)
+            out[key if hub_id is None else key[1:]] = value
+    return out
+
+
+def reset():
+    """Throw away all collected histograms.
+    """
+    with _lock:
+        _histograms.clear()
+
+
+def prometheus():
+    """Render collected histograms in the Prometheus text exposition format.
+
+    Returns:
+        str: Metrics text, suitable as the body of a /metrics HTTP response.
+    """
+    name = 'cozify_api_call_duration_seconds'
+    lines = [
+        '# HELP {0} Latency of hub and cloud API calls.'.format(name),
+        '# TYPE {0} histogram'.format(name)
+    ]
+    for (hub_id, endpoint, path), hist in sorted(stats().items(), key=lambda i: str(i[0])):
+        labels = 'hub_id="{0}",endpoint="{1}",path="{2}"'.format(hub_id or '', endpoint, path)
+        for bound, count in hist['buckets']:
+            lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(name, labels, bound, count))
+        lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(name, labels, hist['count']))
+        lines.append('{0}_sum{{{1}}} {2}'.format(name, labels, hist['sum']))
+        lines.append('{0}_count{{{1}}} {2}'.format(name, labels, hist['count']))
+    return '\n'.join(lines) + '\n'
+
+
+def _observe(call):
+    """Add a finished call to its histogram.
+    """
+    key = (call['hub_id'], call['endpoint'], call['path'])
+    duration = call['duration']
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = {
+                'count': 0,
+                'sum': 0.0,
+                'min': duration,
+                'max': duration,
+                'bytes': 0,
+                'status': {},
+                'buckets': [0] * len(buckets)
+            }
+            _histograms[key] = hist
+        hist['count'] += 1
+        hist['sum'] += duration
+        hist['min'] = min(hist['min'], duration)
+        hist['max'] = max(hist['max'], duration)
+        hist['bytes'] += call['bytes']
+        hist['status'][call['status_code']] = hist['status'].get(call['status_code'], 0) + 1
+        for i, bound in enumerate(buckets):
+            if duration <= bound:
+                hist['buckets'][i] += 1
+                break
+
+
+def _update_active():
+    global active
+    active = bool(_collect or _start_hooks or _end_hooks)
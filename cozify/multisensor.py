@@ -5,7 +5,7 @@ from . import config
 
 # expects Cozify devices type json data
 def getMultisensorData(data):  # pragma: no cover
-    """Deprecated, will be removed in v0.3
+    """Deprecated, will be removed in v0.3. To keep a history of sensor readings see cozify.timeseries.
     """
     out = []
     for device in data:
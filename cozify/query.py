@@ -0,0 +1,246 @@
+"""Module for querying devices with composable predicates.
+
+Predicates are built once from small constructors and combined with & (and), | (or) and ~ (not). The
+result is a single compiled test that can be run over any amount of snapshots. When a DeviceIndex is
+available, capability and room conditions narrow down the candidates before any device is looked at.
+Results are generated lazily as (id, device) pairs without copying the devices.
+
+Example:
+    bright = capability(hub.capability.BRIGHTNESS) & state('isOn') & (state('brightness') > 0.5)
+    cold = capability(hub.capability.TEMPERATURE) & (state('temperature') < 18)
+    for device_id, device in select(bright & state('reachable'), devs):
+        ...
+
+Comparisons bind looser than &, so they need to be parenthesized when combined.
+"""
+
+import operator
+
+
+class Predicate():
+    """Compiled device test. Combine with &, | and ~.
+
+    Args:
+        test(function): Callable taking a raw device dict or a cozify.device.Device and returning a bool.
+        candidates(function): Optional callable taking a cozify.index.DeviceIndex and returning the ids of all devices that can match, or None if the index can't narrow it down.
+        description(str): Human readable form of the predicate.
+    """
+
+    __slots__ = ('test', 'candidates', 'description')
+
+    def __init__(self, test, candidates=None, description='predicate'):
+        self.test = test
+        self.candidates = candidates or (lambda index: None)
+        self.description = description
+
+    def __call__(self, device):
+        return self.test(device)
+
+    def __and__(self, other):
+        a, b = self.test, other.test
+        ca, cb = self.candidates, other.candidates
+
+        def candidates(index):
+            left, right = ca(index), cb(index)
+            if left is None:
+                return right
+            if right is None:
+                return left
+            return left & right
+
+        return Predicate(lambda d: a(d) and b(d), candidates,
+                         '({0} & {1})'.format(self.description, other.description))
+
+    def __or__(self, other):
+        a, b = self.test, other.test
+        ca, cb = self.candidates, other.candidates
+
+        def candidates(index):
+            left, right = ca(index), cb(index)
+            if left is None or right is None:
+                return None
+            return left | right
+
+        return Predicate(lambda d: a(d) or b(d), candidates,
+                         '({0} | {1})'.format(self.description, other.description))
+
+    def __invert__(self):
+        a = self.test
+        return Predicate(lambda d: not a(d), None, '~{0}'.format(self.description))
+
+    def __repr__(self):
+        return 'Predicate({0})'.format(self.description)
+
+
+class Field():
+    """State field of a device, compared with the usual operators to build a Predicate.
+    Devices without the field never match a comparison.
+
+    Args:
+        key(str): State key, e.g. 'brightness'.
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def _compare(self, op, symbol, value):
+        key = self.key
+
+        def test(device):
+            current = _state_value(device, key)
+            if current is None:
+                return False
+            try:
+                return op(current, value)
+            except TypeError:  # e.g. None or a string compared to a number
+                return False
+
+        return Predicate(test, None, '{0} {1} {2!r}'.format(key, symbol, value))
+
+    def __eq__(self, value):
+        return self._compare(operator.eq, '==', value)
+
+    def __ne__(self, value):
+        return self._compare(operator.ne, '!=', value)
+
+    def __lt__(self, value):
+        return self._compare(operator.lt, '<', value)
+
+    def __le__(self, value):
+        return self._compare(operator.le, '<=', value)
+
+    def __gt__(self, value):
+        return self._compare(operator.gt, '>', value)
+
+    def __ge__(self, value):
+        return self._compare(operator.ge, '>=', value)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def exists(self):
+        """Predicate: Devices that report this state field at all.
+        """
+        key = self.key
+        return Predicate(lambda d: _state_value(d, key) is not None, None,
+                         '{0} exists'.format(key))
+
+
+def state(key):
+    """Refer to a state field to compare, e.g. state('brightness') > 0.5. Used alone as a predicate it tests for truthiness.
+
+    Args:
+        key(str): State key.
+
+    Returns:
+        Field: Comparable field.
+    """
+    return _TruthyField(key)
+
+
+class _TruthyField(Field, Predicate):
+    """Field that also works directly as a predicate, so state('reachable') can be combined as is.
+    """
+
+    def __init__(self, key):
+        Field.__init__(self, key)
+        Predicate.__init__(self, lambda d: bool(_state_value(d, key)), None, key)
+
+
+def capability(*capabilities):
+    """Devices having all of the given capabilities.
+
+    Args:
+        *capabilities(cozify.hub.capability): Capabilities or capability names.
+
+    Returns:
+        Predicate: Compiled predicate.
+    """
+    names = frozenset(getattr(c, 'name', c) for c in capabilities)
+
+    def test(device):
+        return names.issubset(_capabilities(device))
+
+    def candidates(index):
+        out = None
+        for name in names:
+            ids = index.capability(name)
+            out = ids if out is None else out & ids
+        return out
+
+    return Predicate(test, candidates, 'capability({0})'.format(','.join(sorted(names))))
+
+
+def room(room_id):
+    """Devices in a room.
+
+    Args:
+        room_id(str): Id of the room.
+
+    Returns:
+        Predicate: Compiled predicate.
+    """
+    return Predicate(lambda d: room_id in _rooms(d), lambda index: index.room(room_id),
+                     'room({0})'.format(room_id))
+
+
+def device_type(type_name):
+    """Devices of a type such as 'LIGHT' or 'POWER_SOCKET'.
+
+    Returns:
+        Predicate: Compiled predicate.
+    """
+    return Predicate(lambda d: d.get('type') == type_name, None, 'type({0})'.format(type_name))
+
+
+def manufacturer(name):
+    """Devices from a manufacturer, e.g. 'OSRAM'. The comparison is case insensitive.
+
+    Returns:
+        Predicate: Compiled predicate.
+    """
+    name = name.lower()
+    return Predicate(lambda d: (d.get('manufacturer') or '').lower() == name, None,
+                     'manufacturer({0})'.format(name))
+
+
+def select(predicate, devs, index=None):
+    """Lazily find the devices matching a predicate.
+
+    Args:
+        predicate(Predicate): Compiled predicate.
+        devs(dict): Devices dict, raw dicts or cozify.device.Device objects.
+        index(cozify.index.DeviceIndex): Optional index matching devs, used to skip devices that can't match.
+
+    Yields:
+        tuple: (id, device) pairs of matching devices. The devices are not copied.
+    """
+    test = predicate.test
+    candidates = predicate.candidates(index) if index is not None else None
+    if candidates is None:
+        for device_id, device in devs.items():
+            if test(device):
+                yield device_id, device
+        return
+    for device_id in candidates:
+        device = devs.get(device_id)
+        if device is not None and test(device):
+            yield device_id, device
+
+
+def _state_value(device, key):
+    if isinstance(device, dict):
+        return device['state'].get(key)
+    return device.get_state(key)
+
+
+def _rooms(device):
+    if isinstance(device, dict):
+        return device.get('room') or ()
+    return device.room
+
+
+def _capabilities(device):
+    if isinstance(device, dict):
+        return (device.get('capabilities') or {}).get('values', ())
+    return device.capabilities
@@ -0,0 +1,233 @@
+"""Module for capturing and restoring the controllable state of many devices at once.
+
+A scene is a dict of device id to the controllable part of that device's state. Capturing takes a
+single /devices fetch and applying a scene takes one fetch plus at most one batched command that only
+carries the fields which differ from the current state.
+
+Example:
+    evening = scene.capture(capabilities=hub.capability.CONTROL_LIGHT)
+    scene.save(evening, 'evening.scene')
+    scene.apply(scene.load('evening.scene'))
+"""
+
+import collections, os, threading, time
+from absl import logging
+
+from . import codec, hub, hub_api
+
+format_version = 1
+
+
+def capture(device_ids=None, capabilities=None, devs=None, **kwargs):
+    """Capture the controllable state of devices.
+
+    Args:
+        device_ids(list): Ids of devices to include. Defaults to every device matching capabilities.
+        capabilities(cozify.hub.capability): Optional capability filter, see hub.devices(). Defaults to all devices.
+        devs(dict): Optional devices dictionary to capture from. If not defined, will be retrieved live.
+
+    Returns:
+        dict: Scene, a map of device id to controllable state.
+    """
+    if devs is None:
+        devs = hub.devices(capabilities=capabilities, **kwargs)
+    if device_ids is None:
+        device_ids = devs.keys()
+    out = {}
+    for device_id in device_ids:
+        if device_id not in devs:
+            logging.warning('Device {0} not found, not captured into scene.'.format(device_id))
+            continue
+        state = controllable(devs[device_id]['state'])
+        if state is None:
+            logging.debug('Device {0} has nothing controllable, not captured into scene.'.format(
+                device_id))
+            continue
+        out[device_id] = state
+    return out
+
+
+def controllable(state):
+    """Reduce a device state to the fields that can be set with a command.
+
+    Args:
+        state(dict): Device state.
+
+    Returns:
+        dict: New dict with the controllable fields and the state type or None if the state type has no controllable fields, sensors for example.
+    """
+    allowed = hub._controllable.get(state.get('type'))
+    if allowed is None:
+        return None
+    out = {k: v for k, v in state.items() if k != 'transitionMsec' and k in allowed}
+    out['type'] = state.get('type')
+    return out
+
+
+def diff(scene, devs, transition=None):
+    """Compute the commands needed to bring devices from their current state to a scene.
+
+    Args:
+        scene(dict): Scene to reach.
+        devs(dict): Current devices dictionary.
+        transition(int): Optional transition length in milliseconds for every command.
+
+    Returns:
+        list: Device commands holding only differing fields. Devices already in the scene state get no command.
+    """
+    commands = []
+    for device_id, state in scene.items():
+        if device_id not in devs:
+            logging.warning('Scene device {0} no longer exists, skipping.'.format(device_id))
+            continue
+        command = hub._state_command(
+            device_id,
+            devs[device_id]['state'],
+            {k: v
+             for k, v in state.items() if k != 'type'},
+            transition=transition)
+        if command is not None:
+            commands.append(command)
+    return commands
+
+
+def apply(scene, transition=None, devs=None, **kwargs):
+    """Restore a scene with one devices fetch and a single batched command of the differences.
+
+    Args:
+        scene(dict): Scene to restore.
+        transition(int): Optional transition length in milliseconds.
+        devs(dict): Optional devices dictionary to diff against. If not defined, will be retrieved live.
+        **queued(bool): Send through the hub's command queue, see cozify.commands.
+        **priority(cozify.scheduler.priority): Send through the hub's scheduler and return a Future.
+
+    Returns:
+        concurrent.futures.Future: When sent with a priority, otherwise None.
+    """
+    hub._fill_kwargs(kwargs)
+    if devs is None:
+        devs = hub.devices(**kwargs)
+    commands = diff(scene, devs, transition=transition)
+    logging.debug('Scene of {0} devices needs {1} commands.'.format(len(scene), len(commands)))
+    return hub._dispatch(commands, **kwargs)
+
+
+def commit(targets, transition=None, batch=True, devs=None, concurrency=8, **kwargs):
+    """Apply prepared state changes to many devices with as little skew between them as possible.
+
+    All commands are built and serialized before anything is sent. By default they go out as one batched
+    call. With batch=False every command is a call of its own, sent by up to concurrency threads that are
+    released at once by a barrier, which is useful when the hub applies batched commands sequentially.
+
+    Args:
+        targets(dict): Map of device id to wanted state changes, e.g. {id: {'colorMode': 'hs', 'hue': 1.2, 'saturation': 1.0}}
+        transition(int): Optional transition length in milliseconds for every device.
+        batch(bool): Send a single batched call instead of parallel calls. Defaults to True.
+        devs(dict): Optional devices dictionary to diff against. If not defined, will be retrieved live.
+        concurrency(int): With batch=False, maximum amount of calls in flight at once. Defaults to 8.
+
+    Returns:
+        dict: Report with 'commands' (amount sent), 'batch', 'spread' (seconds between the first and last call starting, None for a batch since the hub applies it) and 'duration' (seconds until the last reply).
+    """
+    hub._fill_kwargs(kwargs)
+    if devs is None:
+        devs = hub.devices(**kwargs)
+    commands = diff(targets, devs, transition=transition)
+    call_kwargs = hub._call_kwargs(kwargs)
+    if batch:
+        payloads = [codec.dumps(commands)] if commands else []
+    else:
+        payloads = [codec.dumps([c]) for c in commands]
+    report = {
+        'commands': len(commands),
+        'batch': batch,
+        'spread': None if batch else 0.0,
+        'duration': 0.0
+    }
+    if not payloads:
+        return report
+
+    workers = min(len(payloads), max(1, concurrency))
+    barrier = threading.Barrier(workers)
+    remaining = collections.deque(range(len(payloads)))
+    starts = [None] * len(payloads)
+    ends = [None] * len(payloads)
+    errors = []
+
+    def send():
+        barrier.wait()
+        while True:
+            try:
+                i = remaining.popleft()
+            except IndexError:
+                return
+            starts[i] = time.perf_counter()
+            try:
+                hub_api.put('/devices/command', payloads[i], **call_kwargs)
+            except Exception as e:
+                errors.append(e)
+            ends[i] = time.perf_counter()
+
+    if workers == 1:
+        send()
+    else:
+        threads = [threading.Thread(target=send) for i in range(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    if not batch:
+        report['spread'] = max(starts) - min(starts)
+    report['duration'] = max(ends) - min(starts)
+    logging.debug('Committed {0} commands in {1:.4f}s'.format(len(commands), report['duration']))
+    if errors:
+        raise errors[0]
+    return report
+
+
+def save(scene, path):
+    """Store a scene on disk. States sharing a type share their key list so only values are stored per device.
+
+    Args:
+        scene(dict): Scene to store.
+        path(str): File to write.
+    """
+    schemas = {}
+    rows = {}
+    for device_id, state in scene.items():
+        keys = sorted(k for k in state if k != 'type')
+        schema_id = schemas.setdefault((state.get('type'), tuple(keys)), len(schemas))
+        rows[device_id] = [schema_id] + [state[k] for k in keys]
+    doc = {
+        'version': format_version,
+        'schemas': [[state_type] + list(keys) for (state_type, keys), i in sorted(
+            schemas.items(), key=lambda s: s[1])],
+        'devices': rows
+    }
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(codec.dumps(doc))
+    os.replace(tmp, path)
+
+
+def load(path):
+    """Read a scene stored with save().
+
+    Args:
+        path(str): File to read.
+
+    Returns:
+        dict: Scene.
+    """
+    with open(path, 'rb') as f:
+        doc = codec.loads(f.read())
+    if doc.get('version') != format_version:
+        raise ValueError('Unsupported scene format version: {0}'.format(doc.get('version')))
+    schemas = doc['schemas']
+    out = {}
+    for device_id, row in doc['devices'].items():
+        schema = schemas[row[0]]
+        state = dict(zip(schema[1:], row[1:]))
+        state['type'] = schema[0]
+        out[device_id] = state
+    return out
@@ -0,0 +1,148 @@
+"""Module for prioritised sending of device commands with deadlines.
+
+A Scheduler sends commands to a hub from a bounded amount of worker threads, always picking the most
+urgent command first. Commands that can no longer be sent before their deadline are dropped instead of
+being sent late. Every submitted command gets a concurrent.futures.Future to wait on.
+
+The high-level helpers in cozify.hub use the scheduler when given a priority, for example:
+    future = hub.device_off(socket_id, priority=scheduler.priority.SAFETY, deadline=2.0)
+    future.result()
+
+Attributes:
+    priority(priority): Enum of priority classes, most urgent first: SAFETY, HIGH, NORMAL, LOW.
+"""
+
+import collections, heapq, itertools, threading, time
+from concurrent.futures import Future
+from enum import Enum
+from absl import logging
+
+from . import hub_api
+from .Error import DeadlineError
+
+priority = Enum('priority', 'SAFETY HIGH NORMAL LOW')
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+class Scheduler():
+    """Priority scheduler for commands to a single hub.
+
+    Args:
+        concurrency(int): Maximum amount of calls in flight to the hub at once. Defaults to 2.
+        send(function): Callable taking a list of commands and **kwargs. Defaults to cozify.hub_api.devices_command.
+        **kwargs: Hub call arguments passed on to send, see cozify.hub_api.put()
+
+    Attributes:
+        counters(dict): Amount of commands 'submitted', 'sent', 'failed', 'expired' and 'cancelled'.
+    """
+
+    def __init__(self, concurrency=2, send=None, **kwargs):
+        self.concurrency = concurrency
+        self.kwargs = kwargs
+        self.counters = collections.Counter(submitted=0, sent=0, failed=0, expired=0, cancelled=0)
+        self._send = send or hub_api.devices_command
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._closed = False
+
+    def submit(self, commands, priority=priority.NORMAL, deadline=None):
+        """Schedule one or more commands to be sent in a single call.
+
+        Args:
+            commands(dict): Single device command or a list of them.
+            priority(cozify.scheduler.priority): Priority class. Defaults to NORMAL.
+            deadline(float): Seconds from now after which the command is dropped if it hasn't been sent yet. Defaults to no deadline.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the API reply, or raises the APIError of a failed call or a DeadlineError.
+        """
+        if isinstance(commands, dict):
+            commands = [commands]
+        future = Future()
+        expires = None if deadline is None else time.monotonic() + deadline
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Scheduler is closed.')
+            self.counters['submitted'] += 1
+            heapq.heappush(self._heap, (priority.value, next(self._seq), expires, commands, future))
+            self._start()
+            self._cond.notify()
+        return future
+
+    def pending(self):
+        """Amount of submissions waiting for a free worker.
+        """
+        with self._cond:
+            return len(self._heap)
+
+    def close(self):
+        """Stop the workers once everything already submitted has been handled.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def _start(self):
+        if len(self._workers) < self.concurrency:
+            worker = threading.Thread(target=self._run, name='cozify-scheduler', daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                prio, seq, expires, commands, future = heapq.heappop(self._heap)
+            if not future.set_running_or_notify_cancel():
+                self._count('cancelled')
+                continue
+            if expires is not None and time.monotonic() > expires:
+                logging.warning('Dropping expired {0} command for {1}'.format(
+                    priority(prio).name, [c['id'] for c in commands]))
+                self._count('expired')
+                future.set_exception(
+                    DeadlineError('Deadline passed before the command could be sent.'))
+                continue
+            try:
+                result = self._send(commands, **self.kwargs)
+            except Exception as e:
+                self._count('failed')
+                future.set_exception(e)
+            else:
+                self._count('sent')
+                future.set_result(result)
+
+    def _count(self, counter):
+        with self._cond:
+            self.counters[counter] += 1
+
+
+def scheduler(hub_id, concurrency=None, **kwargs):
+    """Get the command scheduler of a hub, creating it on first use or after it was closed.
+
+    Args:
+        hub_id(str): Id of the hub the scheduler sends to.
+        concurrency(int): Maximum calls in flight, updates an existing scheduler if given.
+        **kwargs: Hub call arguments, see cozify.hub_api.put(). If given they replace those of an existing scheduler, so the next call goes out with current tokens and host.
+
+    Returns:
+        Scheduler: The hub's scheduler.
+    """
+    with _schedulers_lock:
+        s = _schedulers.get(hub_id)
+        if s is None or s._closed:
+            s = _schedulers[hub_id] = Scheduler(hub_id=hub_id, **kwargs)
+        elif kwargs:
+            s.kwargs = dict(kwargs, hub_id=hub_id)
+    if concurrency is not None:
+        s.concurrency = concurrency
+    return s
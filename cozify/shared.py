@@ -0,0 +1,248 @@
+"""Module for sharing the latest devices snapshot between processes on the same host.
+
+One process polls the hub and publishes each snapshot, plus the sensor readings in it, into a
+memory-mapped file. Any number of other processes attach to the file and read the latest state without
+touching the network, so the hub only sees one poller no matter how many readers there are.
+
+Readers never take a lock. The publisher bumps a sequence counter to an odd value before writing and to
+the next even value after, and a reader retries whenever the counter was odd or changed while it copied
+the data out (a seqlock). Recent sensor readings are kept in a fixed size ring so readers can follow
+them with a cursor.
+
+Reads are not zero-copy. A reader has to copy the bytes out of the map before it can tell that no write
+overlapped, and the snapshot is then decoded into new dicts. What is saved is the hub round trip, not
+the decoding.
+
+A publisher always starts a new file and moves it into place, so subscribers attached to the file of
+a previous publisher keep reading its last snapshot until they reopen the path.
+
+Example:
+    # poller process
+    shared.serve(interval=5)
+    # any other process
+    with shared.Subscriber(shared.path(hub_id)) as sub:
+        devs = sub.devices()
+        readings, cursor = sub.readings()
+
+Attributes:
+    magic(bytes): File signature.
+    version(int): Layout version.
+"""
+
+import mmap, os, struct, time
+from absl import logging
+
+from . import codec, config, hub, hub_api, timeseries
+from .cache import Snapshot
+
+magic = b'CZSH'
+version = 1
+
+# magic, version, sequence, snapshot bytes, snapshot time, snapshot capacity, ring slots, readings written
+_header = struct.Struct('<4sIQIdIIQ')
+_sequence = struct.Struct('<Q')
+_slot = struct.Struct('<qd48s16s')  # time, value, device id, metric
+_sequence_offset = 8
+
+
+def path(hub_id):
+    """File path of a hub's shared buffer, derived from the state file path.
+
+    Args:
+        hub_id(str): Id of the hub.
+    """
+    return '{0}-{1}.shm'.format(os.path.splitext(config.state_file)[0], hub_id)
+
+
+class Publisher():
+    """Writer side of a shared buffer. Only one publisher per file may exist at a time.
+
+    Args:
+        path(str): File to publish into, replaced with a new one.
+        capacity(int): Bytes reserved for the encoded snapshot. Defaults to 4 MiB.
+        ring(int): Amount of recent sensor readings kept. Defaults to 4096.
+    """
+
+    def __init__(self, path, capacity=4 * 1024 * 1024, ring=4096):
+        self.path = path
+        self.capacity = capacity
+        self.ring = ring
+        self._sequence = 0
+        self._written = 0
+        self._last = {}
+        size = _header.size + capacity + ring * _slot.size
+        # truncating a file other processes have mapped would crash them with SIGBUS on access,
+        # so the new file gets its full size before it replaces the old one
+        temp = '{0}.{1}.tmp'.format(path, os.getpid())
+        self._file = open(temp, 'w+b')
+        try:
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+            self._write_header(0, 0.0)
+            os.replace(temp, path)
+        except Exception:
+            self._file.close()
+            os.remove(temp)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def publish(self, devs, now=None):
+        """Publish a devices snapshot and append its new sensor readings to the ring.
+
+        Args:
+            devs(dict): Full devices dict.
+            now(float): Epoch time of the snapshot in seconds. Defaults to the current time.
+
+        Returns:
+            int: Amount of new readings appended.
+        """
+        if now is None:
+            now = time.time()
+        data = codec.dumps(devs)
+        if len(data) > self.capacity:
+            raise ValueError('Snapshot of {0} bytes does not fit the {1} byte buffer.'.format(
+                len(data), self.capacity))
+        readings = list(self._readings(devs, now))
+        self._begin()
+        self._map[_header.size:_header.size + len(data)] = data
+        base = _header.size + self.capacity
+        for reading in readings:
+            _slot.pack_into(self._map, base + (self._written % self.ring) * _slot.size, *reading)
+            self._written += 1
+        self._write_header(len(data), now)
+        self._end()
+        return len(readings)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _readings(self, devs, now):
+        fallback = int(now * 1000)
+        for device_id, device in devs.items():
+            timestamp = device['state'].get('lastSeen')
+            if timestamp is None:
+                timestamp = fallback
+            for metric, value in timeseries.readings(device):
+                if self._last.get((device_id, metric)) == timestamp:
+                    continue
+                self._last[(device_id, metric)] = timestamp
+                yield (timestamp, float(value), device_id.encode('utf-8'), metric.encode('utf-8'))
+
+    def _begin(self):
+        self._sequence += 1  # odd: write in progress
+        _sequence.pack_into(self._map, _sequence_offset, self._sequence)
+
+    def _end(self):
+        self._sequence += 1
+        _sequence.pack_into(self._map, _sequence_offset, self._sequence)
+
+    def _write_header(self, length, timestamp):
+        _header.pack_into(self._map, 0, magic, version, self._sequence, length, timestamp,
+                          self.capacity, self.ring, self._written)
+
+
+class Subscriber():
+    """Reader side of a shared buffer.
+
+    Args:
+        path(str): File a Publisher writes into.
+        retries(int): Attempts at a consistent read before giving up. Defaults to 1000.
+    """
+
+    def __init__(self, path, retries=1000):
+        self.path = path
+        self.retries = retries
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _header.unpack_from(self._map, 0)
+        if header[0] != magic or header[1] != version:
+            self.close()
+            raise ValueError('Not a shared device buffer or unsupported version: {0}'.format(path))
+        self._capacity, self._ring = header[5], header[6]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def devices(self):
+        """Get the latest published snapshot.
+
+        Returns:
+            cozify.cache.Snapshot: Devices tagged with the time they were published, or None if nothing was published yet.
+        """
+        header, data = self._read(lambda header: self._map[_header.size:_header.size + header[3]])
+        if header[4] == 0.0:
+            return None
+        return Snapshot(codec.loads(data), header[4])
+
+    def readings(self, since=0):
+        """Get sensor readings published after a cursor.
+
+        Args:
+            since(int): Cursor returned by a previous call. Defaults to everything still in the ring.
+
+        Returns:
+            tuple: (list of (device_id, metric, time, value) tuples, new cursor). Readings that fell out of the ring before being read are skipped.
+        """
+        base = _header.size + self._capacity
+
+        def copy(header):
+            written = header[7]
+            first = max(since, written - self._ring)
+            return [
+                _slot.unpack_from(self._map, base + (i % self._ring) * _slot.size)
+                for i in range(first, written)
+            ]
+
+        header, slots = self._read(copy)
+        out = [(device_id.rstrip(b'\0').decode('utf-8'), metric.rstrip(b'\0').decode('utf-8'),
+                timestamp, value) for timestamp, value, device_id, metric in slots]
+        return out, header[7]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _read(self, copy):
+        """Run copy(header) until it sees data no write overlapped with.
+        """
+        for attempt in range(self.retries):
+            before = _sequence.unpack_from(self._map, _sequence_offset)[0]
+            if before % 2:
+                time.sleep(0)  # give the publisher a chance to finish
+                continue
+            header = _header.unpack_from(self._map, 0)
+            data = copy(header)
+            if _sequence.unpack_from(self._map, _sequence_offset)[0] == before:
+                return header, data
+        raise RuntimeError('No consistent read of {0} after {1} attempts.'.format(
+            self.path, self.retries))
+
+
+def serve(interval=5.0, filename=None, **kwargs):
+    """Poll a hub forever and publish every snapshot. Failed polls are logged and retried.
+
+    Args:
+        interval(float): Seconds between polls. Defaults to 5.
+        filename(str): File to publish into. Defaults to path(hub_id).
+        **hub_id(str): optional id of hub to operate on. A specified hub_id takes presedence over a hub_name or default Hub.
+        **hub_name(str): optional name of hub to operate on.
+        **remote(bool): Remote or local query.
+    """
+    hub._fill_kwargs(kwargs)
+    with Publisher(filename or path(kwargs['hub_id'])) as publisher:
+        while True:
+            start = time.monotonic()
+            try:
+                publisher.publish(hub_api.devices(**kwargs))
+            except Exception as e:
+                logging.warning('Publishing devices failed: {0}'.format(e))
+            time.sleep(max(0.0, interval - (time.monotonic() - start)))
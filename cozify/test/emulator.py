@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Stand-in hub for tests and benchmarks that need real HTTP round trips without hardware.
+
+The emulator serves the handful of hub endpoints python-cozify uses, both directly (local mode)
+and behind a fake cloud 'hub/remote' bounce (remote mode). Device commands are applied to the
+emulated device state so results can be read back.
+"""
+
+import copy, json, random, threading, time, uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from cozify import hub_api
+from . import fixtures_devices as dev
+
+templates = [dev.lamp_ikea, dev.lamp_osram, dev.strip_osram, dev.plafond_osram, dev.twilight_nexa]
+
+
+def generate(count, rooms=10):
+    """Generate a synthetic devices dict by cycling through the fixture devices.
+
+    Args:
+        count(int): Amount of devices to generate.
+        rooms(int): Amount of distinct rooms to spread the devices into. Defaults to 10.
+
+    Returns:
+        dict: devices dict in the same format as hub_api.devices() returns.
+    """
+    out = {}
+    for i in range(count):
+        device = copy.deepcopy(templates[i % len(templates)])
+        device['id'] = str(uuid.UUID(int=i))
+        device['name'] = '{0} {1}'.format(device['name'], i)
+        device['room'] = ['room-{0}'.format(i % rooms)]
+        out[device['id']] = device
+    return out
+
+
+def readings(count, seed=0):
+    """Generate a synthetic sensor series: per-minute readings with jitter, hourly gaps and slowly drifting values.
+
+    Args:
+        count(int): Amount of readings to generate.
+        seed(int): Random seed, the same seed always gives the same series.
+
+    Returns:
+        list: (epoch milliseconds, value) tuples in time order.
+    """
+    rnd = random.Random(seed)
+    timestamp, value = 1515949335273, 21.5
+    out = []
+    for i in range(count):
+        timestamp += 60000 + rnd.choice([0, 0, 0, 1, -1, rnd.randint(-3000, 3000)])
+        if i % 1000 == 999:
+            timestamp += 3600 * 1000  # sensor was offline for an hour
+        value = round(value + rnd.choice([0, 0, 0.1, -0.1]), 1)
+        out.append((timestamp, value))
+    return out
+
+
+class Emulator():
+    """Threaded HTTP server pretending to be both a hub and the cloud remote relay.
+
+    Args:
+        devices(dict): Initial device state. Defaults to a copy of the fixture devices.
+        hub_token(str): Token the hub expects in the Authorization header.
+        cloud_token(str): Token the fake cloud expects in the Authorization header.
+
+    Attributes:
+        host(str): Address the server listens on.
+        port(int): Port the server listens on, allocated dynamically.
+        cloud_base(str): Value to use in place of cloud_api.cloudBase for remote calls.
+        commands(list): Every device command received, in order.
+        requests(list): (method, path) of every request routed, in order.
+        delay(float): Seconds to wait before answering each request, to emulate a slow hub or relay.
+        api_path(str): Versioned API path the emulated hub accepts, others get 410 Gone. Defaults to cozify.hub_api.apiPath.
+    """
+
+    def __init__(self, devices=None, hub_token='hub-token', cloud_token='cloud-token'):
+        if devices is None:
+            devices = dev.devices
+        self.devices = copy.deepcopy(devices)
+        self.hub_token = hub_token
+        self.cloud_token = cloud_token
+        self.commands = []
+        self.requests = []
+        self.delay = 0
+        self.api_path = hub_api.apiPath
+        self.hub_info = {'hubId': 'deadbeef-emulated', 'name': 'Emulated', 'version': '1.14'}
+        self._server = _Server(('127.0.0.1', 0), _handler(self))
+        self.host, self.port = self._server.server_address
+        self.cloud_base = 'http://{0}:{1}/ui/0.2/'.format(self.host, self.port)
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def kwargs(self, remote=False):
+        """Keyword arguments that point hub_api calls at the emulator.
+
+        Args:
+            remote(bool): Build arguments for a remote call instead of a local one.
+        """
+        return {
+            'host': self.host,
+            'port': self.port,
+            'remote': remote,
+            'hub_token': self.hub_token,
+            'cloud_token': self.cloud_token
+        }
+
+    def apply(self, commands):
+        """Apply a list of device commands to the emulated state.
+        """
+        for command in commands:
+            self.commands.append(command)
+            device = self.devices.get(command['id'])
+            if device is None:
+                continue
+            if command['type'] == 'CMD_DEVICE_ON':
+                device['state']['isOn'] = True
+            elif command['type'] == 'CMD_DEVICE_OFF':
+                device['state']['isOn'] = False
+            elif command['type'] == 'CMD_DEVICE':
+                for key, value in command['state'].items():
+                    if value is not None and key != 'type':
+                        device['state'][key] = value
+
+    def route(self, method, path, body):
+        """Resolve a hub API call to a status code and reply.
+
+        Returns:
+            tuple: (status_code, reply object)
+        """
+        self.requests.append((method, path))
+        if self.delay:
+            time.sleep(self.delay)
+        if path == '/hub':
+            return 200, self.hub_info
+        if not path.startswith(self.api_path + '/'):
+            return 410, 'Gone'
+        call = path[len(self.api_path):]
+        if call == '/hub/tz' and method == 'GET':
+            return 200, 'Europe/Helsinki'
+        if call == '/devices' and method == 'GET':
+            return 200, self.devices
+        if call == '/devices/command' and method == 'PUT':
+            self.apply(json.loads(body))
+            return 200, []
+        return 404, 'Not Found'
+
+
+class _Server(HTTPServer):
+    request_queue_size = 64  # concurrent clients such as version probes shouldn't overflow the backlog
+
+
+def _handler(emulator):
+    """Build a request handler class bound to an Emulator instance.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        remote_prefix = '/ui/0.2/hub/remote'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self._serve('GET')
+
+        def do_PUT(self):
+            self._serve('PUT')
+
+        def _serve(self, method):
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length) if length else None
+            path = self.path
+            if path.startswith(self.remote_prefix):
+                if self.headers.get('Authorization') != emulator.cloud_token:
+                    return self._reply(401, 'Unauthorized')
+                if self.headers.get('X-Hub-Key') != emulator.hub_token:
+                    return self._reply(403, 'Forbidden')
+                path = path[len(self.remote_prefix):]
+            elif path != '/hub' and self.headers.get('Authorization') != emulator.hub_token:
+                return self._reply(401, 'Unauthorized')
+            status, reply = emulator.route(method, path, body)
+            self._reply(status, reply)
+
+        def _reply(self, status, reply):
+            data = json.dumps(reply).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
@@ -4,9 +4,10 @@ import os, pytest, tempfile, datetime
 import hashlib, json
 
 from absl import logging
-from cozify import config, hub
+from cozify import commands, config, convergence, hub, scheduler
 
 from . import fixtures_devices as dev
+from .emulator import Emulator
 
 
 @pytest.fixture
@@ -49,6 +50,26 @@ def tmp_hub(tmp_cloud):
         yield hub_obj
 
 
+@pytest.fixture
+def emulator():
+    with Emulator() as emu:
+        yield emu
+
+
+@pytest.fixture
+def hub_workers():
+    """Closes and forgets the per-hub command queues, schedulers and trackers a test started.
+    """
+    yield
+    for q in list(commands._queues.values()):
+        q.close(flush=False)
+    commands._queues.clear()
+    for s in list(scheduler._schedulers.values()):
+        s.close()
+    scheduler._schedulers.clear()
+    convergence._trackers.clear()
+
+
 @pytest.fixture()
 def live_hub():
     config.setStatePath()  # default config assumed to be live
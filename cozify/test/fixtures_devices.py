@@ -166,6 +166,31 @@ plafond_osram = {
     'zones': []
 }
 
+plug_nexa = {
+    'capabilities': {
+        'type': 'SET',
+        'values': ['DEVICE', 'ON_OFF']
+    },
+    'description': None,
+    'deviceType': None,
+    'groups': [],
+    'id': '4c8d36a6-8d4f-4d1e-9c1f-0b6e2a3f6a11',
+    'manufacturer': 'Nexa',
+    'model': 'Plug-in Receiver',
+    'name': 'Coffee Maker',
+    'room': ['87658ab7-bc4f-4d03-85a2-eb32ee1d4539'],
+    'rwx': 509,
+    'state': {
+        'isOn': True,
+        'lastSeen': 1515951870541,
+        'reachable': True,
+        'type': 'STATE_PLUG'
+    },
+    'timestamp': 1515951870545,
+    'type': 'POWER_SOCKET',
+    'zones': []
+}
+
 state_clean = {
     'brightness': None,
     'colorMode': None,
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import pytest, sqlite3, time
+from requests.exceptions import RequestException
+
+from cozify import cache, hub
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+from cozify.Error import APIError
+
+
+def settle():
+    """Wait for background refreshes to finish.
+    """
+    for i in range(100):
+        if not cache._pending:
+            return
+        time.sleep(0.02)
+
+
+@pytest.mark.logic
+def test_cache_roundtrip(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    assert cache.load(tmp_hub.id) is None
+    cache.store(tmp_hub.id, devs, timestamp=time.time() - 60)
+    snapshot = cache.load(tmp_hub.id)
+    assert snapshot == devs
+    assert snapshot.age == pytest.approx(60, abs=5)
+    # every load is a copy of its own, changing one doesn't leak into the next
+    snapshot[ids['lamp_ikea']]['state']['isOn'] = not devs[ids['lamp_ikea']]['state']['isOn']
+    assert cache.load(tmp_hub.id) == devs
+    cache.clear(tmp_hub.id)
+    assert cache.load(tmp_hub.id) is None
+
+
+@pytest.mark.logic
+def test_cache_version(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    cache.store(tmp_hub.id, devs)
+    db = sqlite3.connect(cache.path(tmp_hub.id))
+    db.execute('PRAGMA user_version = 999')
+    db.close()
+    # an unknown format is thrown away instead of misread
+    assert cache.load(tmp_hub.id) is None
+    cache.clear(tmp_hub.id)
+
+
+@pytest.mark.logic
+def test_cache_hub(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    # cold start fetches live and stores the snapshot
+    first = hub.devices(cached=True, **kwargs)
+    assert first == emulator.devices
+    assert len(emulator.requests) == 1
+    # warm start serves the snapshot and revalidates in the background
+    emulator.devices[ids['lamp_ikea']]['name'] = 'Renamed'
+    warm = hub.devices(capabilities=hub.capability.BRIGHTNESS, cached=True, **kwargs)
+    assert isinstance(warm, cache.Snapshot)
+    assert warm.timestamp == first.timestamp
+    assert warm[ids['lamp_ikea']]['name'] != 'Renamed'
+    settle()
+    assert len(emulator.requests) == 2
+    assert cache.load(tmp_hub.id)[ids['lamp_ikea']]['name'] == 'Renamed'
+    # single device checks are answered from the snapshot
+    assert hub.device_eligible(ids['lamp_ikea'], hub.capability.BRIGHTNESS, cached=True, **kwargs)
+    settle()
+    cache.clear(tmp_hub.id)
+
+
+@pytest.mark.logic
+def test_cache_max_staleness(tmp_hub, emulator):
+    kwargs = emulator.kwargs()
+    hub.devices(max_staleness=60, **kwargs)
+    fresh = hub.devices(max_staleness=60, **kwargs)
+    assert len(emulator.requests) == 1
+    assert not fresh.stale
+    # too old to serve without asking the hub
+    cache.store(tmp_hub.id, fresh, timestamp=time.time() - 120)
+    assert hub.devices(max_staleness=60, **kwargs).age < 60
+    assert len(emulator.requests) == 2
+    cache.clear(tmp_hub.id)
+
+
+@pytest.mark.logic
+def test_cache_offline(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    cache.store(tmp_hub.id, devs, timestamp=time.time() - 600)
+    kwargs['port'] = 1  # nothing listens here
+    out = hub.devices(capabilities=hub.capability.BRIGHTNESS, max_staleness=5, **kwargs)
+    assert out.stale
+    assert out.age >= 600
+    assert ids['lamp_ikea'] in out
+    # but not when the snapshot is older than allowed
+    with pytest.raises((APIError, RequestException)):
+        hub.devices(max_staleness=5, max_age=60, **kwargs)
+    cache.clear(tmp_hub.id)
+
+
+@pytest.mark.logic
+def test_cache_latency_budget(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    cache.store(tmp_hub.id, devs, timestamp=time.time() - 600)
+    emulator.delay = 0.3
+    start = time.perf_counter()
+    out = hub.devices(latency_budget=0.05, **kwargs)
+    assert time.perf_counter() - start < 0.25
+    assert out.stale
+    # the slow call completes in the background and becomes the new snapshot
+    settle()
+    assert cache.load(tmp_hub.id).age < 5
+    emulator.delay = 0
+    assert not hub.devices(latency_budget=1, **kwargs).stale
+    settle()
+    cache.clear(tmp_hub.id)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import copy, pytest, tempfile
+
+from cozify import capabilities, config, device, hub
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+from cozify.test import fixtures_devices as dev
+
+
+@pytest.fixture
+def shared_registry():
+    capabilities.reset()
+    yield capabilities.registry()
+    capabilities.reset()
+
+
+def learned_devices(name='SELF_DESTRUCT'):
+    devs = copy.deepcopy(dev.devices)
+    devs[dev.lamp_ikea['id']]['capabilities']['values'].append(name)
+    return devs
+
+
+@pytest.mark.logic
+def test_capabilities_builtin():
+    registry = capabilities.Registry()
+    # a fresh registry agrees with the enum
+    for c in hub.capability:
+        assert registry.bit(c) == registry.bit(c.name) == c.value - 1
+    assert registry.unknown() == []
+    # looking up an unseen name assigns nothing
+    assert registry.bit('NONSENSE') is None
+    assert registry.mask(['NONSENSE']) == 0
+    assert 'NONSENSE' not in registry
+    assert registry.mask(['BRIGHTNESS', hub.capability.ON_OFF]) == (
+        1 << (hub.capability.BRIGHTNESS.value - 1)) | (1 << (hub.capability.ON_OFF.value - 1))
+
+
+@pytest.mark.logic
+def test_capabilities_learn(tmp_hub):
+    registry = capabilities.Registry()
+    assert registry.bit('NONSENSE') is None
+    new = registry.observe(learned_devices())
+    assert 'SELF_DESTRUCT' in new and 'ON_OFF' in new
+    assert registry.unknown() == ['SELF_DESTRUCT']
+    assert registry.bit('SELF_DESTRUCT') == len(hub.capability)
+    # seen names are only learned once
+    assert registry.observe(learned_devices()) == set()
+    # positions survive into the next process, even if the enum has grown meanwhile
+    stored = {int(bit): name for bit, name in config.state['Capabilities'].items()}
+    del stored[hub.capability.VOLUME.value - 1]
+    reloaded = capabilities.Registry(stored)
+    assert 'NONSENSE' not in stored.values()
+    assert reloaded.bit('SELF_DESTRUCT') == registry.bit('SELF_DESTRUCT')
+    assert reloaded.bit('BRIGHTNESS') == registry.bit('BRIGHTNESS')
+    assert reloaded.bit('VOLUME') == len(hub.capability) + 1
+    assert reloaded.unknown() == ['SELF_DESTRUCT']
+
+
+@pytest.mark.logic
+def test_capabilities_filter(tmp_hub, emulator, shared_registry):
+    emulator.devices = learned_devices('FLUX_CAPACITOR')
+    kwargs = emulator.kwargs()
+    found = hub.devices(capabilities='FLUX_CAPACITOR', **kwargs)
+    assert list(found) == [dev.lamp_ikea['id']]
+    assert 'FLUX_CAPACITOR' in capabilities.registry().unknown()
+    assert len(hub.devices(capabilities=['FLUX_CAPACITOR', hub.capability.TWILIGHT], **kwargs)) == 2
+    typed = hub.devices(typed=True, **kwargs)
+    assert typed[dev.lamp_ikea['id']].has('FLUX_CAPACITOR')
+    assert not typed[dev.twilight_nexa['id']].has('FLUX_CAPACITOR')
+    assert not typed[dev.lamp_ikea['id']].has('FLUX_CAPACITR')
+    assert 'FLUX_CAPACITR' not in capabilities.registry()
+
+
+@pytest.mark.logic
+def test_capabilities_state_path(tmp_hub, shared_registry):
+    shared_registry.observe(learned_devices())
+    assert capabilities.registry() is shared_registry
+    with tempfile.NamedTemporaryFile(suffix='capabilities') as other:
+        # another state doesn't inherit what was learned into this one
+        config.setStatePath(other.name)
+        assert capabilities.registry() is not shared_registry
+        assert capabilities.registry().unknown() == []
+        assert device.Device(learned_devices()[dev.lamp_ikea['id']]).has('SELF_DESTRUCT')
+        assert capabilities.registry().unknown() == ['SELF_DESTRUCT']
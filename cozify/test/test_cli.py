@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import os, pytest, subprocess, sys, threading
+
+from cozify import cache, cli, daemon
+from cozify.test import debug
+from cozify.test.fixtures import emulator, hub_workers, tmp_hub, tmp_cloud
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = daemon.Server(str(tmp_path / 'cozify.sock'))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.logic
+def test_cli_list(tmp_hub, emulator, capsys):
+    ids, devs = tmp_hub.devices()
+    assert cli.main(['--no-daemon', 'list', '--capability', 'brightness'], **emulator.kwargs()) == 0
+    out = capsys.readouterr().out
+    assert '{0}: {1}'.format(ids['lamp_ikea'], devs[ids['lamp_ikea']]['name']) in out
+    assert ids['twilight_nexa'] not in out
+    # any name can be filtered on, a capability no device has matches nothing
+    assert cli.main(['--no-daemon', 'list', '--capability', 'nonsense'], **emulator.kwargs()) == 0
+    assert capsys.readouterr().out == ''
+
+
+@pytest.mark.logic
+def test_cli_batch(tmp_hub, emulator, hub_workers):
+    ids, devs = tmp_hub.devices()
+    targets = [ids['lamp_ikea'], ids['plafond_osram']]
+    assert cli.main(['--no-daemon', 'brightness', '0.3'] + targets, **emulator.kwargs()) == 0
+    # one fetch and one command call for all devices
+    assert [method for method, path in emulator.requests] == ['GET', 'PUT']
+    for device_id in targets:
+        assert emulator.devices[device_id]['state']['brightness'] == 0.3
+    assert cli.main(['--no-daemon', 'off', 'missing'], **emulator.kwargs()) == 1
+
+
+@pytest.mark.logic
+def test_cli_daemon(tmp_hub, emulator, server, hub_workers, capsys):
+    ids, devs = tmp_hub.devices()
+    argv = ['--socket', server.server_address]
+    assert cli.main(argv + ['show', ids['lamp_ikea']], **emulator.kwargs()) == 0
+    assert devs[ids['lamp_ikea']]['name'] in capsys.readouterr().out
+    assert cli.main(argv + ['on', ids['lamp_ikea'], ids['plafond_osram']], **emulator.kwargs()) == 0
+    # commands have been sent by the time the daemon replies
+    assert emulator.devices[ids['plafond_osram']]['state']['isOn']
+    # and failures to send them are reported
+    assert cli.main(argv + ['off', ids['lamp_ikea']], **dict(emulator.kwargs(),
+                                                            hub_token='wrong')) == 2
+    assert 'APIError' in capsys.readouterr().err
+    # back to back commands see the state left by the previous one
+    for expected in (False, True):
+        assert cli.main(argv + ['toggle', ids['plafond_osram']], **emulator.kwargs()) == 0
+        assert emulator.devices[ids['plafond_osram']]['state']['isOn'] is expected
+    cache.clear(tmp_hub.id)
+
+
+@pytest.mark.logic
+def test_cli_lazy_imports():
+    # parsing arguments must not pull in the hub stack
+    code = 'import sys, cozify.cli; cozify.cli._parser(); print("cozify.hub" in sys.modules, "requests" in sys.modules)'
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert out.split() == [b'False', b'False']
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import json, pytest
+
+from cozify import codec, hub, hub_api
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+
+
+@pytest.mark.logic
+def test_codec_roundtrip(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    data = codec.dumps(devs)
+    assert isinstance(data, bytes)
+    assert codec.loads(data) == devs
+    assert codec.loads(data.decode('utf-8')) == devs
+    assert json.loads(data.decode('utf-8')) == devs
+
+
+@pytest.mark.logic
+def test_codec_project(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    out = codec.project(devs, ['name'])
+    assert out.keys() == devs.keys()
+    for device_id, device in out.items():
+        assert device == {'id': device_id, 'name': devs[device_id]['name']}
+
+
+@pytest.mark.logic
+def test_codec_devices_fields(emulator):
+    devs = hub_api.devices(fields=['state'], **emulator.kwargs())
+    assert all(set(d.keys()) == {'id', 'state'} for d in devs.values())
+
+
+@pytest.mark.logic
+def test_codec_hub_devices_fields(tmp_hub, emulator):
+    kwargs = emulator.kwargs()
+    out = hub.devices(
+        capabilities=hub.capability.COLOR_LOOP, fields=['name'], hub_id=tmp_hub.id, **kwargs)
+    assert len(out) == 2
+    assert all(set(d.keys()) == {'id', 'name', 'capabilities'} for d in out.values())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import pytest, time
+
+from cozify import commands, hub
+from cozify.test import debug
+from cozify.test.fixtures import emulator, hub_workers, tmp_hub, tmp_cloud
+
+
+class Sink():
+
+    def __init__(self):
+        self.batches = []
+        self.kwargs = []
+
+    def __call__(self, batch, **kwargs):
+        self.batches.append(batch)
+        self.kwargs.append(kwargs)
+
+
+def _state(device_id, **state):
+    return {'id': device_id, 'type': 'CMD_DEVICE', 'state': dict(state, type='STATE_LIGHT')}
+
+
+@pytest.mark.logic
+def test_commands_merge():
+    sink = Sink()
+    q = commands.CommandQueue(window=0.05, rate=100, send=sink)
+    for i in range(10):
+        q.submit(_state('a', brightness=i / 10))
+    q.submit(_state('a', hue=1.0))
+    q.submit(_state('b', brightness=0.1))
+    assert q.flush(timeout=5)
+    assert sink.batches == [[_state('a', brightness=0.9, hue=1.0), _state('b', brightness=0.1)]]
+    assert q.counters['merged'] == 10
+    assert q.counters['sent'] == 2
+    assert q.counters['batches'] == 1
+
+
+@pytest.mark.logic
+def test_commands_merge_switch():
+    sink = Sink()
+    q = commands.CommandQueue(window=0.05, send=sink)
+    # on/off becomes the isOn value of a pending state, keeping its brightness
+    q.submit(_state('a', brightness=0.5))
+    q.submit({'id': 'a', 'type': 'CMD_DEVICE_OFF'})
+    q.submit({'id': 'b', 'type': 'CMD_DEVICE_ON'})
+    q.submit(_state('b', brightness=0.7))
+    q.submit({'id': 'c', 'type': 'CMD_DEVICE_ON'})
+    q.submit({'id': 'c', 'type': 'CMD_DEVICE_OFF'})
+    q.flush(timeout=5)
+    assert sink.batches == [[
+        _state('a', brightness=0.5, isOn=False),
+        _state('b', isOn=True, brightness=0.7), {
+            'id': 'c',
+            'type': 'CMD_DEVICE_OFF'
+        }
+    ]]
+
+
+@pytest.mark.logic
+def test_commands_rate_limit():
+    sink = Sink()
+    q = commands.CommandQueue(window=0.01, rate=4, send=sink)
+    start = time.monotonic()
+    for i in range(8):
+        q.submit(_state(str(i), brightness=0.5))
+    assert q.flush(timeout=5)
+    # a burst of 4 goes out immediately, the remaining 4 need a second worth of budget
+    assert time.monotonic() - start >= 0.9
+    assert len(sink.batches[0]) == 4
+    assert sum(len(b) for b in sink.batches) == 8
+
+
+@pytest.mark.logic
+def test_commands_drop():
+    sink = Sink()
+    q = commands.CommandQueue(window=0.05, max_pending=1, send=sink)
+    assert q.submit(_state('a', brightness=0.5))
+    assert not q.submit(_state('b', brightness=0.5))
+    q.close()
+    assert not q.submit(_state('a', brightness=0.5))
+    assert q.counters['dropped'] == 2
+    assert sink.batches == [[_state('a', brightness=0.5)]]
+
+
+@pytest.mark.logic
+def test_commands_hub_queued(tmp_hub, emulator, hub_workers):
+    ids, devs = tmp_hub.devices()
+    device_id = ids['lamp_ikea']
+    kwargs = emulator.kwargs()
+    q = hub.command_queue(window=0.1, **kwargs)
+    for step in [0.2, 0.4, 0.6]:
+        hub.light_brightness(device_id, step, queued=True, **kwargs)
+    hub.device_off(ids['plafond_osram'], queued=True, **kwargs)
+    assert q.flush(timeout=5)
+    assert emulator.devices[device_id]['state']['brightness'] == 0.6
+    assert len(emulator.commands) == 2
+    assert q.counters['merged'] == 2
+
+
+@pytest.mark.logic
+def test_commands_queue_kwargs(hub_workers):
+    sink = Sink()
+    q = commands.queue('hub', window=0.01, send=sink, host='old', hub_token='expired')
+    # later calls bring current call arguments, the queue itself is kept
+    assert commands.queue('hub', host='new', hub_token='fresh') is q
+    q.submit(_state('a', brightness=0.5))
+    assert q.flush(timeout=5)
+    assert sink.kwargs == [{'hub_id': 'hub', 'host': 'new', 'hub_token': 'fresh'}]
+    q.close()
+    assert commands.queue('hub') is not q
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import math, os, pytest, tempfile
+
+from cozify import compression
+from cozify.test import debug
+from cozify.test.emulator import readings
+
+
+@pytest.fixture
+def path():
+    fd, path = tempfile.mkstemp(suffix='.czts')
+    os.close(fd)
+    yield path
+    os.remove(path)
+
+
+@pytest.mark.logic
+def test_compression_roundtrip():
+    points = readings(2000)
+    points += [(points[-1][0] - 10**12, -0.0), (points[-1][0], math.inf), (2**62, 1e-300)]
+    encoder = compression.Encoder()
+    for timestamp, value in points:
+        encoder.append(timestamp, value)
+    data = encoder.finish()
+    assert list(compression.decode(data, encoder.count)) == points
+    # a slowly changing series takes a fraction of 16 bytes per point
+    assert len(data) < len(points) * 16 / 3
+
+
+@pytest.mark.logic
+def test_compression_file(path):
+    points = readings(5000)
+    assert compression.write(points, path, chunk_size=256) == 5000
+    with compression.Reader(path) as reader:
+        assert len(reader) == 5000
+        assert len(reader.chunks) == 20
+        assert list(reader.chunk(3)) == points[768:1024]
+        assert list(reader.read()) == points
+        start, end = points[1000][0], points[1300][0]
+        assert list(reader.read(start, end)) == points[1000:1300]
+
+
+@pytest.mark.logic
+def test_compression_close_iterating(path):
+    points = readings(1000)
+    compression.write(points, path, chunk_size=256)
+    reader = compression.Reader(path)
+    chunk = reader.chunk(0)
+    stream = reader.read()
+    assert next(stream) == points[0]
+    reader.close()
+    # the current chunk is already copied out of the map
+    assert list(chunk) == points[:256]
+    assert [next(stream) for i in range(255)] == points[1:256]
+    with pytest.raises(ValueError):
+        next(stream)
+
+
+@pytest.mark.logic
+def test_compression_empty(path):
+    compression.write([], path)
+    with compression.Reader(path) as reader:
+        assert list(reader.read()) == []
+    with open(path, 'wb') as f:
+        f.write(b'not a series')
+    with pytest.raises(ValueError):
+        compression.Reader(path)
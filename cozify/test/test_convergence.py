@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import pytest, threading
+
+from cozify import convergence, hub
+from cozify.test import debug
+from cozify.test.fixtures import emulator, hub_workers, tmp_hub, tmp_cloud
+
+
+class SlowDevice():
+    """Fetch function reporting a device that reaches its new brightness after a few polls.
+    """
+
+    def __init__(self, polls, model='TRADFRI bulb E27 W opal 1000lm'):
+        self.polls = polls
+        self.calls = 0
+        self.model = model
+
+    def __call__(self):
+        self.calls += 1
+        brightness = 0.5 if self.calls > self.polls else 1.0
+        state = {'type': 'STATE_LIGHT', 'brightness': brightness}
+        return {'lamp': {'id': 'lamp', 'model': self.model, 'state': state}}
+
+
+@pytest.mark.logic
+def test_convergence_resolves():
+    fetch = SlowDevice(polls=2)
+    t = convergence.Tracker(interval=0.01, fetch=fetch)
+    latency = t.watch('lamp', {'type': 'STATE_LIGHT', 'brightness': 0.505}).result(timeout=5)
+    assert latency > 0
+    assert fetch.calls == 3
+    stats = t.stats()
+    assert stats['devices']['lamp']['count'] == 1
+    assert stats['models'][fetch.model]['mean'] == latency
+
+
+@pytest.mark.logic
+def test_convergence_timeout():
+    fetch = SlowDevice(polls=1000)
+    t = convergence.Tracker(interval=0.01, max_interval=0.02, fetch=fetch)
+    with pytest.raises(TimeoutError):
+        t.watch('lamp', {'brightness': 0.5}, timeout=0.1).result(timeout=5)
+    assert t.stats()['devices']['lamp']['timeouts'] == 1
+    assert t.stats()['devices']['lamp']['mean'] is None
+
+
+@pytest.mark.logic
+def test_convergence_shared_poll():
+    fetch = SlowDevice(polls=3)
+    t = convergence.Tracker(interval=0.01, fetch=fetch)
+    futures = [t.watch('lamp', {'brightness': 0.5}) for i in range(10)]
+    for f in futures:
+        f.result(timeout=5)
+    assert fetch.calls == 4
+
+
+@pytest.mark.logic
+def test_convergence_hub_ack(tmp_hub, emulator, hub_workers):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    assert hub.device_off(ids['lamp_ikea'], ack=True, **kwargs).result(timeout=5) >= 0
+    assert hub.light_brightness(ids['lamp_ikea'], 0.3, ack=True, **kwargs).result(timeout=5) >= 0
+    assert emulator.devices[ids['lamp_ikea']]['state']['brightness'] == 0.3
+    stats = hub.convergence_tracker(**kwargs).stats()
+    assert stats['devices'][ids['lamp_ikea']]['count'] == 2
+    # already converged, nothing sent and nothing to wait for
+    sent = len(emulator.commands)
+    assert hub.light_brightness(ids['lamp_ikea'], 0.3, ack=True, **kwargs).result(timeout=5) == 0.0
+    assert len(emulator.commands) == sent
+
+
+@pytest.mark.logic
+def test_convergence_kwargs(hub_workers):
+    t = convergence.tracker('hub', interval=0.5, host='old', hub_token='expired')
+    # later calls bring current call arguments, the tracker and its options are kept
+    assert convergence.tracker('hub', interval=0.1, host='new', hub_token='fresh') is t
+    assert t.kwargs == {'hub_id': 'hub', 'host': 'new', 'hub_token': 'fresh'}
+    assert t.interval == 0.5
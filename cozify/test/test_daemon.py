@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import os, pytest, tempfile, threading
+
+from cozify import cache, daemon, hub, metrics
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+from cozify.Error import APIError
+
+
+@pytest.fixture
+def server():
+    socket_path = os.path.join(tempfile.mkdtemp(), 'cozify.sock')
+    server = daemon.Server(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    os.rmdir(os.path.dirname(socket_path))
+
+
+@pytest.mark.logic
+def test_daemon_calls(tmp_hub, emulator, server):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    with daemon.connect(server.server_address) as client:
+        assert client.devices(**kwargs) == emulator.devices
+        lights = client.devices(capabilities=hub.capability.BRIGHTNESS, **kwargs)
+        assert ids['lamp_ikea'] in lights and ids['twilight_nexa'] not in lights
+        client.light_brightness(ids['lamp_ikea'], 0.25, **kwargs)
+        assert emulator.devices[ids['lamp_ikea']]['state']['brightness'] == 0.25
+        # the connection is reused for every call
+        client.device_off(ids['lamp_ikea'], **kwargs)
+        assert not emulator.devices[ids['lamp_ikea']]['state']['isOn']
+        snapshot = client.devices(cached=True, **kwargs)
+        assert isinstance(snapshot, cache.Snapshot) and not snapshot.stale
+    cache.clear(tmp_hub.id)
+
+
+@pytest.mark.logic
+def test_daemon_errors(tmp_hub, emulator, server):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    with daemon.connect(server.server_address) as client:
+        with pytest.raises(ValueError):
+            client.light_brightness(ids['lamp_ikea'], 2.0, **kwargs)
+        with pytest.raises(AttributeError):
+            client.token
+        with pytest.raises(AttributeError):
+            client.call('_fill_kwargs', {})
+        with pytest.raises(APIError) as error:
+            client.tz(**dict(kwargs, hub_token='wrong'))
+        assert error.value.status_code == 401
+        # errors don't break the connection
+        assert client.tz(**kwargs) == 'Europe/Helsinki'
+        # a failed ping doesn't try to renew the token interactively
+        assert client.ping(autorefresh=True, **dict(kwargs, hub_token='wrong')) is False
+
+
+@pytest.mark.logic
+def test_daemon_stats(tmp_hub, emulator, server):
+    kwargs = emulator.kwargs()
+    metrics.reset()
+    metrics.enable()
+    try:
+        with daemon.connect(server.server_address) as client:
+            client.tz(**kwargs)
+            stats = client.stats(**kwargs)
+    finally:
+        metrics.enable(False)
+        metrics.reset()
+    assert stats['/hub/tz|local']['count'] == 1
+    assert stats['/hub/tz|local']['status'] == {'200': 1}
+
+
+@pytest.mark.logic
+def test_daemon_unavailable(tmp_path):
+    assert daemon.connect(str(tmp_path / 'missing.sock')) is None
+    # a socket left behind by a dead daemon is replaced
+    stale = daemon.Server(str(tmp_path / 'stale.sock'))
+    stale.socket.close()
+    server = daemon.Server(str(tmp_path / 'stale.sock'))
+    assert os.stat(str(tmp_path / 'stale.sock')).st_mode & 0o777 == 0o600
+    server.server_close()
+    assert not os.path.exists(str(tmp_path / 'stale.sock'))
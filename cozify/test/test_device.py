@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import device, hub
+from cozify.test import debug
+from cozify.test.fixtures import tmp_hub, tmp_cloud
+
+
+@pytest.mark.logic
+def test_device_raw_roundtrip(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    for device_id, data in devs.items():
+        d = device.Device(data)
+        assert d.raw == data
+        assert d == data
+
+
+@pytest.mark.logic
+def test_device_dict_access(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    d = device.from_devices(devs)[ids['lamp_ikea']]
+    raw = devs[ids['lamp_ikea']]
+    assert d['id'] == raw['id']
+    assert d['name'] == raw['name']
+    assert d['state']['isOn'] == raw['state']['isOn']
+    assert d['capabilities']['values'] == raw['capabilities']['values']
+    assert d['manufacturer'] == 'IKEA of Sweden'
+    assert d.get('nonexistent') is None
+    assert 'timestamp' in d
+    assert set(d.keys()) == set(raw.keys())
+    with pytest.raises(KeyError):
+        d['nonexistent']
+
+
+@pytest.mark.logic
+def test_device_state(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    d = device.Device(devs[ids['lamp_ikea']])
+    assert d.get_state('brightness') == devs[ids['lamp_ikea']]['state']['brightness']
+    assert d.get_state('twilight', 'missing') == 'missing'
+    d.state['isOn'] = 'modified copy'
+    assert d.get_state('isOn') is True
+
+
+@pytest.mark.logic
+def test_device_capabilities(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    d = device.Device(devs[ids['twilight_nexa']])
+    assert d.has(hub.capability.TWILIGHT)
+    assert not d.has(hub.capability.COLOR_HS)
+    assert d.mask == device.capability_mask([hub.capability.DEVICE, 'TWILIGHT'])
+    # names never seen on a device match nothing
+    assert not d.has('UNKNOWN_THING')
+    assert device.capability_mask(['UNKNOWN_THING']) == 0
+
+
+@pytest.mark.logic
+def test_device_sharing(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    out = device.from_devices(devs)
+    a, b = out[ids['lamp_osram']], out[ids['strip_osram']]
+    assert a.capabilities is b.capabilities
+    assert a._state_schema is b._state_schema
+
+
+@pytest.mark.logic
+def test_device_hub_devices_typed(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    out = hub.devices(capabilities=hub.capability.COLOR_LOOP, typed=True, mock_devices=devs)
+    assert len(out) == 2
+    assert all(isinstance(d, device.Device) for d in out.values())
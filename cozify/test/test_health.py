@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import copy, pytest
+
+from cozify import health, hub
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+
+hour = 3600
+
+
+def battery_sensors(ids, devs):
+    """Snapshot where the twilight sensor runs on a battery.
+    """
+    devs = copy.deepcopy(devs)
+    devs[ids['twilight_nexa']]['capabilities']['values'].append('BATTERY_U')
+    return devs
+
+
+@pytest.mark.logic
+def test_health_stale(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    devs = battery_sensors(ids, devs)
+    seen = devs[ids['twilight_nexa']]['state']['lastSeen'] / 1000.0
+    monitor = health.Monitor()
+    monitor.update(devs, now=seen)
+    assert monitor.stale(2 * hour, capability=hub.capability.BATTERY_U, now=seen + hour) == []
+    assert monitor.stale(
+        2 * hour, capability=hub.capability.BATTERY_U, now=seen + 3 * hour) == [ids['twilight_nexa']]
+    assert monitor.staleness(ids['twilight_nexa'], now=seen + 10) == pytest.approx(10)
+    # the lamp_osram has been out for months
+    assert ids['lamp_osram'] in monitor.stale(2 * hour, now=seen)
+    assert monitor.unreachable() == [ids['lamp_osram']]
+
+
+@pytest.mark.logic
+def test_health_outages(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    lamp = ids['lamp_ikea']
+    monitor = health.Monitor(history=2)
+    assert monitor.update(devs, now=1000) == []
+    assert monitor.reachable(lamp) is True
+    assert monitor.outages(lamp) == []
+    devs = copy.deepcopy(devs)
+    for start in (2000, 3000, 4000):
+        devs[lamp]['state']['lastSeen'] = start * 1000
+        devs[lamp]['state']['reachable'] = False
+        assert monitor.update(devs, now=start + 60) == [lamp]
+        devs[lamp]['state']['reachable'] = True
+        assert monitor.update(devs, now=start + 120) == [lamp]
+    devs[lamp]['state']['reachable'] = False
+    monitor.update(devs, now=5000)
+    assert monitor.reachable(lamp) is False
+    assert monitor.outages(lamp) == [(4000, 4120), (4000, None)]
+    # removed devices are forgotten
+    del devs[lamp]
+    monitor.update(devs)
+    assert lamp not in monitor
+    with pytest.raises(ValueError):
+        monitor.reachable(lamp)
+
+
+@pytest.mark.logic
+def test_health_hub(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    monitor = hub.health_monitor(**kwargs)
+    assert len(monitor) == len(devs)
+    assert monitor.reachable(ids['lamp_osram']) is False
+    assert hub.health_monitor(**kwargs) is monitor
+    assert hub.device_reachable(ids['lamp_ikea'], devs=devs) is True
+    hub._monitors.clear()
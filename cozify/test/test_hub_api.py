@@ -4,6 +4,8 @@ import pytest
 from cozify import cloud, hub, hub_api, config
 from cozify.test import debug
 from cozify.test.fixtures import *
+from cozify.Error import APIError
+from requests.exceptions import ConnectionError
 
 
 @pytest.mark.live
@@ -16,3 +18,84 @@ def test_hub(live_cloud, live_hub):
         remote=live_hub.remote(hub_id),
         cloud_token=live_cloud.token(),
         hub_token=live_hub.token(hub_id))
+
+
+@pytest.mark.logic
+def test_hub_api_candidates():
+    candidates = hub_api._candidates('/cc/1.14', reported='1.16.2', span=2)
+    assert candidates == ['/cc/1.16', '/cc/1.14', '/cc/1.15', '/cc/2.0', '/cc/1.13', '/cc/1.12']
+    assert hub_api._candidates('/cc/1.1', reported='garbage', span=3)[-1] == '/cc/1.0'
+    with pytest.raises(ValueError):
+        hub_api._candidates('/cc/latest')
+
+
+@pytest.mark.logic
+def test_hub_api_negotiate(emulator):
+    emulator.api_path = '/cc/1.16'
+    emulator.hub_info['version'] = '1.16.0.3'
+    assert hub_api.tz(**emulator.kwargs()) == 'Europe/Helsinki'
+    # nothing to remember it in without a hub_id, every call renegotiates
+    emulator.requests.clear()
+    hub_api.tz(**emulator.kwargs())
+    assert emulator.requests[0] == ('GET', hub_api.apiPath + '/hub/tz')
+    emulator.api_path = '/cc/9.9'
+    with pytest.raises(APIError) as error:
+        hub_api.tz(**emulator.kwargs())
+    assert error.value.status_code == 410
+
+
+@pytest.mark.logic
+def test_hub_api_negotiate_failed_probes(monkeypatch):
+
+    def get(call, base=None, **kwargs):
+        if base == '/':
+            return {'version': '1.14.0'}
+        if base == '/cc/1.14':
+            raise ConnectionError('probe timed out')
+        if base == '/cc/1.15':
+            raise APIError('connection failure', 'probe refused')
+        if base == '/cc/1.16':
+            return 'Europe/Helsinki'
+        raise APIError(410, 'Gone')
+
+    monkeypatch.setattr(hub_api, 'get', get)
+    # failed probes don't stop the others
+    assert hub_api.negotiate(current='/cc/1.14', span=3) == '/cc/1.16'
+
+
+@pytest.mark.logic
+def test_hub_api_negotiate_errors(monkeypatch):
+
+    def get(call, base=None, **kwargs):
+        if base == '/':
+            return {'version': '1.14.0'}
+        if base == '/cc/1.14':
+            raise APIError(404, 'Not Found')
+        if base == '/cc/1.15':
+            raise APIError(401, 'Unauthorized')
+        if base == '/cc/1.17':
+            return 'Europe/Helsinki'
+        raise APIError(410, 'Gone')
+
+    monkeypatch.setattr(hub_api, 'get', get)
+    # an error reply doesn't mean the version works
+    assert hub_api.negotiate(current='/cc/1.14', span=3) == '/cc/1.17'
+    assert hub_api.negotiate(current='/cc/1.14', span=1) is None
+
+
+@pytest.mark.logic
+def test_hub_negotiate(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    assert hub.api_path(tmp_hub.id) == hub_api.apiPath
+    emulator.api_path = '/cc/1.17'
+    del emulator.hub_info['version']  # found by probing around the current version
+    assert hub.devices(**emulator.kwargs()) == emulator.devices
+    assert hub.api_path(tmp_hub.id) == '/cc/1.17'
+    # the negotiated version is used from the start from now on
+    emulator.requests.clear()
+    hub.device_on(ids['lamp_ikea'], **emulator.kwargs())
+    assert emulator.requests == [('GET', '/cc/1.17/devices'), ('PUT', '/cc/1.17/devices/command')]
+    # a hub that moved on again is followed
+    emulator.api_path = '/cc/1.18'
+    assert hub.tz(**emulator.kwargs()) == 'Europe/Helsinki'
+    assert hub.api_path(tmp_hub.id) == '/cc/1.18'
@@ -3,7 +3,9 @@ import pytest, time
 
 from cozify import hub
 from cozify.test import debug
-from cozify.test.fixtures import live_hub, tmp_hub, tmp_cloud, online_device
+from cozify.test.fixtures import live_hub, tmp_hub, tmp_cloud, online_device, emulator
+from cozify.test import fixtures_devices as dev
+from cozify.test.emulator import Emulator
 from cozify.Error import APIError
 
 # global timer delay for tests that change device state
@@ -42,12 +44,36 @@ def test_hub_devices_filter_and(tmp_hub):
     assert len(out) == 2
 
 
+@pytest.mark.logic
+@pytest.mark.parametrize('capabilities,and_filter', [
+    (None, False),
+    (hub.capability.COLOR_LOOP, False),
+    ([hub.capability.TWILIGHT, hub.capability.COLOR_HS], False),
+    ([hub.capability.COLOR_HS, hub.capability.COLOR_TEMP], True),
+])
+def test_hub_iter_devices(tmp_hub, capabilities, and_filter):
+    ids, devs = tmp_hub.devices()
+    it = hub.iter_devices(
+        hub_id=tmp_hub.id, capabilities=capabilities, and_filter=and_filter, mock_devices=devs)
+    assert not isinstance(it, dict)
+    out = hub.devices(
+        hub_id=tmp_hub.id, capabilities=capabilities, and_filter=and_filter, mock_devices=devs)
+    pairs = list(it)
+    assert dict(pairs) == out
+    # devices are handed out as is, not copied
+    assert all(device is devs[device_id] for device_id, device in pairs)
+    # the same filtering works on a snapshot the caller already has
+    assert dict(hub.iter_devices(capabilities=capabilities, and_filter=and_filter, devs=devs)) == out
+
+
 @pytest.mark.logic
 def test_hub_device_eligible(tmp_hub):
     ids, devs = tmp_hub.devices()
     assert hub.device_eligible(ids['lamp_osram'], hub.capability.COLOR_TEMP, mock_devices=devs)
     assert not hub.device_eligible(
         ids['twilight_nexa'], hub.capability.COLOR_TEMP, mock_devices=devs)
+    # a given snapshot is checked for the capability too
+    assert not hub.device_eligible(ids['twilight_nexa'], hub.capability.COLOR_TEMP, devs=devs)
 
 
 @pytest.mark.logic
@@ -114,3 +140,65 @@ def test_hub_device_state_replace(live_hub, online_device):
     assert new_brightness != old_brightness, 'brightness did not change, expected {0}'.format(new_brightness)
     assert new_brightness == set_brightness, 'brightness changed unexpectedly, expected {0}'.format(set_brightness)
     assert new_isOn == True
+
+
+@pytest.mark.logic
+def test_hub_state_delta(tmp_hub):
+    state = tmp_hub.states()['dirty']
+    assert hub._state_delta(state, {'brightness': 0.5}) == {'type': 'STATE_LIGHT', 'brightness': 0.5}
+    assert hub._state_delta(state, {'brightness': state['brightness']}) is None
+    assert hub._state_delta(state, {'isOn': not state['isOn'], 'lastSeen': 0}, transition=100) == {
+        'type': 'STATE_LIGHT',
+        'isOn': not state['isOn'],
+        'transitionMsec': 100
+    }
+    # sensor readings can't be commanded
+    ids, devs = tmp_hub.devices()
+    assert hub._state_delta(devs[ids['twilight_nexa']]['state'], {'twilight': False}) is None
+
+
+@pytest.mark.logic
+def test_hub_light_brightness_emulated(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    device_id = ids['lamp_ikea']
+    hub.light_brightness(device_id, 0.75, **emulator.kwargs())
+    assert emulator.commands[-1] == {
+        'id': device_id,
+        'type': 'CMD_DEVICE',
+        'state': {
+            'type': 'STATE_LIGHT',
+            'brightness': 0.75,
+            'transitionMsec': 0
+        }
+    }
+    assert emulator.devices[device_id]['state']['brightness'] == 0.75
+    # already in wanted state, nothing should be sent
+    hub.light_brightness(device_id, 0.75, **emulator.kwargs())
+    assert len(emulator.commands) == 1
+
+
+@pytest.mark.logic
+def test_hub_light_color_toggle_emulated(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    device_id = ids['strip_osram']
+    hub.light_color(device_id, 1.0, saturation=0.5, **emulator.kwargs())
+    assert emulator.commands[-1]['state'] == {
+        'type': 'STATE_LIGHT',
+        'hue': 1.0,
+        'saturation': 0.5,
+        'transitionMsec': 0
+    }
+    hub.device_toggle(device_id, **emulator.kwargs())
+    assert emulator.commands[-1]['state'] == {'type': 'STATE_LIGHT', 'isOn': False}
+    assert emulator.devices[device_id]['state']['isOn'] is False
+
+
+@pytest.mark.logic
+def test_hub_plug_toggle_emulated(tmp_hub):
+    with Emulator(dict(dev.devices, **{dev.plug_nexa['id']: dev.plug_nexa})) as emu:
+        plug = dev.plug_nexa['id']
+        hub.device_toggle(plug, **emu.kwargs())
+        assert emu.commands[-1]['state'] == {'type': 'STATE_PLUG', 'isOn': False}
+        assert emu.devices[plug]['state']['isOn'] is False
+        hub.device_toggle(plug, **emu.kwargs())
+        assert emu.devices[plug]['state']['isOn'] is True
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import copy, pytest
+
+from cozify import codec, device, hub, index, query
+from cozify.test import debug
+from cozify.test.emulator import Emulator
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+from cozify.test import fixtures_devices as dev
+
+living_room = '87658ab7-bc4f-4d03-85a2-eb32ee1d4539'
+
+
+@pytest.mark.logic
+def test_index_build(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    idx = index.DeviceIndex(devs)
+    assert idx.room(living_room) == {ids['lamp_ikea'], ids['lamp_osram'], ids['plafond_osram']}
+    assert idx.group('86397059-1341-4398-8274-3dcef21d0d54') == {ids['lamp_ikea']}
+    assert idx.capability(hub.capability.TWILIGHT) == {ids['twilight_nexa']}
+    assert idx.zone('nonexistent') == frozenset()
+    assert len(idx) == len(devs)
+    # Device objects index the same way
+    assert index.DeviceIndex(device.from_devices(devs)).room(living_room) == idx.room(living_room)
+
+
+@pytest.mark.logic
+def test_index_incremental(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    idx = index.DeviceIndex(devs)
+    assert idx.update(devs) == 0
+    devs = copy.deepcopy(devs)
+    devs[ids['lamp_osram']]['room'] = ['other']
+    del devs[ids['twilight_nexa']]
+    assert idx.update(devs) == 2
+    assert ids['lamp_osram'] not in idx.room(living_room)
+    assert idx.room('other') == {ids['lamp_osram']}
+    assert ids['twilight_nexa'] not in idx
+    assert hub.capability.TWILIGHT.name not in [c for c in idx._by['capabilities']]
+
+
+@pytest.mark.logic
+def test_index_room_bulk(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    hub.room_on(living_room, **kwargs)
+    # only the two lights that were off need a command and they go out as one batch
+    assert len(emulator.commands) == 2
+    assert [r[0] for r in emulator.requests] == ['GET', 'PUT']
+    assert all(emulator.devices[i]['state']['isOn'] for i in [ids['lamp_osram'], ids['plafond_osram']])
+    hub.room_on(living_room, **kwargs)
+    assert len(emulator.commands) == 2
+    # a projected snapshot can't replace the shared index, bulk calls fetch everything they need
+    with pytest.raises(ValueError):
+        hub.device_index(devs=codec.project(devs, ['name', 'room']), **kwargs)
+    hub.room_off(living_room, fields=['name'], **kwargs)
+    assert len(hub.device_index(**kwargs)) == len(devs)
+    lights = [ids['lamp_osram'], ids['plafond_osram']]
+    assert not any(emulator.devices[i]['state']['isOn'] for i in lights)
+
+
+@pytest.mark.logic
+def test_index_room_plug(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    plug = dev.plug_nexa['id']
+    with Emulator(dict(devs, **{plug: dev.plug_nexa})) as emu:
+        # plugs aren't lights, on and off still reach them
+        hub.room_off(living_room, **emu.kwargs())
+        assert {'id': plug, 'type': 'CMD_DEVICE_OFF'} in emu.commands
+        assert emu.devices[plug]['state']['isOn'] is False
+        hub.room_on(living_room, **emu.kwargs())
+        assert emu.devices[plug]['state']['isOn'] is True
+
+
+@pytest.mark.logic
+def test_index_filtered_devs(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    shared = hub.device_index(**kwargs)
+    assert len(shared) == len(devs)
+    # a capability filtered dictionary gets its own index and can't shrink the shared one
+    lights = hub.devices(capabilities=hub.capability.BRIGHTNESS, **kwargs)
+    assert hub.device_index(devs=lights, **kwargs) is not shared
+    results = hub.find(query.room(living_room), capabilities=hub.capability.TWILIGHT, **kwargs)
+    assert list(results) == []
+    assert len(shared) == len(devs)
+    assert shared.room(living_room) == {ids['lamp_ikea'], ids['lamp_osram'], ids['plafond_osram']}
+    assert hub.device_index(**kwargs) is shared
+    hub._indexes.clear()
+
+
+@pytest.mark.logic
+def test_index_group_brightness(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    hub.group_brightness('86397059-1341-4398-8274-3dcef21d0d54', 0.3, **emulator.kwargs())
+    assert emulator.devices[ids['lamp_ikea']]['state']['brightness'] == 0.3
+    assert len(emulator.commands) == 1
+    with pytest.raises(ValueError):
+        hub.group_brightness('86397059-1341-4398-8274-3dcef21d0d54', 1.3, **emulator.kwargs())
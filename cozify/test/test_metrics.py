@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import cloud_api, hub, hub_api, metrics
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+
+
+@pytest.fixture
+def collecting():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.enable(False)
+    metrics.reset()
+
+
+@pytest.mark.logic
+def test_metrics_inactive_by_default():
+    assert not metrics.active
+
+
+@pytest.mark.logic
+def test_metrics_histogram_local(emulator, collecting):
+    for i in range(3):
+        hub_api.devices(hub_id='emulated', **emulator.kwargs())
+    stats = metrics.stats(hub_id='emulated')
+    hist = stats[('/devices', 'local')]
+    assert hist['count'] == 3
+    assert hist['status'] == {200: 3}
+    assert hist['bytes'] > 0
+    assert hist['buckets'][-1][1] <= 3
+    assert hist['min'] <= hist['max']
+
+
+@pytest.mark.logic
+def test_metrics_histogram_remote(emulator, collecting, monkeypatch):
+    monkeypatch.setattr(cloud_api, 'cloudBase', emulator.cloud_base)
+    hub_api.tz(hub_id='emulated', **emulator.kwargs(remote=True))
+    stats = metrics.stats()
+    assert ('emulated', '/hub/tz', 'remote') in stats
+    assert ('emulated', 'hub/remote', 'cloud') in stats
+
+
+@pytest.mark.logic
+def test_metrics_hooks(emulator):
+    started = []
+    ended = []
+    metrics.add_hook(start=started.append, end=ended.append)
+    assert metrics.active
+    try:
+        with pytest.raises(hub_api.APIError):
+            hub_api.get('/nonexistent', **emulator.kwargs())
+        # a call refused before sending isn't started
+        with pytest.raises(AttributeError):
+            hub_api.get('/hub/tz', **dict(emulator.kwargs(), host=None))
+    finally:
+        metrics.remove_hook(start=started.append, end=ended.append)
+    assert not metrics.active
+    assert len(started) == len(ended) == 1
+    assert started[0]['endpoint'] == '/nonexistent'
+    assert ended[0]['status_code'] == 404
+    assert ended[0]['path'] == 'local'
+    assert ended[0]['duration'] >= 0
+
+
+@pytest.mark.logic
+def test_metrics_hub_stats(tmp_hub, emulator, collecting):
+    hub_api.tz(hub_id=tmp_hub.id, **emulator.kwargs())
+    assert ('/hub/tz', 'local') in hub.stats()
+
+
+@pytest.mark.logic
+def test_metrics_prometheus(emulator, collecting):
+    hub_api.tz(hub_id='emulated', **emulator.kwargs())
+    text = metrics.prometheus()
+    assert '# TYPE cozify_api_call_duration_seconds histogram' in text
+    assert 'cozify_api_call_duration_seconds_count{hub_id="emulated",endpoint="/hub/tz",path="local"} 1' in text
+    assert 'le="+Inf"' in text
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import pytest
+
+from cozify import device, hub, index, query
+from cozify.query import capability, state, room, device_type, manufacturer
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+
+living_room = '87658ab7-bc4f-4d03-85a2-eb32ee1d4539'
+
+
+def ids_of(results):
+    return sorted(device_id for device_id, device in results)
+
+
+@pytest.mark.logic
+def test_query_state(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    bright = capability(hub.capability.BRIGHTNESS) & state('isOn') & (state('brightness') > 0.5)
+    expected = sorted(
+        i for i, d in devs.items()
+        if 'BRIGHTNESS' in d['capabilities']['values'] and d['state'].get('isOn') and
+        d['state']['brightness'] > 0.5)
+    assert ids_of(query.select(bright, devs)) == expected
+    # devices without the field never match, in either direction
+    assert ids_of(query.select(state('brightness') > 1.0, devs)) == []
+    assert ids_of(query.select(~state('twilight').exists(), devs)) == sorted(
+        i for i in devs if i != ids['twilight_nexa'])
+
+
+@pytest.mark.logic
+def test_query_attributes(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    assert ids_of(query.select(manufacturer('ikea of sweden'), devs)) == [ids['lamp_ikea']]
+    assert ids_of(query.select(device_type('TWILIGHT'), devs)) == [ids['twilight_nexa']]
+    either = manufacturer('IKEA of Sweden') | device_type('TWILIGHT')
+    assert ids_of(query.select(either, devs)) == sorted([ids['lamp_ikea'], ids['twilight_nexa']])
+
+
+@pytest.mark.logic
+@pytest.mark.parametrize('typed', [False, True])
+def test_query_index(tmp_hub, typed):
+    ids, devs = tmp_hub.devices()
+    if typed:
+        devs = device.from_devices(devs)
+    idx = index.DeviceIndex(devs)
+    q = room(living_room) & capability(hub.capability.COLOR_HS) & state('reachable')
+    assert q.candidates(idx) == idx.room(living_room) & idx.capability(hub.capability.COLOR_HS)
+    assert ids_of(query.select(q, devs, index=idx)) == ids_of(query.select(q, devs))
+    # negations can't be narrowed down by the index
+    assert (~q).candidates(idx) is None
+
+
+@pytest.mark.logic
+def test_query_hub(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    results = hub.find(room(living_room) & state('reachable'), **emulator.kwargs())
+    assert not isinstance(results, (dict, list))
+    assert ids_of(results) == sorted([ids['lamp_ikea'], ids['plafond_osram']])
+    hub._indexes.clear()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import copy, pytest
+
+from cozify import hub, hub_api, scene
+from cozify.test import debug
+from cozify.test import fixtures_devices as dev
+from cozify.test.emulator import Emulator, generate
+from cozify.test.fixtures import emulator, tmp_hub, tmp_cloud
+
+
+@pytest.mark.logic
+def test_scene_capture(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    out = scene.capture(mock_devices=devs)
+    assert out.keys() == devs.keys() - {ids['twilight_nexa']}
+    light = out[ids['lamp_ikea']]
+    assert light['type'] == 'STATE_LIGHT'
+    assert light['brightness'] == devs[ids['lamp_ikea']]['state']['brightness']
+    assert not any(k in light for k in ['lastSeen', 'reachable', 'maxTemperature', 'transitionMsec'])
+    # sensor readings aren't captured, they can't be commanded back
+    assert ids['twilight_nexa'] not in out
+
+
+@pytest.mark.logic
+def test_scene_plug(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    plug = dev.plug_nexa['id']
+    with Emulator(dict(devs, **{plug: dev.plug_nexa})) as emu:
+        kwargs = emu.kwargs()
+        captured = scene.capture(**kwargs)
+        # plugs only have their power state to restore
+        assert captured[plug] == {'type': 'STATE_PLUG', 'isOn': True}
+        hub.device_off(plug, **kwargs)
+        assert emu.devices[plug]['state']['isOn'] is False
+        scene.apply(captured, **kwargs)
+        assert emu.devices[plug]['state']['isOn'] is True
+
+
+@pytest.mark.logic
+def test_scene_save_load(tmp_hub, tmp_path):
+    ids, devs = tmp_hub.devices()
+    out = scene.capture(mock_devices=devs)
+    path = str(tmp_path / 'test.scene')
+    scene.save(out, path)
+    assert scene.load(path) == out
+
+
+@pytest.mark.logic
+def test_scene_diff(tmp_hub):
+    ids, devs = tmp_hub.devices()
+    captured = scene.capture(mock_devices=devs)
+    assert scene.diff(captured, devs) == []
+    changed = copy.deepcopy(devs)
+    changed[ids['lamp_ikea']]['state']['brightness'] = 1.0
+    assert scene.diff(captured, changed) == [{
+        'id': ids['lamp_ikea'],
+        'type': 'CMD_DEVICE',
+        'state': {
+            'type': 'STATE_LIGHT',
+            'brightness': devs[ids['lamp_ikea']]['state']['brightness']
+        }
+    }]
+
+
+@pytest.mark.logic
+def test_scene_roundtrips(tmp_hub, tmp_path):
+    with Emulator(devices=generate(100)) as emu:
+        kwargs = emu.kwargs()
+        path = str(tmp_path / '100.scene')
+        scene.save(scene.capture(capabilities=hub.capability.BRIGHTNESS, **kwargs), path)
+        for device_id, device in emu.devices.items():
+            if 'brightness' in device['state']:
+                device['state']['brightness'] = 0.01
+        emu.requests.clear()
+        scene.apply(scene.load(path), **kwargs)
+        assert [r[0] for r in emu.requests] == ['GET', 'PUT']
+        assert len(emu.commands) == 80
+        assert all(d['state'].get('brightness', 1) != 0.01 for d in emu.devices.values())
+
+
+@pytest.mark.logic
+def test_scene_state_replace_no_mutation(tmp_hub, emulator):
+    ids, devs = tmp_hub.devices()
+    state = copy.deepcopy(devs[ids['lamp_ikea']]['state'])
+    hub.device_state_replace(ids['lamp_ikea'], state, **emulator.kwargs())
+    assert state == devs[ids['lamp_ikea']]['state']
+    assert 'lastSeen' not in emulator.commands[-1]['state']
+
+
+@pytest.mark.logic
+@pytest.mark.parametrize('batch', [True, False])
+def test_scene_commit(tmp_hub, emulator, batch):
+    ids, devs = tmp_hub.devices()
+    lights = [ids['lamp_osram'], ids['strip_osram']]
+    targets = {i: {'colorMode': 'hs', 'hue': 2.0, 'saturation': 0.5} for i in lights}
+    report = scene.commit(targets, batch=batch, **emulator.kwargs())
+    assert report['commands'] == 2
+    assert report['batch'] == batch
+    if batch:
+        assert report['spread'] is None
+    else:
+        assert 0 <= report['spread'] <= report['duration']
+    puts = [r for r in emulator.requests if r[0] == 'PUT']
+    assert len(puts) == (1 if batch else 2)
+    assert all(emulator.devices[i]['state']['hue'] == 2.0 for i in lights)
+    # nothing left to change
+    assert scene.commit(targets, batch=batch, **emulator.kwargs())['commands'] == 0
+    # a single worker sends the calls one after another
+    targets = {i: {'hue': 3.0} for i in lights}
+    assert scene.commit(targets, batch=batch, concurrency=1, **emulator.kwargs())['commands'] == 2
+    assert all(emulator.devices[i]['state']['hue'] == 3.0 for i in lights)
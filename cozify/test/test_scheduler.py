@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import pytest, threading, time
+
+from cozify import hub, scheduler
+from cozify.scheduler import priority
+from cozify.test import debug
+from cozify.test.fixtures import emulator, hub_workers, tmp_hub, tmp_cloud
+from cozify.Error import DeadlineError
+
+
+class GatedSink():
+    """Send function that blocks until released and records what was sent and peak concurrency.
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.sent = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, commands, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        self.gate.wait()
+        with self.lock:
+            self.active -= 1
+            self.sent.append(commands[0]['id'])
+        return commands[0]['id']
+
+
+@pytest.mark.logic
+def test_scheduler_priority_order():
+    sink = GatedSink()
+    s = scheduler.Scheduler(concurrency=1, send=sink)
+    first = s.submit({'id': 'blocker', 'type': 'CMD_DEVICE_ON'})
+    time.sleep(0.05)  # let the worker pick up the blocker
+    futures = [
+        s.submit({'id': 'cosmetic', 'type': 'CMD_DEVICE_ON'}, priority=priority.LOW),
+        s.submit({'id': 'normal', 'type': 'CMD_DEVICE_ON'}),
+        s.submit({'id': 'smoke', 'type': 'CMD_DEVICE_OFF'}, priority=priority.SAFETY)
+    ]
+    sink.gate.set()
+    assert [f.result(timeout=5) for f in futures] == ['cosmetic', 'normal', 'smoke']
+    assert sink.sent == ['blocker', 'smoke', 'normal', 'cosmetic']
+    s.close()
+
+
+@pytest.mark.logic
+def test_scheduler_deadline():
+    sink = GatedSink()
+    s = scheduler.Scheduler(concurrency=1, send=sink)
+    s.submit({'id': 'blocker', 'type': 'CMD_DEVICE_ON'})
+    late = s.submit({'id': 'late', 'type': 'CMD_DEVICE_ON'}, deadline=0.01)
+    in_time = s.submit({'id': 'in_time', 'type': 'CMD_DEVICE_ON'}, deadline=10)
+    time.sleep(0.05)
+    sink.gate.set()
+    with pytest.raises(DeadlineError):
+        late.result(timeout=5)
+    assert in_time.result(timeout=5) == 'in_time'
+    assert 'late' not in sink.sent
+    assert s.counters['expired'] == 1
+    s.close()
+
+
+@pytest.mark.logic
+def test_scheduler_concurrency():
+    sink = GatedSink()
+    s = scheduler.Scheduler(concurrency=2, send=sink)
+    futures = [s.submit({'id': str(i), 'type': 'CMD_DEVICE_ON'}) for i in range(6)]
+    time.sleep(0.05)
+    assert sink.active == 2
+    sink.gate.set()
+    for f in futures:
+        f.result(timeout=5)
+    assert sink.peak == 2
+    s.close()
+
+
+@pytest.mark.logic
+def test_scheduler_hub(tmp_hub, emulator, hub_workers):
+    ids, devs = tmp_hub.devices()
+    kwargs = emulator.kwargs()
+    future = hub.device_off(ids['lamp_ikea'], priority=priority.SAFETY, deadline=5, **kwargs)
+    future.result(timeout=5)
+    assert emulator.devices[ids['lamp_ikea']]['state']['isOn'] is False
+    # already at wanted brightness, resolves without sending anything
+    same = emulator.devices[ids['lamp_ikea']]['state']['brightness']
+    assert hub.light_brightness(ids['lamp_ikea'], same, priority=priority.LOW,
+                                **kwargs).result(timeout=5) is None
+    assert len(emulator.commands) == 1
+
+
+@pytest.mark.logic
+def test_scheduler_kwargs(hub_workers):
+    sent = []
+    send = lambda commands, **kwargs: sent.append(kwargs)
+    s = scheduler.scheduler('hub', send=send, host='old', hub_token='expired')
+    # later calls bring current call arguments, the scheduler itself is kept
+    assert scheduler.scheduler('hub', host='new', hub_token='fresh') is s
+    s.submit({'id': 'a', 'type': 'CMD_DEVICE_ON'}).result(timeout=5)
+    assert sent == [{'hub_id': 'hub', 'host': 'new', 'hub_token': 'fresh'}]
+    s.close()
+    assert scheduler.scheduler('hub') is not s
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import copy, multiprocessing, pytest
+
+from cozify import shared
+from cozify.test import debug
+from cozify.test import fixtures_devices as dev
+
+sensor = {
+    'id': 'sensor',
+    'capabilities': {
+        'type': 'SET',
+        'values': ['TEMPERATURE']
+    },
+    'state': {
+        'type': 'STATE_MULTI_SENSOR',
+        'lastSeen': 1000,
+        'temperature': 20.0
+    }
+}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'devices.shm')
+
+
+def snapshot(i):
+    devs = copy.deepcopy(dev.devices)
+    device = copy.deepcopy(sensor)
+    device['state']['lastSeen'] = 1000 * i
+    device['state']['temperature'] = 20.0 + i
+    devs['sensor'] = device
+    return devs
+
+
+def check(path, rounds, results):
+    """Read in another process while the parent publishes, recording any torn snapshot.
+    """
+    with shared.Subscriber(path) as sub:
+        seen = set()
+        while len(seen) < rounds:
+            devs = sub.devices()
+            if devs is None:
+                continue
+            state = devs['sensor']['state']
+            if state['lastSeen'] != state['temperature'] * 1000 - 20000:
+                results.put('torn')
+                return
+            seen.add(state['lastSeen'])
+            if state['lastSeen'] == (rounds - 1) * 1000:
+                break
+    results.put('ok')
+
+
+@pytest.mark.logic
+def test_shared_publish(path):
+    with shared.Publisher(path, capacity=64 * 1024, ring=8) as pub:
+        with shared.Subscriber(path) as sub:
+            assert sub.devices() is None
+            assert pub.publish(snapshot(1), now=12345.0) == 1
+            devs = sub.devices()
+            assert devs == snapshot(1)
+            assert devs.timestamp == 12345.0
+            # an unchanged reading isn't appended again
+            assert pub.publish(snapshot(1)) == 0
+            readings, cursor = sub.readings()
+            assert readings == [('sensor', 'temperature', 1000, 21.0)]
+            for i in range(2, 20):
+                pub.publish(snapshot(i))
+            readings, cursor = sub.readings(cursor)
+            # only the last ring full is still available
+            assert [r[2] for r in readings] == [i * 1000 for i in range(12, 20)]
+            assert sub.readings(cursor) == ([], cursor)
+
+
+@pytest.mark.logic
+def test_shared_no_last_seen(path):
+    devs = snapshot(1)
+    del devs['sensor']['state']['lastSeen']
+    with shared.Publisher(path, capacity=64 * 1024) as pub:
+        # a device without lastSeen still gets its first reading published, at the snapshot time
+        assert pub.publish(devs, now=5.0) == 1
+        with shared.Subscriber(path) as sub:
+            assert sub.readings()[0] == [('sensor', 'temperature', 5000, 21.0)]
+
+
+@pytest.mark.logic
+def test_shared_replace(path):
+    with shared.Publisher(path, capacity=64 * 1024) as pub:
+        pub.publish(snapshot(1))
+        with shared.Subscriber(path) as sub:
+            # a restarted publisher doesn't truncate the file under an attached subscriber
+            with shared.Publisher(path, capacity=64 * 1024) as restarted:
+                assert sub.devices() == snapshot(1)
+                restarted.publish(snapshot(2))
+            with shared.Subscriber(path) as reopened:
+                assert reopened.devices() == snapshot(2)
+
+
+@pytest.mark.logic
+def test_shared_oversize(path):
+    with shared.Publisher(path, capacity=128) as pub:
+        with pytest.raises(ValueError):
+            pub.publish(snapshot(1))
+
+
+@pytest.mark.logic
+def test_shared_processes(path):
+    rounds = 200
+    with shared.Publisher(path, capacity=64 * 1024) as pub:
+        pub.publish(snapshot(0))
+        results = multiprocessing.Queue()
+        reader = multiprocessing.Process(target=check, args=(path, rounds, results))
+        reader.start()
+        for i in range(rounds):
+            pub.publish(snapshot(i))
+        # keep the last snapshot up until the reader has seen it
+        assert results.get(timeout=30) == 'ok'
+        reader.join()
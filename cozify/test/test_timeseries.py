@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import copy, pytest, sqlite3, time
+
+from cozify import timeseries
+from cozify.test import debug
+from cozify.test import fixtures_devices as dev
+
+sensor = {
+    'id': 'sensor',
+    'name': 'Sauna',
+    'capabilities': {
+        'type': 'SET',
+        'values': ['TEMPERATURE', 'HUMIDITY']
+    },
+    'state': {
+        'type': 'STATE_MULTI_SENSOR',
+        'lastSeen': 1515949335273,
+        'temperature': 21.5,
+        'humidity': 40.0
+    }
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'timeseries.db')
+
+
+def snapshot(last_seen, temperature):
+    device = copy.deepcopy(sensor)
+    device['state']['lastSeen'] = last_seen
+    device['state']['temperature'] = temperature
+    return {'sensor': device}
+
+
+@pytest.mark.logic
+def test_timeseries_record(db_path):
+    with timeseries.Recorder(db_path, batch=3) as recorder:
+        for i in range(10):
+            assert recorder.record(snapshot(i * 60000, 20.0 + i)) == 2
+            # the same lastSeen again is not a new reading
+            assert recorder.record(snapshot(i * 60000, 20.0 + i)) == 0
+        readings = list(recorder.query('sensor', 'temperature'))
+        assert readings == [(i * 60000, 20.0 + i) for i in range(10)]
+        assert list(recorder.query('sensor', 'temperature', start=60000, end=180000)) == [
+            (60000, 21.0), (120000, 22.0)
+        ]
+        assert sorted(recorder.series()) == [('sensor', 'humidity'), ('sensor', 'temperature')]
+        assert recorder.counters['written'] == 20
+    db = sqlite3.connect(db_path)
+    assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    db.close()
+
+
+@pytest.mark.logic
+def test_timeseries_reopen(db_path):
+    with timeseries.Recorder(db_path) as recorder:
+        recorder.record(snapshot(60000, 20.0))
+    # a new process records the same snapshot, the database drops the repeat
+    with timeseries.Recorder(db_path) as recorder:
+        recorder.record(snapshot(60000, 20.0))
+        assert recorder.flush() == 0
+        assert recorder.counters['duplicate'] == 2
+        assert len(list(recorder.query('sensor', 'temperature'))) == 1
+
+
+@pytest.mark.logic
+def test_timeseries_retention(db_path):
+    day = 24 * 3600
+    now = int(time.time()) * 1000
+    with timeseries.Recorder(db_path, retention={'temperature': day}) as recorder:
+        recorder.record(snapshot(now - 2 * day * 1000, 10.0))
+        recorder.record(snapshot(now, 12.0))
+        # retention is applied as part of writing
+        recorder.flush()
+        assert recorder.counters['pruned'] == 1
+        assert list(recorder.query('sensor', 'temperature')) == [(now, 12.0)]
+        # other metrics are kept
+        assert len(list(recorder.query('sensor', 'humidity'))) == 2
+        assert recorder.prune(now=now / 1000 + 2 * day) == 1
+
+
+@pytest.mark.logic
+def test_timeseries_streaming(db_path):
+    with timeseries.Recorder(db_path) as recorder:
+        for i in range(1000):
+            recorder.add('sensor', 'temperature', i, float(i))
+        rows = recorder.query('sensor', 'temperature')
+        assert next(rows) == (0, 0.0)
+        # recording continues while a query is being iterated
+        recorder.add('sensor', 'temperature', 1000, 1000.0)
+        recorder.flush()
+        assert sum(1 for row in rows) == 999
+
+
+def recompute(db_path, device_id, metric, window):
+    """Rollups computed from scratch from the raw readings.
+    """
+    size = window * 1000
+    db = sqlite3.connect(db_path)
+    rows = db.execute(
+        'SELECT time - time % ?, count(*), min(value), max(value), sum(value) FROM '
+        '(SELECT * FROM readings WHERE device = ? AND metric = ? ORDER BY time) '
+        'GROUP BY time - time % ? ORDER BY 1', (size, device_id, metric, size)).fetchall()
+    db.close()
+    return [{
+        'start': start,
+        'count': count,
+        'min': low,
+        'max': high,
+        'avg': total / count
+    } for start, count, low, high, total in rows]
+
+
+@pytest.mark.logic
+def test_timeseries_rollups(db_path):
+    minute = 60000
+    with timeseries.Recorder(db_path, batch=7) as recorder:
+        for i in range(3 * 24 * 60):
+            recorder.add('sensor', 'temperature', i * minute, 20.0 + (i % 97) * 0.1)
+        # a repeat of a stored reading doesn't count twice
+        recorder.flush()
+        recorder._last.clear()
+        recorder.add('sensor', 'temperature', 0, 20.0)
+        hourly = list(recorder.rollup('sensor', 'temperature'))
+        assert len(hourly) == 72
+        assert hourly[0]['count'] == 60
+        assert hourly == recompute(db_path, 'sensor', 'temperature', 3600)
+        daily = list(recorder.rollup('sensor', 'temperature', window=24 * 3600))
+        assert [d['count'] for d in daily] == [1440] * 3
+        assert daily == recompute(db_path, 'sensor', 'temperature', 24 * 3600)
+        with pytest.raises(ValueError):
+            next(recorder.rollup('sensor', 'temperature', window=60))
+
+
+@pytest.mark.logic
+def test_timeseries_rollup_backfill(db_path):
+    with timeseries.Recorder(db_path, windows=[3600]) as recorder:
+        for i in range(120):
+            recorder.add('sensor', 'humidity', i * 60000, float(i))
+    # windows added later are computed from the stored readings
+    with timeseries.Recorder(db_path, windows=[3600, 600]) as recorder:
+        assert list(recorder.rollup('sensor', 'humidity', window=600)) == recompute(
+            db_path, 'sensor', 'humidity', 600)
+        assert len(list(recorder.rollup('sensor', 'humidity', window=3600))) == 2
+
+
+@pytest.mark.logic
+def test_timeseries_upgrade(db_path):
+    db = sqlite3.connect(db_path)
+    db.execute('CREATE TABLE readings (device TEXT NOT NULL, metric TEXT NOT NULL, '
+               'time INTEGER NOT NULL, value REAL, PRIMARY KEY (device, metric, time)) WITHOUT ROWID')
+    db.executemany('INSERT INTO readings VALUES (?, ?, ?, ?)',
+                   [('sensor', 'temperature', i * 60000, float(i)) for i in range(90)])
+    db.execute('PRAGMA user_version = 1')
+    db.commit()
+    db.close()
+    with timeseries.Recorder(db_path) as recorder:
+        assert [h['count'] for h in recorder.rollup('sensor', 'temperature')] == [60, 30]
+
+
+@pytest.mark.logic
+def test_timeseries_capabilities():
+    # lamps report their color temperature as 'temperature', that's not a sensor reading
+    assert timeseries.readings(dev.lamp_osram) == []
+    assert timeseries.readings(sensor) == [('temperature', 21.5), ('humidity', 40.0)]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import gzip, json, pytest, time
+
+from cozify import cloud_api, hub_api, traffic, transport
+from cozify.test import debug
+from cozify.test.fixtures import emulator, tmp_cloud
+from cozify.Error import APIError
+
+
+@pytest.fixture
+def recording(tmp_path, emulator):
+    path = str(tmp_path / 'hub.traffic.gz')
+    with traffic.record(path):
+        hub_api.devices(**emulator.kwargs())
+        hub_api.devices_command_off(next(iter(emulator.devices)), **emulator.kwargs())
+        hub_api.tz(**emulator.kwargs())
+    return path
+
+
+@pytest.mark.logic
+def test_traffic_record(recording, emulator):
+    assert transport.session is not None and not isinstance(transport.session, traffic.Recorder)
+    entries = list(traffic.entries(recording))
+    assert [e['path'] for e in entries] == [
+        '/cc/1.14/devices', '/cc/1.14/devices/command', '/cc/1.14/hub/tz'
+    ]
+    assert entries[1]['method'] == 'PUT'
+    assert 'CMD_DEVICE_OFF' in entries[1]['data']
+    with gzip.open(recording, 'rt') as f:
+        assert emulator.hub_token not in f.read()
+
+
+@pytest.mark.logic
+def test_traffic_redact(tmp_cloud):
+    assert traffic._redact('token: {0}'.format(tmp_cloud.token)) == 'token: <redacted>'
+    assert traffic._redact_params({'email': 'a@b', 'password': 1234})['password'] == '<redacted>'
+
+
+@pytest.mark.logic
+def test_traffic_replay(recording, emulator):
+    live = hub_api.devices(**emulator.kwargs())
+    with traffic.replay(recording) as replayer:
+        # host is irrelevant when replaying, exchanges are matched by method and path
+        devs = hub_api.devices(host='replayed', remote=False, hub_token='x')
+        hub_api.devices_command_off('any', host='replayed', remote=False, hub_token='x')
+        assert hub_api.tz(host='replayed', remote=False, hub_token='x') == 'Europe/Helsinki'
+        assert replayer.remaining() == 0
+        with pytest.raises(APIError) as e:
+            hub_api.tz(host='replayed', remote=False, hub_token='x')
+        assert e.value.status_code == 'connection failure'
+    assert devs.keys() == live.keys()
+
+
+@pytest.mark.logic
+def test_traffic_replay_speed(recording):
+    total = sum(e['elapsed'] for e in traffic.entries(recording))
+    start = time.perf_counter()
+    with traffic.replay(recording, speed=0.5):
+        hub_api.devices(host='replayed', remote=False, hub_token='x')
+        hub_api.devices_command_off('any', host='replayed', remote=False, hub_token='x')
+        hub_api.tz(host='replayed', remote=False, hub_token='x')
+    assert time.perf_counter() - start >= total * 2
+
+
+@pytest.mark.logic
+def test_traffic_replay_gaps(tmp_path):
+    path = str(tmp_path / 'gaps.traffic.gz')
+    exchange = {
+        'method': 'GET',
+        'path': '/cc/1.14/hub/tz',
+        'params': None,
+        'data': None,
+        'status': 200,
+        'reason': 'OK',
+        'response': '"Europe/Helsinki"',
+        'elapsed': 0.01
+    }
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'format': 'cozify-traffic', 'version': traffic.format_version}) + '\n')
+        for offset in [0.0, 0.3]:
+            f.write(json.dumps(dict(exchange, offset=offset)) + '\n')
+    start = time.perf_counter()
+    with traffic.replay(path, speed=1.0):
+        # the second call waits out the recorded pause before it
+        for i in range(2):
+            hub_api.tz(host='replayed', remote=False, hub_token='x')
+    assert time.perf_counter() - start >= 0.31
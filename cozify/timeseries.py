@@ -0,0 +1,320 @@
+"""Module for recording sensor readings from device snapshots into a SQLite time-series store.
+
+A Recorder picks the sensor values out of hub.devices() snapshots and buffers them, writing each batch
+in a single transaction to a database in WAL mode, so readers are never blocked by the writer. A reading
+is stored once per device, metric and lastSeen, so recording the same snapshot twice adds nothing.
+Range queries stream rows from the database instead of loading them into memory.
+
+Every written reading also updates hourly and daily rollups (count, sum, min and max per window) kept in
+the same database, so dashboards can read downsampled history at constant cost per window. Rollups are
+kept when retention prunes the raw readings.
+
+Example:
+    with timeseries.Recorder('readings.db', retention=365 * 24 * 3600) as recorder:
+        while True:
+            recorder.record(hub.devices(capabilities=hub.capability.TEMPERATURE))
+            time.sleep(60)
+
+Attributes:
+    metrics(dict): State keys recorded, mapped to the capability that reports them.
+    schema_version(int): Version of the database schema.
+    windows(tuple): Default rollup window lengths in seconds, hourly and daily. Windows are aligned to UTC.
+"""
+
+import sqlite3, threading, time
+from absl import logging
+
+metrics = {
+    'temperature': 'TEMPERATURE',
+    'humidity': 'HUMIDITY',
+    'lux': 'LUX',
+    'moisture': 'MOISTURE',
+    'batteryV': 'BATTERY_U'
+}
+
+schema_version = 2
+
+windows = (3600, 24 * 3600)
+
+
+class Recorder():
+    """SQLite backed store of sensor readings.
+
+    Args:
+        path(str): Database file, created if needed.
+        retention(float): Seconds to keep readings for, or a dict of metric to seconds. Defaults to forever.
+        batch(int): Amount of buffered readings that triggers a write. Defaults to 500.
+        windows(tuple): Rollup window lengths in seconds to maintain. Defaults to hourly and daily. Rollups for a newly added window are computed from the stored readings.
+
+    Attributes:
+        counters(dict): Amount of readings 'buffered', 'written' and 'duplicate', and 'pruned' from retention.
+    """
+
+    def __init__(self, path, retention=None, batch=500, windows=windows):
+        self.path = path
+        self.retention = retention
+        self.batch = batch
+        self.windows = tuple(windows)
+        self.counters = {'buffered': 0, 'written': 0, 'duplicate': 0, 'pruned': 0}
+        self._buffer = []
+        self._last = {}
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+        self._backfill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, devs, now=None):
+        """Buffer the sensor readings of a devices snapshot.
+
+        Args:
+            devs(dict): Devices dict as returned by hub.devices().
+            now(float): Epoch time in seconds used for devices that don't report lastSeen. Defaults to the current time.
+
+        Returns:
+            int: Amount of new readings buffered.
+        """
+        fallback = int((time.time() if now is None else now) * 1000)
+        added = 0
+        for device_id, device in devs.items():
+            timestamp = device['state'].get('lastSeen')
+            if timestamp is None:
+                timestamp = fallback
+            for metric, value in readings(device):
+                if self.add(device_id, metric, timestamp, value):
+                    added += 1
+        return added
+
+    def add(self, device_id, metric, timestamp, value):
+        """Buffer a single reading.
+
+        Args:
+            device_id(str): Device the reading is from.
+            metric(str): Name of the reading, e.g. 'temperature'.
+            timestamp(int): Time of the reading in epoch milliseconds, as lastSeen.
+            value(float): Reading.
+
+        Returns:
+            bool: False if the reading was a repeat of the last one seen for the device and metric.
+        """
+        key = (device_id, metric)
+        with self._lock:
+            if self._last.get(key) == timestamp:
+                self.counters['duplicate'] += 1
+                return False
+            self._last[key] = timestamp
+            self._buffer.append((device_id, metric, int(timestamp), float(value)))
+            self.counters['buffered'] += 1
+            if len(self._buffer) >= self.batch:
+                self.flush()
+        return True
+
+    def flush(self):
+        """Write all buffered readings in one transaction and apply retention.
+
+        Returns:
+            int: Amount of readings written, readings already in the database are skipped.
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            written = 0
+            with self._db:
+                for row in rows:
+                    cursor = self._db.execute(
+                        'INSERT OR IGNORE INTO readings (device, metric, time, value) VALUES (?, ?, ?, ?)',
+                        row)
+                    if cursor.rowcount:  # only readings new to the database count towards rollups
+                        written += 1
+                        self._roll(*row)
+            self.counters['written'] += written
+            self.counters['duplicate'] += len(rows) - written
+            if self.retention is not None:
+                self.prune()
+        logging.debug('Wrote {0} of {1} readings to {2}'.format(written, len(rows), self.path))
+        return written
+
+    def prune(self, now=None):
+        """Delete readings older than the retention.
+
+        Args:
+            now(float): Epoch time in seconds to count retention from. Defaults to the current time.
+
+        Returns:
+            int: Amount of readings deleted.
+        """
+        if self.retention is None:
+            return 0
+        now = time.time() if now is None else now
+        if isinstance(self.retention, dict):
+            limits = self.retention.items()
+        else:
+            limits = [(None, self.retention)]
+        with self._lock:
+            before = self._db.total_changes
+            with self._db:
+                for metric, seconds in limits:
+                    cutoff = int((now - seconds) * 1000)
+                    if metric is None:
+                        self._db.execute('DELETE FROM readings WHERE time < ?', (cutoff,))
+                    else:
+                        self._db.execute('DELETE FROM readings WHERE metric = ? AND time < ?',
+                                         (metric, cutoff))
+            pruned = self._db.total_changes - before
+            self.counters['pruned'] += pruned
+        return pruned
+
+    def query(self, device_id, metric, start=None, end=None):
+        """Stream the readings of a device in time order.
+
+        Buffered readings are written first so they are included. A separate connection is used so
+        iterating doesn't block recording.
+
+        Args:
+            device_id(str): Device to read.
+            metric(str): Name of the reading, e.g. 'temperature'.
+            start(int): Earliest time in epoch milliseconds, inclusive. Defaults to the beginning.
+            end(int): Latest time in epoch milliseconds, exclusive. Defaults to the end.
+
+        Yields:
+            tuple: (time, value) pairs.
+        """
+        self.flush()
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            cursor = db.execute(
+                'SELECT time, value FROM readings WHERE device = ? AND metric = ? '
+                'AND time >= ? AND time < ? ORDER BY time',
+                (device_id, metric, -2**63 if start is None else start,
+                 2**63 - 1 if end is None else end))
+            for row in cursor:
+                yield row
+        finally:
+            db.close()
+
+    def rollup(self, device_id, metric, window=3600, start=None, end=None):
+        """Stream downsampled readings of a device.
+
+        Args:
+            device_id(str): Device to read.
+            metric(str): Name of the reading, e.g. 'temperature'.
+            window(int): Window length in seconds, one of the recorder's windows. Defaults to hourly.
+            start(int): Earliest window start in epoch milliseconds, inclusive. Defaults to the beginning.
+            end(int): Latest window start in epoch milliseconds, exclusive. Defaults to the end.
+
+        Yields:
+            dict: 'start' in epoch milliseconds, 'count', 'min', 'max' and 'avg' of each window with readings, in time order.
+        """
+        if window not in self.windows:
+            raise ValueError('Window {0} is not maintained, use one of {1}'.format(
+                window, self.windows))
+        self.flush()
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            cursor = db.execute(
+                'SELECT start, count, sum, min, max FROM rollups WHERE device = ? AND metric = ? '
+                'AND window = ? AND start >= ? AND start < ? ORDER BY start',
+                (device_id, metric, window, -2**63 if start is None else start,
+                 2**63 - 1 if end is None else end))
+            for row_start, count, total, low, high in cursor:
+                yield {
+                    'start': row_start,
+                    'count': count,
+                    'min': low,
+                    'max': high,
+                    'avg': total / count
+                }
+        finally:
+            db.close()
+
+    def series(self):
+        """List the recorded series.
+
+        Returns:
+            list: (device_id, metric) tuples.
+        """
+        self.flush()
+        with self._lock:
+            return self._db.execute('SELECT DISTINCT device, metric FROM readings').fetchall()
+
+    def close(self):
+        """Write out buffered readings and close the database.
+        """
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def _roll(self, device_id, metric, timestamp, value):
+        """Add a reading to its window of every rollup size. An UPDATE of the window, and an INSERT if it
+        doesn't exist yet, instead of an upsert which needs SQLite 3.24.
+        """
+        for window in self.windows:
+            size = window * 1000
+            start = timestamp - timestamp % size
+            updated = self._db.execute(
+                'UPDATE rollups SET count = count + 1, sum = sum + ?, min = min(min, ?), '
+                'max = max(max, ?) WHERE device = ? AND metric = ? AND window = ? AND start = ?',
+                (value, value, value, device_id, metric, window, start)).rowcount
+            if not updated:
+                self._db.execute(
+                    'INSERT INTO rollups (device, metric, window, start, count, sum, min, max) '
+                    'VALUES (?, ?, ?, ?, 1, ?, ?, ?)',
+                    (device_id, metric, window, start, value, value, value))
+
+    def _migrate(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version == schema_version:
+            return
+        if version > schema_version:
+            raise ValueError('Unsupported time-series schema version {0} in {1}'.format(
+                version, self.path))
+        with self._db:
+            if version < 1:
+                self._db.execute(
+                    'CREATE TABLE readings (device TEXT NOT NULL, metric TEXT NOT NULL, '
+                    'time INTEGER NOT NULL, value REAL, PRIMARY KEY (device, metric, time)) WITHOUT ROWID')
+            if version < 2:
+                # rollups of existing readings are filled in by _backfill()
+                self._db.execute(
+                    'CREATE TABLE rollups (device TEXT NOT NULL, metric TEXT NOT NULL, '
+                    'window INTEGER NOT NULL, start INTEGER NOT NULL, count INTEGER, sum REAL, '
+                    'min REAL, max REAL, PRIMARY KEY (device, metric, window, start)) WITHOUT ROWID')
+            self._db.execute('PRAGMA user_version = {0}'.format(schema_version))
+
+    def _backfill(self):
+        """Compute rollups from the stored readings for windows that have none yet.
+        """
+        with self._lock, self._db:
+            for window in self.windows:
+                if self._db.execute('SELECT 1 FROM rollups WHERE window = ? LIMIT 1',
+                                    (window, )).fetchone():
+                    continue
+                size = window * 1000
+                self._db.execute(
+                    'INSERT INTO rollups (device, metric, window, start, count, sum, min, max) '
+                    'SELECT device, metric, ?, time - time % ?, count(*), sum(value), min(value), '
+                    'max(value) FROM readings GROUP BY device, metric, time - time % ?',
+                    (window, size, size))
+
+
+def readings(device):
+    """Get the sensor readings of a device. A state key only counts if the device has the matching capability, lights for example report their color temperature as 'temperature'.
+
+    Args:
+        device(dict): Single device dict.
+
+    Returns:
+        list: (metric, value) tuples.
+    """
+    capabilities = (device.get('capabilities') or {}).get('values', ())
+    state = device['state']
+    return [(metric, state[metric]) for metric, capability in metrics.items()
+            if state.get(metric) is not None and capability in capabilities]
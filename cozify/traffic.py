@@ -0,0 +1,213 @@
+"""Module for recording hub & cloud API traffic and replaying it deterministically.
+
+Recordings are gzip compressed JSON lines: a header line followed by one line per HTTP exchange.
+Authentication headers are never stored and anything resembling a token in parameters or response
+bodies is redacted, so recordings are safe to share for offline regression testing & benchmarking.
+
+Example:
+    with traffic.record('/tmp/hub.traffic.gz'):
+        hub.devices()
+    # later, without network access:
+    with traffic.replay('/tmp/hub.traffic.gz'):
+        hub.devices()
+"""
+
+import collections, gzip, json, re, threading, time
+from urllib.parse import urlsplit
+
+import requests
+from absl import logging
+
+from . import transport
+
+format_version = 1
+redacted = '<redacted>'
+
+_token_pattern = re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]*')
+_sensitive_params = ['password']
+
+
+class Recorder():
+    """Transport wrapper that records every exchange passing through it.
+
+    Args:
+        path(str): File to write the recording into. Overwritten if it exists.
+        backend: Transport to pass calls on to. Defaults to the currently active cozify.transport.session.
+    """
+
+    def __init__(self, path, backend=None):
+        self.path = path
+        self.backend = backend
+        self._entries = []
+        self._lock = threading.Lock()
+        self._started = None
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = transport.session
+        if self.backend is None:
+            self.backend = self._previous
+        self._started = time.perf_counter()
+        transport.session = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        transport.session = self._previous
+        self.save()
+
+    def get(self, url, **kwargs):
+        return self._exchange('GET', self.backend.get, url, kwargs)
+
+    def put(self, url, **kwargs):
+        return self._exchange('PUT', self.backend.put, url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self._exchange('POST', self.backend.post, url, kwargs)
+
+    def save(self):
+        """Write all recorded exchanges to disk.
+        """
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'format': 'cozify-traffic', 'version': format_version}) + '\n')
+            with self._lock:
+                for entry in self._entries:
+                    f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        logging.debug('Recorded {0} exchanges to {1}'.format(len(self._entries), self.path))
+
+    def _exchange(self, method, call, url, kwargs):
+        start = time.perf_counter()
+        response = call(url, **kwargs)
+        elapsed = time.perf_counter() - start
+        data = kwargs.get('data')
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        entry = {
+            'offset': round(start - self._started, 6),
+            'elapsed': round(elapsed, 6),
+            'method': method,
+            'path': _path(url),
+            'params': _redact_params(kwargs.get('params')),
+            'data': data,
+            'status': response.status_code,
+            'reason': response.reason,
+            'response': _redact(response.text)
+        }
+        with self._lock:
+            self._entries.append(entry)
+        return response
+
+
+class Replayer():
+    """Transport replacement answering calls from a recording instead of the network.
+
+    Exchanges are matched by method and path in recorded order, so concurrent callers hitting different endpoints still replay deterministically.
+
+    Args:
+        path(str): Recording to replay.
+        speed(float): Replay speed relative to the original timing, e.g. 1.0 for original speed or 10.0 for ten times faster. Each reply is held back until its recorded offset from the start of the recording plus its duration has passed, so the gaps between calls are kept as well. Defaults to None which replays without any delays.
+    """
+
+    def __init__(self, path, speed=None):
+        self.path = path
+        self.speed = speed
+        self._queues = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        self._previous = None
+        self._started = None
+        for entry in entries(path):
+            self._queues[(entry['method'], entry['path'])].append(entry)
+
+    def __enter__(self):
+        self._previous = transport.session
+        self._started = time.perf_counter()
+        transport.session = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        transport.session = self._previous
+
+    def remaining(self):
+        """Amount of recorded exchanges not yet replayed.
+        """
+        with self._lock:
+            return sum(len(q) for q in self._queues.values())
+
+    def get(self, url, **kwargs):
+        return self._exchange('GET', url)
+
+    def put(self, url, **kwargs):
+        return self._exchange('PUT', url)
+
+    def post(self, url, **kwargs):
+        return self._exchange('POST', url)
+
+    def _exchange(self, method, url):
+        key = (method, _path(url))
+        with self._lock:
+            if not self._queues[key]:
+                raise requests.exceptions.ConnectionError(
+                    'No recorded exchange left for {0} {1}'.format(*key))
+            entry = self._queues[key].popleft()
+        if self.speed:
+            # callers slower than the recording aren't slowed down further
+            due = self._started + (entry['offset'] + entry['elapsed']) / self.speed
+            time.sleep(max(0.0, due - time.perf_counter()))
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.url = url
+        response.encoding = 'utf-8'
+        response._content = entry['response'].encode('utf-8')
+        return response
+
+
+def record(path, backend=None):
+    """Record all API traffic while in the returned context. For args see Recorder.
+
+    Returns:
+        Recorder: Context manager installing itself as cozify.transport.session.
+    """
+    return Recorder(path, backend=backend)
+
+
+def replay(path, speed=None):
+    """Replay a recording for all API traffic while in the returned context. For args see Replayer.
+
+    Returns:
+        Replayer: Context manager installing itself as cozify.transport.session.
+    """
+    return Replayer(path, speed=speed)
+
+
+def entries(path):
+    """Iterate over the exchanges of a recording, for example to extract real device payloads.
+
+    Args:
+        path(str): Recording to read.
+
+    Yields:
+        dict: Recorded exchange with keys offset, elapsed, method, path, params, data, status, reason & response.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != 'cozify-traffic' or header.get('version') != format_version:
+            raise ValueError('Unsupported traffic recording: {0}'.format(header))
+        for line in f:
+            yield json.loads(line)
+
+
+def _path(url):
+    """Strip scheme and host so recordings replay regardless of hub address.
+    """
+    parts = urlsplit(url)
+    return parts.path
+
+
+def _redact(text):
+    return _token_pattern.sub(redacted, text)
+
+
+def _redact_params(params):
+    if not params:
+        return None
+    return {k: (redacted if k in _sensitive_params else v) for k, v in params.items()}
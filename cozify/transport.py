@@ -0,0 +1,9 @@
+"""Module holding the HTTP transport shared by all hub and cloud API calls.
+
+Attributes:
+    session: Object providing requests compatible get, put and post functions, used for every HTTP call. Defaults to the requests module itself. Can be swapped for example for a requests.Session to pool connections, or for a recorder or replayer from cozify.traffic.
+"""
+
+import requests
+
+session = requests
@@ -21,6 +21,8 @@ setup(
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     install_requires=['requests', 'absl-py'],
+    extras_require={'fast': ['orjson']},
+    entry_points={'console_scripts': ['cozify=cozify.cli:main']},
     classifiers=[
         'License :: OSI Approved :: MIT License',
         'Development Status :: 3 - Alpha',
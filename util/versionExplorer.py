@@ -1,43 +1,22 @@
 #!/usr/bin/env python3
 import sys
-import requests
 from cozify import hub, hub_api
-from cozify.Error import APIError
 
 
-def main(start=hub_api.apiPath):
+def main(start=None):
     hub_id = hub.default()
-    host = hub.host(hub_id)
-    token = hub.token(hub_id)
-    api_ver = start
-    base = hub_api._getBase(host)
-
-    print('Testing against {0}, starting from {1}{2}'.format(hub_id, base, start))
-
-    while True:
-        if not ping(base + api_ver, token):
-            print('Fail: {0}'.format(api_ver))
-        else:
-            print('Works: {0}'.format(api_ver))
-            break
-        api_ver = increment(api_ver)
-
-
-def increment(apipath):
-    base, section, version = apipath.split('/')
-    next_version = round(float(version) + 0.1, 10)
-
-    return '{0}/{1}/{2}'.format(base, section, next_version)
-
-
-def ping(base, hub_token):
-    headers = {'Authorization': hub_token}
-    call = '/hub/tz'
-    response = requests.get(base + call, headers=headers, timeout=5)
-    if response.status_code == 200:
-        return True
-    else:
-        return False
+    kwargs = {'hub_id': hub_id}
+    hub._fill_kwargs(kwargs)
+    current = start or kwargs['apipath']
+
+    print('Testing against {0}, starting from {1}'.format(hub_id, current))
+
+    api_path = hub_api.negotiate(current=current, **kwargs)
+    if api_path is None:
+        print('Fail: no working version near {0}'.format(current))
+        sys.exit(1)
+    print('Works: {0}'.format(api_path))
+    hub.api_path(hub_id, api_path)
 
 
 if __name__ == "__main__":